@@ -0,0 +1,214 @@
+# Season analytics for discord bot
+# All stats are computed from a single teams x weeks score matrix so
+# that every calculation is a handful of vectorized numpy operations
+# rather than loops over scoreboard dicts.
+
+import collections
+
+import numpy as np
+
+
+# team is a row of the SeasonMatrix; week is None for season long awards
+Award = collections.namedtuple('Award', ['title', 'team', 'value', 'week'])
+
+
+def from_matchups(teams, matchups):
+    """
+    Build a SeasonMatrix from a provider's TeamTable and MatchupTable
+
+    Only final matchups are loaded; in-progress and future weeks are left
+    as nan so they never count toward records.
+
+    :param teams: TeamTable
+    :param matchups: MatchupTable
+    :return: SeasonMatrix
+    """
+    final = matchups.take(matchups.final)
+    weeks = np.unique(final.weeks)
+    cols = np.searchsorted(weeks, final.weeks)
+    scores = np.full((len(teams), len(weeks)), np.nan)
+    opponents = np.full((len(teams), len(weeks)), -1, dtype=np.int64)
+    scores[final.home, cols] = final.home_points
+    opponents[final.home, cols] = final.away
+    played = final.away >= 0
+    scores[final.away[played], cols[played]] = final.away_points[played]
+    opponents[final.away[played], cols[played]] = final.home[played]
+    return SeasonMatrix(teams.keys, teams.names, weeks.tolist(), scores, opponents)
+
+
+class SeasonMatrix(object):
+    """
+    Team scores laid out as a (teams, weeks) matrix
+
+    Unplayed cells are nan in `scores` and -1 in `opponents`. Weeks are just
+    columns, so several seasons can be analyzed at once by stacking them.
+    """
+    # Weights for power rankings: all-play win pct, points for percentile
+    # and all-play win pct over the most recent weeks
+    power_weights = (0.5, 0.3, 0.2)
+    recent_weeks = 3
+
+    def __init__(self, team_keys, names, weeks, scores, opponents):
+        self.team_keys = list(team_keys)
+        self.names = list(names)
+        self.weeks = list(weeks)
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.opponents = np.asarray(opponents, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.team_keys)
+
+    @property
+    def played(self):
+        return ~np.isnan(self.scores)
+
+    def _all_play_weekly(self, scores=None):
+        # Compare every team to every other team each week -> (T, T, W)
+        s = self.scores if scores is None else scores
+        diff = s[:, None, :] - s[None, :, :]
+        wins = (diff > 0).sum(axis=1)
+        losses = (diff < 0).sum(axis=1)
+        # Each team ties itself in any week it played
+        ties = (diff == 0).sum(axis=1) - ~np.isnan(s)
+        return wins, losses, ties
+
+    def all_play(self):
+        """
+        Record if every team played every other team every week
+
+        :return: (wins, losses, ties) arrays indexed by team
+        """
+        wins, losses, ties = self._all_play_weekly()
+        return wins.sum(axis=1), losses.sum(axis=1), ties.sum(axis=1)
+
+    def all_play_pct(self, scores=None):
+        wins, losses, ties = self._all_play_weekly(scores)
+        games = (wins + losses + ties).sum(axis=1)
+        return np.divide(wins.sum(axis=1) + 0.5 * ties.sum(axis=1), games,
+                         out=np.zeros(len(self)), where=games > 0)
+
+    def opponent_scores(self):
+        """
+        :return: (teams, weeks) matrix of each team's opponent's score, nan on byes
+        """
+        has_opp = self.opponents >= 0
+        cols = np.broadcast_to(np.arange(self.scores.shape[1]), self.scores.shape)
+        return np.where(has_opp, self.scores[np.where(has_opp, self.opponents, 0), cols], np.nan)
+
+    def actual_wins(self):
+        """
+        Head to head wins from the real schedule (ties count as half)
+
+        :return: array indexed by team
+        """
+        opp_scores = self.opponent_scores()
+        return ((self.scores > opp_scores).sum(axis=1)
+                + 0.5 * (self.scores == opp_scores).sum(axis=1))
+
+    def expected_wins(self):
+        """
+        Wins a team would expect against a random opponent each week
+
+        :return: array indexed by team
+        """
+        wins, _, ties = self._all_play_weekly()
+        opponents = self.played.sum(axis=0) - 1
+        weekly = np.divide(wins + 0.5 * ties, opponents,
+                           out=np.zeros(wins.shape), where=opponents > 0)
+        return weekly.sum(axis=1)
+
+    def luck(self):
+        """
+        Actual wins minus expected wins. Positive means the schedule helped.
+
+        :return: array indexed by team
+        """
+        return self.actual_wins() - self.expected_wins()
+
+    def median_beats(self):
+        """
+        Number of weeks each team outscored the league median
+
+        :return: array indexed by team
+        """
+        if not self.scores.size:
+            return np.zeros(len(self), dtype=np.int64)
+        medians = np.nanmedian(self.scores, axis=0)
+        return (self.scores > medians).sum(axis=1)
+
+    def points_for(self):
+        return np.nansum(self.scores, axis=1)
+
+    def points_for_percentile(self):
+        """
+        Percent of the league each team has outscored on the season
+
+        :return: array indexed by team (0 - 100)
+        """
+        pf = self.points_for()
+        if len(pf) < 2:
+            return np.full(len(pf), 100.0)
+        beaten = (pf[:, None] > pf[None, :]).sum(axis=1) + 0.5 * ((pf[:, None] == pf[None, :]).sum(axis=1) - 1)
+        return 100.0 * beaten / (len(pf) - 1)
+
+    def power_scores(self):
+        """
+        Weighted blend of all-play pct, points for percentile and recent form
+
+        :return: array indexed by team (0 - 1)
+        """
+        overall, pf, recent = self.power_weights
+        return (overall * self.all_play_pct()
+                + pf * self.points_for_percentile() / 100.0
+                + recent * self.all_play_pct(self.scores[:, -self.recent_weeks:]))
+
+    def power_rankings(self):
+        """
+        Team indices ordered from best to worst power score
+
+        :return: array of team indices
+        """
+        return np.argsort(-self.power_scores(), kind='stable')
+
+    def awards(self):
+        """
+        Season superlatives, all taken from the one score matrix
+
+        :return: list of Award
+        """
+        if not self.played.any():
+            return []
+        scores, opp_scores = self.scores, self.opponent_scores()
+        margins = scores - opp_scores
+        games = self.played.sum(axis=1)
+        pf, pa = self.points_for(), np.nansum(opp_scores, axis=1)
+        mean = np.divide(pf, games, out=np.zeros(len(self)), where=games > 0)
+        spread = np.nansum((scores - mean[:, None]) ** 2, axis=1)
+        stdev = np.sqrt(np.divide(spread, games, out=np.full(len(self), np.nan), where=games > 1))
+        luck, all_play = self.luck(), self.all_play_pct()
+
+        def cell(matrix, largest=True):
+            # (team, value, week) of the best cell, or None if there are none
+            if not np.isfinite(matrix).any():
+                return None
+            team, col = np.unravel_index(np.nanargmax(matrix) if largest else np.nanargmin(matrix), matrix.shape)
+            return int(team), float(matrix[team, col]), self.weeks[col]
+
+        awards = [
+            Award('Most points', int(np.argmax(pf)), float(pf.max()), None),
+            Award('Fewest points', int(np.argmin(pf)), float(pf.min()), None),
+            Award('Most points against', int(np.argmax(pa)), float(pa.max()), None),
+            Award('All-play champ', int(np.argmax(all_play)), float(all_play.max()), None),
+            Award('Luckiest', int(np.argmax(luck)), float(luck.max()), None),
+            Award('Unluckiest', int(np.argmin(luck)), float(luck.min()), None),
+        ]
+        for title, matrix, largest in (('Best week', scores, True), ('Worst week', scores, False),
+                                       ('Biggest blowout', margins, True),
+                                       ('Closest win', np.where(margins > 0, margins, np.nan), False)):
+            best = cell(matrix, largest)
+            if best:
+                awards.append(Award(title, *best))
+        if np.isfinite(stdev).any():
+            awards.append(Award('Most consistent', int(np.nanargmin(stdev)), float(np.nanmin(stdev)), None))
+            awards.append(Award('Boom or bust', int(np.nanargmax(stdev)), float(np.nanmax(stdev)), None))
+        return awards
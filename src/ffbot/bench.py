@@ -0,0 +1,299 @@
+# Benchmarks of the bot's hot paths
+#
+# Every benchmark builds its own synthetic league, so the suite runs
+# offline and numbers compare across machines and commits:
+#
+#   ffbot bench [name ...]
+#
+# A benchmark is a function that does its setup and returns the callable
+# to time; a note attribute on the callable is reported with the times.
+
+import collections
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import analytics
+import changes
+import lineups
+import outbound
+import pickups
+import players
+import playoffs
+import records
+import rivalry
+import yquery
+import ysnapshot
+
+from providers import base
+
+
+BENCHMARKS = collections.OrderedDict()
+
+Result = collections.namedtuple('Result', ['name', 'best', 'mean', 'repeat', 'note'])
+
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def synthetic_league(num_teams=12, weeks=17, final_weeks=None, seed=0):
+    """
+    Round robin league with normally distributed scores
+
+    :param final_weeks: weeks played so far; all of them if None
+    :return: (TeamTable, MatchupTable)
+    """
+    rng = np.random.default_rng(seed)
+    final_weeks = weeks if final_weeks is None else final_weeks
+    order = list(range(num_teams))
+    rows = []
+    for week in range(1, weeks + 1):
+        for i in range(num_teams // 2):
+            home, away = order[i], order[num_teams - 1 - i]
+            hp, ap = rng.normal(110, 25, 2).round(2)
+            final = week <= final_weeks
+            rows.append((week, home, away, hp if final else 0.0, ap if final else 0.0,
+                         110.0, 110.0, np.nan, np.nan, final))
+        # Circle method: keep the first team, rotate the rest
+        order = [order[0], order[-1]] + order[1:-1]
+    teams = base.TeamTable(
+        keys=['t%d' % i for i in range(num_teams)], names=['Team %d' % i for i in range(num_teams)],
+        managers=['m%d@example.com' % i for i in range(num_teams)],
+        manager_ids=['g%d' % i for i in range(num_teams)], divisions=[''] * num_teams,
+        wins=[0] * num_teams, losses=[0] * num_teams, ties=[0] * num_teams,
+        points_for=[0] * num_teams, points_against=[0] * num_teams,
+    )
+    return teams, base.MatchupTable(**dict(zip(base.MatchupTable.columns, zip(*rows))))
+
+
+def synthetic_players(count=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    first = ['Patrick', 'Josh', 'Lamar', 'Justin', 'Christian', 'Tyreek', 'Davante', 'Travis',
+             'Derrick', 'Saquon', 'Cooper', 'Amon-Ra', 'Ja\'Marr', 'Stefon', 'Jalen', 'Joe']
+    last = ['Mahomes', 'Allen', 'Jackson', 'Herbert', 'McCaffrey', 'Hill', 'Adams', 'Kelce',
+            'Henry', 'Barkley', 'Kupp', 'St. Brown', 'Chase', 'Diggs', 'Hurts', 'Burrow']
+    positions = ['QB', 'RB', 'WR', 'TE', 'K', 'DEF']
+    return [players.Player('p.%d' % i, '%s %s' % (rng.choice(first), rng.choice(last)),
+                           rng.choice(positions), 'KC', '', 'freeagents') for i in range(count)]
+
+
+def synthetic_yleague(num_teams=12):
+    """
+    League data shaped like what yfantasy.create_yleague_json saves
+    """
+    league = {k: 'value of %s' % k for k in (
+        'league_key', 'league_id', 'name', 'url', 'logo_url', 'draft_status', 'num_teams', 'edit_key',
+        'weekly_deadline', 'league_update_timestamp', 'scoring_type', 'league_type', 'renew', 'renewed',
+        'iris_group_chat_id', 'short_invitation_url', 'allow_add_to_dl_extra_pos', 'is_pro_league',
+        'is_cash_league', 'current_week', 'start_week', 'start_date', 'end_week', 'end_date', 'game_code',
+        'season')}
+    positions = ['QB', 'WR', 'WR', 'RB', 'RB', 'TE', 'W/R/T', 'K', 'DEF', 'BN', 'IR']
+    stats = [{'stat_id': str(i), 'enabled': '1', 'name': 'Stat %d' % i, 'display_name': 'S%d' % i,
+              'sort_order': '1', 'position_type': 'O',
+              'stat_position_types': {'stat_position_type': {'position_type': 'O'}}} for i in range(60)]
+    league['settings'] = {
+        'draft_type': 'live', 'scoring_type': 'head', 'uses_playoff': '1', 'playoff_start_week': '15',
+        'num_playoff_teams': '6', 'waiver_type': 'R', 'trade_end_date': '2019-11-16',
+        'roster_positions': {'roster_position': [{'position': p, 'position_type': 'O', 'count': '1'}
+                                                 for p in positions]},
+        'stat_categories': {'stats': {'stat': stats}},
+        'stat_modifiers': {'stats': {'stat': [{'stat_id': str(i), 'value': '0.5'} for i in range(60)]}},
+    }
+    league['teams'] = [{
+        'team_key': '390.l.1.t.%d' % i, 'team_id': str(i), 'name': 'Team %d' % i,
+        'url': 'https://football.fantasysports.yahoo.com/f1/1/%d' % i,
+        'team_logos': {'team_logo': {'size': 'large', 'url': 'https://example.com/logo/%d.png' % i}},
+        'waiver_priority': str(i), 'number_of_moves': '7', 'number_of_trades': '1',
+        'roster_adds': {'coverage_type': 'week', 'coverage_value': '4', 'value': '2'},
+        'league_scoring_type': 'head', 'has_draft_grade': '1', 'draft_grade': 'B',
+        'managers': {'manager': {'manager_id': str(i), 'nickname': 'Manager %d' % i, 'guid': 'GUID%08d' % i,
+                                 'email': 'm%d@example.com' % i, 'image_url': 'https://example.com/%d.jpg' % i}},
+    } for i in range(1, num_teams + 1)]
+    return league
+
+
+def _league_files():
+    # The league as league.json was written and as a snapshot
+    league = synthetic_yleague()
+    base_path = os.path.join(tempfile.gettempdir(), 'ffbot-bench-league')
+    with open(base_path + '.json', 'w') as f:
+        json.dump(league, f, indent=4, separators=(',', ': '))
+    ysnapshot.write(base_path + '.snap', league, sections=('settings', 'teams'))
+    return base_path + '.json', base_path + '.snap'
+
+
+@benchmark
+def league_json():
+    path, _ = _league_files()
+
+    def run():
+        with open(path, 'r') as f:
+            json.load(f)
+    run.note = '%d bytes' % os.path.getsize(path)
+    return run
+
+
+@benchmark
+def league_snapshot():
+    _, path = _league_files()
+
+    def run():
+        snapshot = ysnapshot.Snapshot(path)
+        for name in snapshot.index:
+            snapshot.section(name)
+    run.note = '%d bytes' % os.path.getsize(path)
+    return run
+
+
+@benchmark
+def league_snapshot_key():
+    # What a request needs: the league key, without settings or teams
+    _, path = _league_files()
+    return lambda: ysnapshot.Snapshot(path)['league_key']
+
+
+@benchmark
+def league_snapshot_reuse():
+    # Later requests while the file is unchanged
+    _, path = _league_files()
+    ysnapshot.load(path)
+    return lambda: ysnapshot.load(path)['league_key']
+
+
+@benchmark
+def season_analytics():
+    teams, matchups = synthetic_league()
+
+    def run():
+        season = analytics.from_matchups(teams, matchups)
+        season.power_rankings()
+        season.luck()
+        season.awards()
+    return run
+
+
+@benchmark
+def playoff_odds():
+    teams, matchups = synthetic_league(final_weeks=9)
+    season = analytics.from_matchups(teams, matchups)
+    games = playoffs.remaining_schedule(matchups, 14)
+    simulator = playoffs.PlayoffSimulator(season, games, 6)
+    # Start the process pool outside the timing
+    simulator.run()
+    return simulator.run
+
+
+@benchmark
+def player_search():
+    index = players.PlayerIndex(synthetic_players())
+
+    def run():
+        index.search('pat mah')
+        index.search('mahommes')
+    return run
+
+
+@benchmark
+def query_plan():
+    queries = [yquery.Query('team', 'nfl.l.1.t.%d' % i).sub('roster', week=5).sub('players')
+               for i in range(1, 13)]
+    queries += [yquery.Query('league', 'nfl.l.1').sub(name) for name in ('settings', 'standings', 'scoreboard')]
+    return lambda: yquery.plan(queries)
+
+
+@benchmark
+def outbox_pack():
+    contents = ['```' + '\n'.join('line %d of result %d' % (j, i) for j in range(12)) + '```' for i in range(50)]
+    contents.append('```' + '\n'.join('x' * 80 for _ in range(150)) + '```')
+    return lambda: outbound.pack(contents)
+
+
+@benchmark
+def change_feed():
+    teams, matchups = synthetic_league(final_weeks=5)
+    week = matchups.take(matchups.weeks == 6)
+    rosters = {key: ['p.%d' % (i * 16 + j) for j in range(16)] for i, key in enumerate(teams.keys)}
+    moved = dict(rosters, t0=rosters['t0'][1:] + ['p.999'], t1=rosters['t1'][1:] + rosters['t0'][:1])
+    feed = changes.ChangeFeed()
+    snapshots = [changes.snapshot(teams, week, rosters), changes.snapshot(teams, week, moved)]
+
+    def run():
+        for snapshot in snapshots:
+            feed.update(snapshot)
+    return run
+
+
+@benchmark
+def rivalry_index():
+    seasons = []
+    for i in range(10):
+        teams, matchups = synthetic_league(seed=i)
+        seasons.append(base.Season('s%d' % i, str(2010 + i), teams, matchups, None))
+
+    def run():
+        index = rivalry.RivalryIndex()
+        for season in seasons:
+            index.add_season(season)
+        index.head_to_head('g0', 'g1')
+    return run
+
+
+@benchmark
+def records_book():
+    teams, matchups = synthetic_league()
+    season = base.Season('s', '2019', teams, matchups, None)
+    return lambda: records.RecordsBook().add_season(season)
+
+
+@benchmark
+def pickup_ranking():
+    rng = np.random.default_rng(0)
+    pool = synthetic_players(500)
+    roster = synthetic_players(16, seed=1)
+
+    def stats(players):
+        n = len(players)
+        return base.PlayerStatsTable(
+            keys=[p.key for p in players], names=[p.name for p in players],
+            positions=[p.position for p in players], teams=[p.team for p in players],
+            statuses=[''] * n, recent=rng.gamma(2, 4, n), season=rng.gamma(2, 4, n),
+            projected=rng.gamma(2, 4, n), owned=rng.uniform(0, 100, n))
+    pool, roster = stats(pool), stats(roster)
+    slots = ['QB', 'WR', 'WR', 'RB', 'RB', 'TE', 'W/R/T', 'K', 'DEF']
+    return lambda: pickups.rank(pool, roster, slots)
+
+
+@benchmark
+def lineup_backfill():
+    # Best lineups for a whole 12 team season of 16 man rosters
+    rng = np.random.default_rng(0)
+    weeks, teams, size = 17, 12, 16
+    n = weeks * teams * size
+    table = base.LineupTable(
+        weeks=np.repeat(np.arange(1, weeks + 1), teams * size), teams=np.tile(np.repeat(np.arange(teams), size), weeks),
+        keys=['p.%d' % i for i in range(n)], names=[''] * n,
+        positions=list(rng.choice(['QB', 'RB', 'WR', 'TE', 'K', 'DEF', 'WR,RB'], n)),
+        points=rng.gamma(2, 5, n), started=rng.random(n) < 0.5)
+    slots = ['QB', 'WR', 'WR', 'RB', 'RB', 'TE', 'W/R/T', 'K', 'DEF']
+    return lambda: lineups.best(table, slots)
+
+
+def run(names=None, repeat=5):
+    """
+    :param names: benchmarks to run; all if empty
+    :param repeat: timed calls per benchmark
+    :return: generator of Result
+    """
+    for name in names or BENCHMARKS:
+        fn = BENCHMARKS[name]()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        yield Result(name, min(times), sum(times) / len(times), repeat, getattr(fn, 'note', ''))
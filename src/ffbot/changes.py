@@ -0,0 +1,234 @@
+# League change feed
+#
+# One poll snapshots the league (standings, this week's matchups, rosters)
+# into plain nested dicts, and the snapshot is diffed against the previous
+# one. Every subtree carries a hash, so whole branches that did not change
+# (most teams, most weeks) are skipped after one comparison. The raw
+# changes are turned into typed events and handed to whoever subscribed,
+# so any number of features cost a single poll and a single diff:
+#
+#   feed = ChangeFeed()
+#   feed.subscribe('trade', announce_trade)
+#   feed.publish(feed.update(snapshot(teams, matchups, rosters)))
+
+import collections
+import math
+
+
+Change = collections.namedtuple('Change', ['path', 'old', 'new'])
+
+
+class StandingsMove(collections.namedtuple('StandingsMove', ['team', 'old_rank', 'new_rank'])):
+    kind = 'standings'
+
+
+class LeadChange(collections.namedtuple('LeadChange', ['week', 'leader', 'trailer',
+                                                       'leader_points', 'trailer_points'])):
+    kind = 'lead_change'
+
+
+class MatchupFinal(collections.namedtuple('MatchupFinal', ['week', 'winner', 'loser',
+                                                           'winner_points', 'loser_points'])):
+    kind = 'final'
+
+
+class Trade(collections.namedtuple('Trade', ['teams', 'received'])):
+    # received maps each team key to the player keys it got
+    kind = 'trade'
+
+
+class RosterMove(collections.namedtuple('RosterMove', ['team', 'added', 'dropped'])):
+    # Adds and drops that are not part of a trade: waiver claims, free agents
+    kind = 'roster'
+
+
+KINDS = ('standings', 'lead_change', 'final', 'trade', 'roster')
+
+
+def _number(value):
+    # nan never equals itself, which would make every poll a change
+    value = float(value)
+    return None if math.isnan(value) else round(value, 2)
+
+
+def snapshot(teams, matchups, rosters):
+    """
+    Plain nested dict of the parts of a league worth watching
+
+    :param teams: TeamTable
+    :param matchups: MatchupTable, usually just the current week
+    :param rosters: dict of team key -> player keys
+    :return: dict
+    """
+    order = sorted(range(len(teams)), key=lambda i: (-teams.wins[i], -teams.points_for[i]))
+    rank = {i: r + 1 for r, i in enumerate(order)}
+    games = {}
+    for week, home, away, home_points, away_points, final in zip(
+            matchups.weeks, matchups.home, matchups.away, matchups.home_points,
+            matchups.away_points, matchups.final):
+        if away < 0:
+            continue
+        games['%d:%s:%s' % (week, teams.keys[home], teams.keys[away])] = {
+            'week': int(week),
+            'home': teams.keys[home],
+            'away': teams.keys[away],
+            'home_points': _number(home_points),
+            'away_points': _number(away_points),
+            'final': bool(final),
+        }
+    return {
+        'teams': {key: {'name': teams.names[i], 'rank': rank[i], 'wins': int(teams.wins[i]),
+                        'losses': int(teams.losses[i]), 'ties': int(teams.ties[i])}
+                  for i, key in enumerate(teams.keys)},
+        'matchups': games,
+        'rosters': {key: sorted(players) for key, players in rosters.items()},
+    }
+
+
+class _Node(object):
+    """
+    A snapshot value with its subtree hash
+    """
+    __slots__ = ('value', 'hash', 'children')
+
+    def __init__(self, value):
+        self.value = value
+        if isinstance(value, dict):
+            self.children = {k: _Node(v) for k, v in value.items()}
+            self.hash = hash(frozenset((k, c.hash) for k, c in self.children.items()))
+        else:
+            self.children = None
+            self.hash = hash(tuple(value) if isinstance(value, list) else value)
+
+
+def diff(old, new, path=()):
+    """
+    Leaf level changes between two hashed trees
+
+    :param old: _Node or None
+    :param new: _Node or None
+    :return: generator of Change
+    """
+    if old is not None and new is not None and old.hash == new.hash:
+        return
+    if old is not None and new is not None and old.children is not None and new.children is not None:
+        for key in set(old.children) | set(new.children):
+            for change in diff(old.children.get(key), new.children.get(key), path + (key,)):
+                yield change
+        return
+    yield Change(path, old.value if old is not None else None, new.value if new is not None else None)
+
+
+def _standings(changes):
+    for change in changes:
+        if len(change.path) == 3 and change.path[2] == 'rank' and change.old is not None:
+            yield StandingsMove(change.path[1], change.old, change.new)
+
+
+def _matchups(changes, old_games, new_games):
+    for game_key in sorted({c.path[1] for c in changes if len(c.path) > 1}):
+        old, new = old_games.get(game_key), new_games.get(game_key)
+        if old is None or new is None:
+            continue
+        lead, old_lead = _leader(new), _leader(old)
+        if lead is None:
+            continue
+        leader, trailer = lead
+        if new['final'] and not old['final']:
+            yield MatchupFinal(new['week'], new[leader], new[trailer],
+                               new[leader + '_points'], new[trailer + '_points'])
+        elif not new['final'] and old_lead is not None and old_lead != lead:
+            yield LeadChange(new['week'], new[leader], new[trailer],
+                             new[leader + '_points'], new[trailer + '_points'])
+
+
+def _leader(game):
+    home, away = game.get('home_points'), game.get('away_points')
+    if home is None or away is None or home == away:
+        return None
+    return ('home', 'away') if home > away else ('away', 'home')
+
+
+def _rosters(changes):
+    added, dropped = {}, {}
+    for change in changes:
+        if len(change.path) != 2:
+            continue
+        team = change.path[1]
+        old, new = set(change.old or ()), set(change.new or ())
+        added[team] = new - old
+        dropped[team] = old - new
+    # Players that went from one team to another in the same poll, by pair
+    # of teams. A waiver claim of a player another team just dropped moves
+    # one way only; a trade moves players both ways between the two teams.
+    # Trades for nothing (draft picks, FAAB) read as drops and adds.
+    dropped_by = {p: team for team, players in dropped.items() for p in players}
+    moved = collections.defaultdict(lambda: collections.defaultdict(set))
+    for team, players in added.items():
+        for p in players:
+            source = dropped_by.get(p)
+            if source is not None and source != team:
+                moved[frozenset((team, source))][team].add(p)
+    for teams, received in sorted(moved.items(), key=lambda item: sorted(item[0])):
+        if len(received) < 2:
+            continue
+        for team, players in received.items():
+            added[team] -= players
+            for source in teams - {team}:
+                dropped[source] -= players
+        yield Trade(tuple(sorted(teams)), {t: sorted(received[t]) for t in sorted(teams)})
+    for team in sorted(added):
+        if added[team] or dropped[team]:
+            yield RosterMove(team, sorted(added[team]), sorted(dropped[team]))
+
+
+class ChangeFeed(object):
+    """
+    Diffs successive league snapshots and publishes typed events
+    """
+    def __init__(self):
+        self.snapshot = None
+        self._tree = None
+        self._subscribers = collections.defaultdict(list)
+
+    def subscribe(self, kinds, fn):
+        """
+        Call fn(event) for every published event of the given kinds
+
+        :param kinds: event kind or list of kinds (see KINDS)
+        """
+        for kind in [kinds] if isinstance(kinds, str) else kinds:
+            assert kind in KINDS, 'Unknown event kind %s' % kind
+            self._subscribers[kind].append(fn)
+
+    def update(self, snapshot):
+        """
+        Replace the current snapshot
+
+        :return: list of events since the previous snapshot; none on the first
+        """
+        tree = _Node(snapshot)
+        previous, old_snapshot = self._tree, self.snapshot
+        self._tree, self.snapshot = tree, snapshot
+        if previous is None:
+            return []
+        by_section = collections.defaultdict(list)
+        for change in diff(previous, tree):
+            by_section[change.path[0] if change.path else None].append(change)
+        events = []
+        events.extend(_standings(by_section['teams']))
+        events.extend(_matchups(by_section['matchups'], old_snapshot['matchups'], snapshot['matchups']))
+        events.extend(_rosters(by_section['rosters']))
+        return events
+
+    def publish(self, events):
+        """
+        Hand events to their subscribers
+
+        :return: list of whatever subscribers returned (e.g. coroutines to await)
+        """
+        results = []
+        for event in events:
+            for fn in self._subscribers[event.kind]:
+                results.append(fn(event))
+        return results
@@ -1,25 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-This is a skeleton file that can serve as a starting point for a Python
-console script. To run this script uncomment the following lines in the
-[options.entry_points] section in setup.cfg:
+Operational command line for the bot
 
-    console_scripts =
-         fibonacci = ffbot.cli:run
-
-Then run `python setup.py install` which will install the command `fibonacci`
-inside your current environment.
-Besides console scripts, the header (i.e. until _logger...) of this file can
-also be used as template for Python modules.
+    ffbot sync             refresh the local league snapshot
+    ffbot warm             fill caches ahead of a game day
+    ffbot stats            cache and local data stats
+    ffbot bench [name]     run the benchmark suite (see bench.py)
+    ffbot profile <cmd>    profile one bot command end to end
+    ffbot loadtest <dir>   flood the commands against a stub Yahoo server
 
+None of these start the Discord bot. With --replay DIR every Yahoo request
+is answered from responses recorded earlier with --record DIR, so all of
+them also run offline.
 """
 
 import argparse
+import cProfile
+import io
 import logging
+import os
+import pstats
 import sys
-
-from ffbot import __version__
+import time
+import types
 
 __author__ = "Greg"
 __copyright__ = "Greg"
@@ -27,6 +31,10 @@ __license__ = "mit"
 
 _logger = logging.getLogger(__name__)
 
+# Bot modules import each other (and src/) as top level modules
+FFBOT_PATH = os.path.dirname(os.path.realpath(__file__))
+SRC_PATH = os.path.dirname(FFBOT_PATH)
+
 
 def parse_args(args):
     """Parse command line parameters
@@ -39,11 +47,25 @@ def parse_args(args):
     """
     parser = argparse.ArgumentParser(
         description="Fantasy football Discord bot")
-
     parser.add_argument(
-        dest="auth",
-        help="name of file containing Yahoo Fantasy API",
-        default="auth.json")
+        '--provider',
+        help="league provider (yahoo, sleeper); auth.json if not given")
+    parser.add_argument(
+        '--cache',
+        help="SQLite file shared with the bot workers (FFBOT_CACHE)")
+    parser.add_argument(
+        '--record',
+        metavar='DIR',
+        help="record every Yahoo response into DIR")
+    parser.add_argument(
+        '--replay',
+        metavar='DIR',
+        help="answer Yahoo requests from responses recorded in DIR")
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help="seconds each replayed request takes")
     parser.add_argument(
         '-v',
         '--verbose',
@@ -58,18 +80,251 @@ def parse_args(args):
         help="set loglevel to DEBUG",
         action='store_const',
         const=logging.DEBUG)
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    commands.add_parser('sync', help="refresh the local league snapshot")
+
+    warm = commands.add_parser('warm', help="fill caches ahead of a game day")
+    warm.add_argument(
+        '--skip-history',
+        action='store_true',
+        help="do not update the rivalry index and records book")
+
+    commands.add_parser('stats', help="cache and local data stats")
+
+    bench = commands.add_parser('bench', help="run the benchmark suite")
+    bench.add_argument(
+        'names',
+        nargs='*',
+        help="benchmarks to run; all if none")
+    bench.add_argument(
+        '-n',
+        '--repeat',
+        type=int,
+        default=5,
+        help="timed runs per benchmark")
+
+    profile = commands.add_parser('profile', help="profile one bot command end to end")
+    profile.add_argument(
+        'name',
+        help="command function in utils, i.e. standings or mymatchup")
+    profile.add_argument(
+        'args',
+        nargs='*',
+        help="arguments for the command")
+    profile.add_argument(
+        '--user',
+        type=int,
+        default=0,
+        help="Discord id the command runs as")
+    profile.add_argument(
+        '--warm',
+        action='store_true',
+        help="run the command once before profiling it")
+    profile.add_argument(
+        '--top',
+        type=int,
+        default=25,
+        help="number of functions to show")
+
+    load = commands.add_parser('loadtest', help="flood the commands against a stub Yahoo server")
+    load.add_argument(
+        'recordings',
+        help="directory of responses recorded with --record")
+    load.add_argument(
+        '--users',
+        type=int,
+        default=30,
+        help="Discord users sending commands")
+    load.add_argument(
+        '--commands',
+        type=int,
+        default=300,
+        help="commands to send in total")
+    load.add_argument(
+        '--concurrency',
+        type=int,
+        default=10,
+        help="commands in flight at once")
+    load.add_argument(
+        '--channels',
+        type=int,
+        default=1,
+        help="channels the users are spread over")
+    load.add_argument(
+        '--upstream-latency',
+        type=float,
+        default=0.3,
+        help="mean seconds per stub Yahoo response")
+    load.add_argument(
+        '--errors',
+        type=float,
+        default=0.0,
+        help="fraction of stub Yahoo requests throttled")
+    load.add_argument(
+        '--send-latency',
+        type=float,
+        default=0.05,
+        help="seconds each Discord message send takes")
+    load.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help="seed of the command mix and injected errors")
     return parser.parse_args(args)
 
 
 def setup_logging(loglevel):
-    """Setup basic logging
+    """Setup the bot's queued, structured logging (see ylog)
 
     Args:
       loglevel (int): minimum loglevel for emitting messages
     """
-    logformat = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
-    logging.basicConfig(level=loglevel, stream=sys.stdout,
-                        format=logformat, datefmt="%Y-%m-%d %H:%M:%S")
+    import ylog
+    ylog.setup(loglevel or logging.WARNING, stream=sys.stdout)
+
+
+def setup_env(args):
+    """
+    Set the environment the options ask for and make the bot importable
+
+    The provider, cache and Yahoo client are all picked at import time, so
+    this has to run before the bot's modules are imported.
+    """
+    env = {'FFBOT_PROVIDER': args.provider, 'FFBOT_CACHE': args.cache,
+           'FFBOT_RECORD': args.record, 'FFBOT_REPLAY': args.replay,
+           'FFBOT_REPLAY_LATENCY': str(args.latency) if args.latency else None}
+    os.environ.update((k, v) for k, v in env.items() if v)
+    for path in (SRC_PATH, FFBOT_PATH):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def load_utils(args):
+    setup_env(args)
+    import utils
+    return utils
+
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    print('%-28s %8.3fs' % (label, time.perf_counter() - start))
+    return result
+
+
+def sync(args):
+    utils = load_utils(args)
+    import yscheduler
+    with yscheduler.priority('background'):
+        synced = timed('sync', utils.sync_league)
+    if not synced:
+        print('Another worker holds the sync lease; nothing done')
+
+
+def warm(args):
+    utils = load_utils(args)
+    import ycache
+    import yscheduler
+    if isinstance(ycache.CACHE, ycache.SnapshotCache):
+        print('No shared cache (--cache or FFBOT_CACHE); only files on disk will stay warm')
+    with yscheduler.priority('background'):
+        timed('sync', utils.sync_league)
+        league = timed('league', utils.PROVIDER.league)
+        timed('teams', utils.PROVIDER.teams)
+        timed('matchups (%d weeks)' % league.current_week,
+              utils.PROVIDER.matchups, range(league.start_week, league.current_week + 1))
+        timed('rosters', utils.PROVIDER.rosters)
+        timed('player index', utils.refresh_player_index)
+        if not args.skip_history:
+            timed('rivalry and records', utils.refresh_history)
+
+
+def stats(args):
+    utils = load_utils(args)
+    import ycache
+    for key, value in sorted(ycache.CACHE.stats().items()):
+        print('cache %-22s %s' % (key, value))
+    files = [('league snapshot', os.path.join(SRC_PATH, 'league.snap')),
+             ('player index', utils.PLAYER_INDEX_PATH),
+             ('rivalry index', utils.RIVALRY_PATH),
+             ('records book', utils.RECORDS_PATH)]
+    for label, path in files:
+        if os.path.exists(path):
+            age = ycache.describe_age(time.time() - os.path.getmtime(path))
+            print('%-28s %8d bytes, %s old' % (label, os.path.getsize(path), age))
+        else:
+            print('%-28s missing' % label)
+    if os.path.exists(utils.PLAYER_INDEX_PATH):
+        print('%-28s %8d' % ('players indexed', len(utils.get_player_index())))
+    if os.path.exists(utils.RECORDS_PATH):
+        print('%-28s %8d' % ('weeks in records book', len(utils.get_records_book().weeks)))
+
+
+def bench(args):
+    load_utils(args)
+    import bench as suite
+    unknown = set(args.names) - set(suite.BENCHMARKS)
+    if unknown:
+        raise SystemExit('Unknown benchmarks: %s (have %s)' % (', '.join(sorted(unknown)),
+                                                              ', '.join(suite.BENCHMARKS)))
+    print('%-22s %11s %11s' % ('benchmark', 'best', 'mean'))
+    for result in suite.run(args.names, repeat=args.repeat):
+        print('%-22s %9.3fms %9.3fms  %s' % (result.name, 1000 * result.best, 1000 * result.mean, result.note))
+
+
+def profile(args):
+    utils = load_utils(args)
+    import inspect
+    import yscheduler
+    fn = getattr(utils, args.name, None)
+    if not callable(fn):
+        raise SystemExit('No command %s in utils' % args.name)
+    call_args = list(args.args)
+    params = list(inspect.signature(fn).parameters)
+    if params and params[0] == 'ctx':
+        # Commands that need to know who asked get a bare stand-in context
+        author = types.SimpleNamespace(id=args.user, display_name=str(args.user))
+        call_args.insert(0, types.SimpleNamespace(message=types.SimpleNamespace(author=author)))
+
+    def call():
+        with yscheduler.priority('interactive'):
+            result = fn(*call_args)
+            return list(result) if inspect.isgenerator(result) else result
+
+    if args.warm:
+        call()
+    before = sum(s['requests'] for s in yscheduler.SCHEDULER.stats().values())
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    output = profiler.runcall(call)
+    elapsed = time.perf_counter() - start
+    requests = sum(s['requests'] for s in yscheduler.SCHEDULER.stats().values()) - before
+    for message in output if isinstance(output, list) else [output]:
+        print(message)
+    print('\n%s: %.3fs, %d upstream requests\n' % (args.name, elapsed, requests))
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(args.top)
+    print(out.getvalue())
+
+
+def loadtest(args):
+    setup_env(args)
+    import loadtest as harness
+    stub = harness.StubYahoo(args.recordings, args.upstream_latency, args.errors, args.seed).start()
+    # Before the bot is imported, so its Yahoo client talks to the stub
+    os.environ['FFBOT_YAHOO_URL'] = stub.url
+    try:
+        report = harness.run(stub, users=args.users, commands=args.commands, concurrency=args.concurrency,
+                             channels=args.channels, send_latency=args.send_latency, seed=args.seed)
+    finally:
+        stub.stop()
+    print('\n'.join(harness.report_lines(report)))
+
+
+COMMANDS = {'sync': sync, 'warm': warm, 'stats': stats, 'bench': bench, 'profile': profile,
+            'loadtest': loadtest}
 
 
 def main(args):
@@ -79,9 +334,10 @@ def main(args):
       args ([str]): command line parameter list
     """
     args = parse_args(args)
+    setup_env(args)
     setup_logging(args.loglevel)
-    _logger.debug("Starting crazy calculations...")
-    print(")
+    _logger.debug("Running %s", args.command)
+    COMMANDS[args.command](args)
 
 
 def run():
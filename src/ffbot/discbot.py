@@ -1,17 +1,21 @@
 # Interface for Discord
 
-import croniter
 import discord
 import json
+import logging
 import os
 import utils
+import ylog
 
 from discord.ext import commands
 
 
+logger = logging.getLogger(__name__)
 # Define basic bot setup
 prefix = '!'
 bot = commands.Bot(command_prefix=prefix)
+# Weekly review, Wednesdays
+WEEK_IN_REVIEW = '0 15 * * 3'
 
 #
 # Define events
@@ -20,13 +24,7 @@ bot = commands.Bot(command_prefix=prefix)
 
 @bot.event
 async def on_ready():
-    print("Everything's all ready to go~")
-
-
-@bot.event
-async def on_message(message):
-    print("The message's content was", message.content)
-    await bot.process_commands(message)
+    logger.info("Everything's all ready to go~")
 
 
 @bot.command(hidden=True)
@@ -68,8 +66,7 @@ async def mymatchup(ctx, *, content=''):
     Show your matchup this week (or provide a week number)
     '''
     # Expect `content` contains either None or a list of ints (weeks)
-    for item in utils.mymatchup(ctx, content=content):
-        await ctx.send(item)
+    await utils.respond(ctx, utils.mymatchup, ctx, content)
 
 
 @bot.command(hidden=True)
@@ -87,8 +84,122 @@ async def standings(ctx):
     '''
     Current league standings
     '''
-    table = utils.standings()
-    await ctx.send(table)
+    await utils.respond(ctx, utils.standings)
+
+
+@bot.command()
+async def powerrankings(ctx):
+    '''
+    Power rankings from all-play record, points for and recent form
+    '''
+    await utils.respond(ctx, utils.power_rankings)
+
+
+@bot.command()
+async def allplay(ctx):
+    '''
+    Record if every team played every other team every week
+    '''
+    await utils.respond(ctx, utils.all_play)
+
+
+@bot.command()
+async def luck(ctx):
+    '''
+    Actual wins vs expected wins from all-play
+    '''
+    await utils.respond(ctx, utils.luck)
+
+
+@bot.command()
+async def playoffs(ctx):
+    '''
+    Simulated odds of making the playoffs
+    '''
+    await utils.respond(ctx, utils.playoff_odds)
+
+
+@bot.command()
+async def player(ctx, *, content: str):
+    '''
+    Look up a player by (partial) name
+    '''
+    await utils.respond(ctx, utils.player, content)
+
+
+@bot.command()
+async def pickups(ctx, *, content=''):
+    '''
+    Best free agents for your team (or one position, i.e. !pickups RB)
+    '''
+    await utils.respond(ctx, utils.recommend_pickups, ctx, content)
+
+
+@bot.command()
+async def trade(ctx, *, content=''):
+    '''
+    What a trade does to both teams, i.e. !trade kelce for adams, jacobs
+    '''
+    await utils.respond(ctx, utils.analyze_trade, ctx, content)
+
+
+@bot.command()
+async def optimal(ctx, *, content=''):
+    '''
+    Points left on the bench, last week (or a week number, or season)
+    '''
+    await utils.respond(ctx, utils.optimal_lineup, ctx, content)
+
+
+@bot.command()
+async def rivalry(ctx, member: discord.Member):
+    '''
+    All time head to head record against another manager
+    '''
+    await utils.respond(ctx, utils.head_to_head, ctx, member)
+
+
+@bot.command()
+async def records(ctx):
+    '''
+    All time league records
+    '''
+    await utils.respond(ctx, utils.league_records)
+
+
+@bot.command()
+async def seasonreview(ctx):
+    '''
+    Regular season awards
+    '''
+    await utils.respond(ctx, utils.season_in_review)
+
+
+@bot.command(hidden=True)
+@commands.has_role("Admin")
+async def schedstats(ctx):
+    '''
+    Upstream request queue wait times by priority class, and outbound message stats
+    '''
+    await utils.OUTBOX.send(ctx.channel, [utils.scheduler_stats(), utils.outbox_stats()])
+
+
+@bot.command(hidden=True)
+@commands.has_role("Admin")
+async def traces(ctx, *, content=''):
+    '''
+    Where the time went in the slowest recent commands, i.e. !traces 5 standings
+    '''
+    await utils.OUTBOX.send(ctx.channel, utils.traces(content), bot=bot)
+
+
+@bot.command(hidden=True)
+@commands.has_role("Admin")
+async def profile(ctx, seconds: int = 30):
+    '''
+    Sample the bot's stacks for a few seconds and upload them for a flamegraph
+    '''
+    await utils.profile(ctx, seconds)
 
 
 @bot.command(hidden=True)
@@ -97,31 +208,42 @@ async def test_cron(ctx, content):
     Test crons
     '''
     if not 'Supreme Leader' in str(ctx.message.author.roles):
-        print(ctx.message.author.roles)
+        logger.warning('test_cron refused for %s (roles %s)', ctx.message.author, ctx.message.author.roles)
         await ctx.send("Hey. Stop that. You can't do that.")
         return
-    await ctx.send(getattr(utils, content.strip('cron_'))())
-
-#
-# Define crons
-#
-
-# TODO figure out a better way to do this
-# 5 min
-bot.loop.create_task(utils.cron_waiver_monitor('*/5 * * * *', bot))
-bot.loop.create_task(utils.cron_trades_monitor('*/5 * * * *', bot))
-# Hourly
-bot.loop.create_task(utils.cron_update_league('0 * * * *', bot))
-# Some days
-bot.loop.create_task(utils.cron_week_in_review('0 15 * * 3', bot))
+    output = await utils.run_blocking('interactive', getattr(utils, content.strip('cron_')))
+    await utils.OUTBOX.send(ctx.channel, output, bot=bot)
 
 
 # Grab token from auth.json
 AUTHFILE = os.path.realpath(os.path.join(os.curdir, '..', '..', 'auth.json'))
 
-with open(AUTHFILE, 'r') as f:
-    token = json.load(f)['discord']['token']
-assert token, 'Discord token not found!'
+
+def main():
+    ylog.setup()
+
+    #
+    # Define crons
+    #
+
+    # TODO figure out a better way to do this
+    # 5 min
+    bot.loop.create_task(utils.cron_league_changes('*/5 * * * *', bot))
+    # Hourly
+    bot.loop.create_task(utils.cron_update_league('0 * * * *', bot))
+    # Some days
+    bot.loop.create_task(utils.cron_week_in_review(WEEK_IN_REVIEW, bot))
+    # Ahead of game windows, waivers and the weekly review
+    bot.loop.create_task(utils.cron_prefetch(utils.PEAKS + [utils.Peak('Week in review', WEEK_IN_REVIEW, None, 'review')],
+                                             bot))
+
+    with open(AUTHFILE, 'r') as f:
+        token = json.load(f)['discord']['token']
+    assert token, 'Discord token not found!'
+
+    bot.run(token)
 
 
-bot.run(token)
+# Commands are importable (see loadtest.py); only running the module starts the bot
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Starting lineups
+#
+# A lineup is the league's starting slots (see providers.base.SLOT_POSITIONS)
+# filled from a roster. The best lineup is found exactly: players are taken
+# most points first, each kept if every player kept so far can still be
+# seated, reshuffling earlier picks between slots if need be (an augmenting
+# path). Only players carry points, so taking them best first this way is
+# optimal even with flex slots and players listed at several positions.
+#
+# A lineup is a dozen slots and a few dozen players, so a whole league's
+# season of them (see best) takes milliseconds.
+
+import collections
+
+import numpy as np
+
+from providers import base
+
+
+# Points a team scored each week, and could have with its best lineup
+Week = collections.namedtuple('Week', ['week', 'team', 'actual', 'optimal'])
+
+
+def eligibility(slots, positions):
+    """
+    :return: bool array of players x slots, True where the player fits
+    """
+    # Positions repeat a lot, so each distinct one is checked once
+    distinct = sorted(set(positions))
+    table = np.array([[base.fits(slot, p) for slot in slots] for p in distinct], dtype=bool).reshape(
+        len(distinct), len(slots))
+    return table[[distinct.index(p) for p in positions]] if positions else table[:0]
+
+
+def _assign(fit, points):
+    """
+    :param fit: eligibility of players x slots
+    :param points: points of each player
+    :return: list of the player row seated in each slot, -1 where empty
+    """
+    seated = [-1] * fit.shape[1]
+    options = [np.flatnonzero(f).tolist() for f in fit]
+
+    def seat(row, tried):
+        # Find row a slot, moving whoever holds it elsewhere if they can go
+        for slot in options[row]:
+            if slot in tried:
+                continue
+            tried.add(slot)
+            if seated[slot] < 0 or seat(seated[slot], tried):
+                seated[slot] = row
+                return True
+        return False
+
+    free = len(seated)
+    for row in np.argsort(-np.nan_to_num(points, nan=-np.inf), kind='stable').tolist():
+        if options[row] and seat(row, set()):
+            free -= 1
+            if not free:
+                break
+    return seated
+
+
+def fill(slots, positions, points):
+    """
+    Fill lineup slots for the most points
+
+    :param slots: list of lineup slots
+    :param positions: position of each player
+    :param points: points (or value) of each player
+    :return: list of (slot, player row or None) in slots order
+    """
+    seated = _assign(eligibility(slots, positions), np.asarray(points, dtype=np.float64))
+    return [(slot, row if row >= 0 else None) for slot, row in zip(slots, seated)]
+
+
+def total(slots, positions, points):
+    """
+    :return: points scored by the best lineup
+    """
+    return float(sum(points[row] for _, row in fill(slots, positions, points) if row is not None))
+
+
+def best(table, slots):
+    """
+    Best lineup of every team in every week
+
+    :param table: LineupTable
+    :param slots: the league's starting lineup slots
+    :return: (list of Week by week then team, dict of (week, team) -> LineupTable
+        rows seated in the best lineup, in slots order with -1 for empty slots)
+    """
+    if not len(table):
+        return [], {}
+    fit = eligibility(slots, table.positions)
+    points = np.nan_to_num(table.points)
+    order = np.lexsort((table.teams, table.weeks))
+    weeks, teams = table.weeks[order], table.teams[order]
+    # Rows of one team's week are contiguous once sorted
+    starts = np.flatnonzero(np.r_[True, (weeks[1:] != weeks[:-1]) | (teams[1:] != teams[:-1])])
+    results, seats = [], {}
+    for rows in np.split(order, starts[1:]):
+        seated = [int(rows[i]) if i >= 0 else -1 for i in _assign(fit[rows], points[rows])]
+        week, team = int(table.weeks[rows[0]]), int(table.teams[rows[0]])
+        results.append(Week(week, team, float(points[rows][table.started[rows]].sum()),
+                            float(sum(points[i] for i in seated if i >= 0))))
+        seats[week, team] = seated
+    return results, seats
@@ -0,0 +1,293 @@
+# Load test of the Discord command layer
+#
+# Drives the discbot commands with fake Discord contexts, as a league full
+# of users would on a Sunday, against a local stand-in for Yahoo that
+# answers from recorded responses with injected latency and errors:
+#
+#   ffbot --record DIR warm                  record the league once
+#   ffbot loadtest DIR --users 30 --concurrency 10 --upstream-latency 0.3 --errors 0.05
+#
+# and reports command throughput, p50/p99 latency per command, how long the
+# event loop was blocked and how many requests reached upstream.
+
+import asyncio
+import collections
+import http.server
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+import types
+import urllib.parse
+
+import numpy as np
+
+import yclient
+
+
+logger = logging.getLogger(__name__)
+
+# Sunday traffic: (command, keyword arguments, weight); mostly matchups
+MIX = [
+    ('mymatchup', {}, 10),
+    ('standings', {}, 6),
+    ('player', {'content': 'mahomes'}, 3),
+    ('powerrankings', {}, 2),
+    ('allplay', {}, 1),
+    ('luck', {}, 1),
+    ('records', {}, 1),
+    ('pickups', {}, 1),
+    ('playoffs', {}, 1),
+]
+# Seconds between event loop lag samples; wake ups later than BLOCKED count
+# as the loop being blocked rather than scheduling jitter
+LAG_INTERVAL = 0.01
+BLOCKED = 0.005
+# Yahoo's answer to too many requests
+THROTTLED = 999
+
+Report = collections.namedtuple('Report', ['commands', 'failed', 'elapsed', 'latencies', 'lag',
+                                           'upstream', 'scheduled', 'sent', 'edits'])
+
+
+class StubYahoo(object):
+    """
+    Local HTTP server standing in for the Yahoo API
+
+    Answers from responses recorded by yclient.RecordingClient; uris that
+    were never recorded get a 404.
+
+    :param path: directory of recordings
+    :param latency: mean seconds per response (exponentially distributed)
+    :param errors: fraction of requests throttled
+    """
+    def __init__(self, path, latency=0.0, errors=0.0, seed=0):
+        self.path = path
+        self.latency = latency
+        self.errors = errors
+        self.requests = collections.Counter()
+        self.status = collections.Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub._respond(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+
+    def _respond(self, request):
+        uri = urllib.parse.unquote(request.path[1:])
+        with self._lock:
+            throttled = self._random.random() < self.errors
+            delay = self._random.expovariate(1.0 / self.latency) if self.latency else 0.0
+        time.sleep(delay)
+        path = os.path.join(self.path, yclient.ReplayClient.filename(uri))
+        if throttled:
+            status, body = THROTTLED, b'Request denied'
+        elif not os.path.exists(path):
+            status, body = 404, b'Not recorded'
+        else:
+            status = 200
+            with open(path, 'rb') as f:
+                body = f.read()
+        with self._lock:
+            self.requests[uri] += 1
+            self.status[status] += 1
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/xml')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {'requests': sum(self.requests.values()), 'uris': len(self.requests),
+                    'throttled': self.status[THROTTLED], 'not_recorded': self.status[404]}
+
+
+#
+# Fake Discord
+#
+
+
+_ids = itertools.count(1)
+
+
+class FakeMessage(object):
+    def __init__(self, channel, content):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content=None):
+        self.content = content
+        self.channel.edits += 1
+
+    async def delete(self):
+        pass
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def clear_reactions(self):
+        pass
+
+
+class FakeChannel(object):
+    """
+    Keeps what the bot sends; each send takes latency seconds, like a
+    round trip to Discord
+    """
+    def __init__(self, name='general', latency=0.05):
+        self.id = next(_ids)
+        self.name = name
+        self.latency = latency
+        self.messages = []
+        self.edits = 0
+
+    async def send(self, content):
+        await asyncio.sleep(self.latency)
+        message = FakeMessage(self, content)
+        self.messages.append(message)
+        return message
+
+
+class FakeBot(object):
+    latency = 0.0
+
+    async def wait_for(self, event, timeout=None, check=None):
+        # Nobody turns pages
+        raise asyncio.TimeoutError()
+
+
+def fake_context(bot, channel, user_id):
+    author = types.SimpleNamespace(id=user_id, display_name='user %d' % user_id,
+                                   mention='<@%d>' % user_id, roles=[])
+    return types.SimpleNamespace(bot=bot, channel=channel, author=author, guild=None, send=channel.send,
+                                 message=types.SimpleNamespace(author=author, channel=channel))
+
+
+#
+# Load
+#
+
+
+async def _watch_loop(lags, done):
+    # How late each short sleep wakes up is how long the loop was blocked
+    loop = asyncio.get_event_loop()
+    while not done.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+async def _load(discbot, calls, concurrency):
+    latencies = collections.defaultdict(list)
+    failed = collections.Counter()
+    queue = collections.deque(calls)
+
+    async def worker():
+        while queue:
+            name, ctx, kwargs = queue.popleft()
+            start = time.perf_counter()
+            try:
+                await getattr(discbot, name).callback(ctx, **kwargs)
+            except Exception as e:
+                failed[name] += 1
+                logger.warning('%s failed: %r', name, e)
+                continue
+            latencies[name].append(time.perf_counter() - start)
+
+    lags, done = [], asyncio.Event()
+    watcher = asyncio.ensure_future(_watch_loop(lags, done))
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    done.set()
+    await watcher
+    return latencies, failed, elapsed, lags
+
+
+def run(stub, users=30, commands=300, concurrency=10, channels=1, send_latency=0.05, mix=MIX, seed=0):
+    """
+    Run a load test; the bot's Yahoo client must already point at the stub
+    (FFBOT_YAHOO_URL)
+
+    :param stub: started StubYahoo
+    :param users: Discord users sending commands; mapped users first
+    :param commands: commands to send in total
+    :param concurrency: commands in flight at once
+    :param channels: channels the users are spread over
+    :param send_latency: seconds each message send takes
+    :return: Report
+    """
+    import discbot
+    import utils
+    import yscheduler
+    rng = random.Random(seed)
+    mapped = [int(i) for i in utils.get_mgr_json()]
+    user_ids = (mapped + [10 ** 6 + i for i in range(users)])[:users]
+    bot = FakeBot()
+    rooms = [FakeChannel('general' if i == 0 else 'general-%d' % i, send_latency) for i in range(channels)]
+    contexts = [fake_context(bot, rooms[i % channels], user_id) for i, user_id in enumerate(user_ids)]
+    weights = [w for _, _, w in mix]
+    calls = [(name, rng.choice(contexts), kwargs) for name, kwargs, _ in rng.choices(mix, weights, k=commands)]
+
+    before = sum(s['requests'] for s in yscheduler.SCHEDULER.stats().values())
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        latencies, failed, elapsed, lags = loop.run_until_complete(_load(discbot, calls, concurrency))
+    finally:
+        # Outbox workers and background refreshes
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+    scheduled = sum(s['requests'] for s in yscheduler.SCHEDULER.stats().values()) - before
+    return Report(sum(len(v) for v in latencies.values()), failed, elapsed, dict(latencies), lags,
+                  stub.stats(), scheduled, sum(len(r.messages) for r in rooms), sum(r.edits for r in rooms))
+
+
+def report_lines(report):
+    """
+    :param report: Report
+    :return: list of printable lines
+    """
+    lines = ['%d commands in %.2fs: %.1f/s, %d failed' % (
+        report.commands, report.elapsed, report.commands / report.elapsed if report.elapsed else 0.0,
+        sum(report.failed.values()))]
+    lines.append('%-16s %6s %9s %9s %9s' % ('command', 'count', 'p50', 'p99', 'max'))
+    every = [t for times in report.latencies.values() for t in times]
+    for name, times in sorted(report.latencies.items()) + [('all', every)]:
+        if times:
+            p50, p99 = np.percentile(times, [50, 99])
+            lines.append('%-16s %6d %8.0fms %8.0fms %8.0fms' % (name, len(times), 1000 * p50, 1000 * p99,
+                                                                 1000 * max(times)))
+    lags = np.asarray(report.lag or [0.0])
+    blocked = lags[lags > BLOCKED]
+    lines.append('event loop blocked %.2fs in total (%d stalls over %.0fms), p99 lag %.1fms, longest %.0fms' % (
+        blocked.sum(), len(blocked), 1000 * BLOCKED, 1000 * np.percentile(lags, 99), 1000 * lags.max()))
+    lines.append('upstream: %d requests scheduled, %d reached the stub (%d uris, %d throttled, %d not recorded)' % (
+        report.scheduled, report.upstream['requests'], report.upstream['uris'], report.upstream['throttled'],
+        report.upstream['not_recorded']))
+    lines.append('discord: %d messages sent, %d edited' % (report.sent, report.edits))
+    return lines
@@ -0,0 +1,275 @@
+# Outbound Discord messages
+#
+# Everything the bot says goes through one Outbox, which
+#
+#  - packs whatever is queued for a channel into the fewest messages that
+#    fit Discord's 2000 character limit
+#  - splits oversized output on line boundaries, keeping code blocks intact,
+#    and shows it as one message paged with reactions instead of a flood
+#  - paces sends per channel against Discord's rate limit bucket (5 messages
+#    per 5 seconds) so the bot waits its turn instead of collecting 429s
+#
+# Each channel has a worker that drains its queue: results sent at the same
+# time (e.g. several league events) go out together.
+
+import asyncio
+import collections
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+MESSAGE_LIMIT = 2000
+# Discord allows 5 messages per 5 seconds in a channel
+CHANNEL_RATE = (5, 5.0)
+PAGE_TIMEOUT = 300.0
+PREVIOUS, NEXT = '\N{BLACK LEFT-POINTING TRIANGLE}', '\N{BLACK RIGHT-POINTING TRIANGLE}'
+# Room kept free on every page for its page number
+FOOTER_ROOM = 20
+
+
+def split(content, limit=MESSAGE_LIMIT):
+    """
+    Cut content into pieces that fit a message, on line boundaries
+
+    Code blocks are closed at the end of a piece and reopened at the start
+    of the next.
+
+    :return: list of strings
+    """
+    if len(content) <= limit:
+        return [content]
+    fenced = content.startswith('```') and content.endswith('```') and len(content) >= 6
+    body = content[3:-3] if fenced else content
+    room = limit - (7 if fenced else 0)
+    pieces, current = [], ''
+    for line in body.splitlines(keepends=True):
+        while len(line) > room:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:room])
+            line = line[room:]
+        if len(current) + len(line) > room:
+            pieces.append(current)
+            current = ''
+        current += line
+    if current:
+        pieces.append(current)
+    if not fenced:
+        return pieces
+    # A newline after the fence keeps the first word from reading as a language
+    return ['```' + (p if i == 0 else '\n' + p) + '```' for i, p in enumerate(pieces)]
+
+
+def pack(contents, limit=MESSAGE_LIMIT):
+    """
+    Fewest messages holding every content, in order
+
+    :param contents: list of strings
+    :return: (list of message strings, number of messages it would take unpacked)
+    """
+    pieces = [p for content in contents if content for p in split(content, limit)]
+    messages = []
+    for piece in pieces:
+        if messages and len(messages[-1]) + 1 + len(piece) <= limit:
+            messages[-1] += '\n' + piece
+        else:
+            messages.append(piece)
+    return messages, len(pieces)
+
+
+class _Bucket(object):
+    """
+    Token bucket of one channel's send allowance
+    """
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """
+        Take a token
+
+        :return: seconds to wait before using it
+        """
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens * self.per / self.rate)
+
+
+_Outgoing = collections.namedtuple('_Outgoing', ['contents', 'bot', 'alone', 'future'])
+
+
+class Outbox(object):
+    """
+    Queues, packs, pages and paces messages per channel
+    """
+    def __init__(self, limit=MESSAGE_LIMIT, rate=CHANNEL_RATE):
+        self.limit = limit
+        self.rate = rate
+        self._queues = {}
+        self._buckets = {}
+        # message id -> [pages, current page] of paged messages
+        self._pages = {}
+        self.metrics = collections.Counter()
+
+    async def send(self, channel, contents, bot=None, alone=False):
+        """
+        Queue contents for a channel
+
+        :param channel: discord channel (or anything with send)
+        :param contents: message or list of messages
+        :param bot: used to page oversized output with reactions; split into
+            several messages without it
+        :param alone: do not pack with other queued contents, i.e. the
+            messages will be edited later
+        :return: list of sent messages
+        """
+        contents = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+        contents = [c if isinstance(c, str) else str(c) for c in contents if c is not None]
+        key = getattr(channel, 'id', id(channel))
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue()
+            asyncio.ensure_future(self._worker(channel, key, queue))
+        future = asyncio.get_event_loop().create_future()
+        await queue.put(_Outgoing(contents, bot, alone, future))
+        return await future
+
+    async def _worker(self, channel, key, queue):
+        while True:
+            batch = [await queue.get()]
+            # Let anything queued in the same tick join the batch
+            await asyncio.sleep(0)
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            # Runs of packable items go out together; alone items on their own
+            groups = []
+            for item in batch:
+                if item.alone or not groups or groups[-1][-1].alone:
+                    groups.append([item])
+                else:
+                    groups[-1].append(item)
+            for group in groups:
+                try:
+                    messages = await self._deliver(channel, key, group)
+                except Exception as e:
+                    for item in group:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                    continue
+                for item in group:
+                    if not item.future.done():
+                        item.future.set_result(messages)
+
+    async def _deliver(self, channel, key, group):
+        pages, unpacked = pack([c for item in group for c in item.contents], self.limit - FOOTER_ROOM)
+        bot = next((item.bot for item in group if item.bot is not None), None)
+        self.metrics['requested'] += unpacked
+        if len(pages) > 1 and bot is not None:
+            message = await self._send(channel, key, self._page(pages, 0))
+            self._pages[message.id] = [pages, 0]
+            self.metrics['sent'] += 1
+            self.metrics['paged'] += 1
+            asyncio.ensure_future(self._turn_pages(bot, message))
+            return [message]
+        messages = [await self._send(channel, key, page) for page in pages]
+        self.metrics['sent'] += len(messages)
+        return messages
+
+    async def _send(self, channel, key, content, **kwargs):
+        bucket = self._buckets.setdefault(key, _Bucket(*self.rate))
+        wait = bucket.take()
+        if wait:
+            self.metrics['rate_limited'] += 1
+            self.metrics['rate_wait_ms'] += int(wait * 1000)
+            await asyncio.sleep(wait)
+        return await channel.send(content, **kwargs)
+
+    async def upload(self, channel, content, file):
+        """
+        Send a file, paced with the channel's other messages but never packed
+
+        :param channel: discord channel
+        :param content: message sent with the file
+        :param file: discord.File
+        :return: the sent message
+        """
+        message = await self._send(channel, getattr(channel, 'id', id(channel)), content, file=file)
+        self.metrics['requested'] += 1
+        self.metrics['sent'] += 1
+        return message
+
+    @staticmethod
+    def _page(pages, index):
+        if len(pages) == 1:
+            return pages[0]
+        return pages[index] + '\npage %d/%d' % (index + 1, len(pages))
+
+    async def _turn_pages(self, bot, message):
+        try:
+            await message.add_reaction(PREVIOUS)
+            await message.add_reaction(NEXT)
+        except Exception as e:
+            logger.warning('Could not add page reactions: %r', e)
+            return
+
+        def check(reaction, user):
+            return (reaction.message.id == message.id and not user.bot
+                    and str(reaction.emoji) in (PREVIOUS, NEXT))
+
+        while True:
+            try:
+                reaction, user = await bot.wait_for('reaction_add', timeout=PAGE_TIMEOUT, check=check)
+            except asyncio.TimeoutError:
+                break
+            pages, index = self._pages[message.id]
+            index = (index + (1 if str(reaction.emoji) == NEXT else -1)) % len(pages)
+            self._pages[message.id][1] = index
+            await message.edit(content=self._page(pages, index))
+            try:
+                await reaction.remove(user)
+            except Exception:
+                # Needs manage messages; the arrows still work, just untidy
+                pass
+        self._pages.pop(message.id, None)
+        try:
+            await message.clear_reactions()
+        except Exception:
+            pass
+
+    async def edit(self, messages, contents):
+        """
+        Replace what earlier sent messages say
+
+        Paged messages get the new pages; otherwise messages are edited in
+        order, with extra pages sent after them and unneeded messages deleted.
+
+        :param messages: messages returned by send
+        :param contents: message or list of messages
+        """
+        contents = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+        pages, _ = pack(contents, self.limit - FOOTER_ROOM)
+        if len(messages) == 1 and messages[0].id in self._pages:
+            self._pages[messages[0].id] = [pages, 0]
+            await messages[0].edit(content=self._page(pages, 0))
+            return
+        for message, page in zip(messages, pages):
+            await message.edit(content=page)
+        if len(pages) > len(messages) and messages:
+            await self.send(messages[-1].channel, pages[len(messages):], alone=True)
+        for message in messages[len(pages):]:
+            await message.delete()
+
+    def stats(self):
+        """
+        :return: dict of counters; saved is messages not sent thanks to packing and paging
+        """
+        stats = dict(self.metrics)
+        stats['saved'] = self.metrics['requested'] - self.metrics['sent']
+        return stats
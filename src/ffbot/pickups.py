@@ -0,0 +1,104 @@
+# Free agent recommendations
+#
+# Every candidate gets a value, a weighted mean of its recent, season and
+# projected points per week (whichever the provider has). What a pickup is
+# worth to a team is how much it beats the starter it would replace: the
+# weakest starter in any lineup slot its position can fill (see lineups).
+#
+# Scoring the pool is a handful of array operations over candidates x slots,
+# so it costs the same for 25 players or 500. The pool itself only changes
+# when waivers run, so it is kept between waiver cycles.
+
+import collections
+import json
+import time
+
+import numpy as np
+
+import lineups
+
+from providers import base
+
+
+# Weight of recent form, season to date and projections in a player's value
+WEIGHTS = collections.OrderedDict([('recent', 0.5), ('season', 0.2), ('projected', 0.3)])
+
+Pickup = collections.namedtuple('Pickup', ['row', 'value', 'gain', 'replaces'])
+
+
+def values(table, weights=WEIGHTS):
+    """
+    Points per week each player is worth, from whichever of recent, season
+    and projected points the player has
+
+    :param table: PlayerStatsTable
+    :return: array of values; 0 for players without any stats
+    """
+    parts = np.vstack([getattr(table, name) for name in weights]) if len(table) else np.empty((len(weights), 0))
+    w = np.fromiter(weights.values(), dtype=np.float64)[:, None]
+    known = ~np.isnan(parts)
+    total = (w * known).sum(axis=0)
+    return np.where(total > 0, np.nansum(parts * w, axis=0) / np.where(total > 0, total, 1), 0.0)
+
+
+def rank(pool, roster, slots, limit=10, position=None):
+    """
+    Best pickups for a team
+
+    :param pool: PlayerStatsTable of available players
+    :param roster: PlayerStatsTable of the team's players
+    :param slots: the league's starting lineup slots
+    :param limit: number of pickups
+    :param position: only consider this position
+    :return: list of Pickup that would start, most gain first; row is the
+        player's row in pool, replaces the roster row of the starter that
+        would sit or None for an empty slot
+    """
+    rows = np.arange(len(pool))
+    if position:
+        rows = rows[np.array([position.upper() in p.split(',') for p in pool.positions], dtype=bool)]
+        pool = pool.take(rows)
+    if not len(pool) or not slots:
+        return []
+    worth = values(pool)
+    roster_worth = values(roster)
+    lineup = lineups.fill(slots, roster.positions, roster_worth)
+    # Value of whoever holds each slot; an empty slot is worth nothing
+    held = np.array([roster_worth[row] if row is not None else 0.0 for _, row in lineup])
+    fit = lineups.eligibility(slots, pool.positions)
+    weakest = np.where(fit, held[None, :], np.inf)
+    slot = weakest.argmin(axis=1)
+    gain = worth - weakest[np.arange(len(pool)), slot]
+    # Only players who would start are worth a pickup
+    order = [i for i in np.lexsort((-worth, -gain)).tolist() if gain[i] > 0][:limit]
+    return [Pickup(int(rows[i]), float(worth[i]), float(gain[i]), lineup[slot[i]][1]) for i in order]
+
+
+class Pool(object):
+    """
+    The available player pool as of a point in time
+    """
+    def __init__(self, players, built=None):
+        self.players = players
+        self.built = time.time() if built is None else built
+
+    def without(self, rostered):
+        """
+        :param rostered: keys of players on a roster now
+        :return: PlayerStatsTable of the pool minus players picked up since it was built
+        """
+        return self.players.take(~np.isin(self.players.keys, list(rostered)))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'built': self.built, 'players': [list(row) for row in self.players.rows()]},
+                      f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        rows = data['players']
+        table = base.PlayerStatsTable(**dict(zip(base.PlayerStatsTable.columns, zip(*rows)))) if rows \
+            else base.PlayerStatsTable()
+        return cls(table, data['built'])
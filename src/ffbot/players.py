@@ -0,0 +1,189 @@
+# Local player index for discord bot
+# Yahoo only hands out players 25 at a time, so the whole pool is pulled
+# down once (pages fetched concurrently), stored as compact records, and
+# searched locally. Afterwards only players whose ownership changed are
+# re-fetched.
+
+import bisect
+import collections
+import concurrent.futures
+import json
+import re
+import time
+import unicodedata
+
+
+Player = collections.namedtuple('Player', ['key', 'name', 'position', 'team', 'status', 'owner'])
+
+
+def _normalize(text):
+    # Strip accents and punctuation so "Le'Veon" matches "leveon"
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    text = text.lower().replace('-', ' ')
+    return ' '.join(re.sub(r'[^a-z0-9 ]', '', text).split())
+
+
+def _trigrams(text):
+    text = '  ' + text + ' '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PlayerIndex(object):
+    """
+    Player records plus prefix and trigram indexes over their names
+    """
+    page_size = 25
+    workers = 8
+    # Rebuild from scratch after this long; in between only players in new
+    # transactions are refreshed
+    max_age = 7 * 24 * 60 * 60
+
+    def __init__(self, players=(), updated=0.0):
+        self.updated = updated
+        players = [Player(*p) for p in players]
+        self._by_key = collections.OrderedDict((p.key, p) for p in players)
+        self._reindex()
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def _reindex(self):
+        self.players = list(self._by_key.values())
+        self._names = [_normalize(p.name) for p in self.players]
+        # (token, position) pairs sorted for bisect prefix lookup
+        prefixes = []
+        # Full names and each word of them are trigram indexed so a typo in
+        # just a last name still finds the player
+        self._grams = collections.defaultdict(list)
+        self._gram_counts = []
+        self._gram_owner = []
+        for i, name in enumerate(self._names):
+            tokens = set(name.split())
+            prefixes.extend((token, i) for token in tokens)
+            for entry in tokens | {name}:
+                grams = _trigrams(entry)
+                for gram in grams:
+                    self._grams[gram].append(len(self._gram_owner))
+                self._gram_counts.append(len(grams))
+                self._gram_owner.append(i)
+        prefixes.sort()
+        self._tokens = [t for t, _ in prefixes]
+        self._token_ids = [i for _, i in prefixes]
+
+    @property
+    def stale(self):
+        return time.time() - self.updated > self.max_age
+
+    @classmethod
+    def build(cls, fetch_page):
+        """
+        Download the whole player pool, fetching pages concurrently
+
+        :param fetch_page: callable(start, count) returning player records
+        :return: PlayerIndex
+        """
+        players = []
+        start = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=cls.workers) as pool:
+            # The pool size is unknown up front, so pages are requested in
+            # waves until one comes back short
+            while True:
+                starts = range(start, start + cls.workers * cls.page_size, cls.page_size)
+                pages = list(pool.map(lambda s: fetch_page(s, cls.page_size), starts))
+                for page in pages:
+                    players.extend(page)
+                if any(len(page) < cls.page_size for page in pages):
+                    break
+                start = starts[-1] + cls.page_size
+        return cls(players, updated=time.time())
+
+    def refresh(self, changed, fetch_keys):
+        """
+        Re-fetch players whose ownership changed since the last update
+
+        :param changed: player keys from Provider.player_changes
+        :param fetch_keys: callable(list of keys) returning player records
+        :return: number of players refreshed
+        """
+        refreshed_at = time.time()
+        if changed:
+            changed = sorted(changed)
+            chunks = [changed[i:i + self.page_size] for i in range(0, len(changed), self.page_size)]
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for page in pool.map(fetch_keys, chunks):
+                    for player in page:
+                        player = Player(*player)
+                        self._by_key[player.key] = player
+            self._reindex()
+        self.updated = refreshed_at
+        return len(changed or ())
+
+    def get(self, key):
+        return self._by_key.get(key)
+
+    def prefix(self, query):
+        """
+        Players where every word in query starts a word of their name
+
+        :param query: partial name, i.e. "pat mah"
+        :return: list of Player in index order
+        """
+        matches = None
+        for word in _normalize(query).split():
+            found = set()
+            pos = bisect.bisect_left(self._tokens, word)
+            while pos < len(self._tokens) and self._tokens[pos].startswith(word):
+                found.add(self._token_ids[pos])
+                pos += 1
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        return [self.players[i] for i in sorted(matches or ())]
+
+    def fuzzy(self, query, limit=5, cutoff=0.3):
+        """
+        Closest names by trigram similarity; tolerant of typos
+
+        :param query: name as typed
+        :param limit: max results
+        :param cutoff: minimum jaccard similarity
+        :return: list of Player, best match first
+        """
+        grams = _trigrams(_normalize(query))
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        best = {}
+        for entry, n in shared.items():
+            score = n / float(len(grams) + self._gram_counts[entry] - n)
+            i = self._gram_owner[entry]
+            if score >= cutoff and score > best.get(i, 0):
+                best[i] = score
+        ranked = sorted(best, key=lambda i: (-best[i], i))
+        return [self.players[i] for i in ranked[:limit]]
+
+    def search(self, query, limit=5):
+        """
+        Prefix matches if there are any, otherwise fuzzy matches
+
+        :param query: name as typed
+        :param limit: max results
+        :return: list of Player
+        """
+        matches = self.prefix(query)
+        if not matches:
+            return self.fuzzy(query, limit=limit)
+        exact = _normalize(query)
+        matches.sort(key=lambda p: _normalize(p.name) != exact)
+        return matches[:limit]
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'updated': self.updated, 'players': [list(p) for p in self.players]},
+                      f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls(data['players'], updated=data['updated'])
@@ -0,0 +1,169 @@
+# Monte Carlo playoff odds
+# Simulates the rest of the regular season many times over with numpy
+# draws and counts how often each team finishes inside the playoff line.
+# Large runs are split into chunks and spread across a process pool.
+
+import collections
+import concurrent.futures
+import os
+
+import numpy as np
+
+
+# Used when a team has no history yet (week 1) and as the prior that
+# team variance is shrunk toward
+DEFAULT_STDEV = 25.0
+# Weeks of history that weigh the same as the league-wide prior
+PRIOR_WEEKS = 3.0
+# Weight given to Yahoo's projection over a team's scoring average
+PROJECTION_WEIGHT = 0.5
+# Simulations per task handed to a worker process
+CHUNK_SIZE = 25000
+# Enough that odds are within half a percent of the exact value; 200k took
+# a second on its own, 50k leaves room for the rest of the command
+SIMS = 50000
+
+_POOL = None
+
+PlayoffOdds = collections.namedtuple('PlayoffOdds', ['playoffs', 'top_seed', 'mean_wins', 'mean_seed', 'sims'])
+
+
+def get_pool():
+    # Pool is created once and kept warm so commands do not pay for
+    # process start up on every request
+    global _POOL
+    if _POOL is None:
+        _POOL = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _POOL
+
+
+def remaining_schedule(matchups, last_week):
+    """
+    Pull unfinished regular season games out of a MatchupTable
+
+    :param matchups: MatchupTable
+    :param last_week: final week of the regular season
+    :return: list of (week, team index, team index, projection, projection)
+    """
+    left = matchups.take(~matchups.final & (matchups.weeks <= last_week) & (matchups.away >= 0))
+    # Missing projections are treated as unknown (0) and fall back to history
+    home_projected = np.nan_to_num(left.home_projected)
+    away_projected = np.nan_to_num(left.away_projected)
+    return list(zip(left.weeks.tolist(), left.home.tolist(), left.away.tolist(),
+                    home_projected.tolist(), away_projected.tolist()))
+
+
+class PlayoffSimulator(object):
+    """
+    Playoff odds for a SeasonMatrix and the games left to play
+
+    Each team's weekly score is drawn from a normal distribution centered on
+    a blend of its scoring average and Yahoo's projection, with a standard
+    deviation shrunk toward the league-wide spread. Standings are decided by
+    wins (ties worth half) and then points for, which is Yahoo's and
+    Sleeper's default tiebreaker. Neither exposes a league's tiebreaker
+    setting, so leagues that break ties head to head are seeded by points
+    for all the same. When divisions are given, every division winner is
+    guaranteed a spot before the remaining spots are filled by record.
+
+    boost shifts teams' weekly means, i.e. by what a trade changes their
+    best lineup's points per week.
+    """
+    def __init__(self, season, games, num_playoff_teams, divisions=None, boost=None):
+        self.season = season
+        self.num_playoff_teams = int(num_playoff_teams)
+        self.divisions = None if divisions is None else np.asarray(divisions)
+        games = list(games)
+        self.home = np.array([g[1] for g in games], dtype=np.int64)
+        self.away = np.array([g[2] for g in games], dtype=np.int64)
+        self.home_mean, self.home_sd = self._distribution(self.home, [g[3] for g in games])
+        self.away_mean, self.away_sd = self._distribution(self.away, [g[4] for g in games])
+        if boost is not None:
+            boost = np.asarray(boost, dtype=np.float64)
+            self.home_mean = self.home_mean + boost[self.home]
+            self.away_mean = self.away_mean + boost[self.away]
+
+    def _distribution(self, teams, projected):
+        scores = self.season.scores
+        played = self.season.played.sum(axis=1)
+        if scores.size and played.any():
+            league_mean = np.nanmean(scores)
+            league_var = np.nanvar(scores) if played.sum() > 1 else DEFAULT_STDEV ** 2
+            sums = np.nansum(scores, axis=1)
+            means = np.where(played > 0, sums / np.maximum(played, 1), league_mean)
+            sq_dev = np.nansum((scores - means[:, None]) ** 2, axis=1)
+        else:
+            league_mean, league_var = 0.0, DEFAULT_STDEV ** 2
+            means = np.zeros(len(self.season))
+            sq_dev = np.zeros(len(self.season))
+        # Shrink each team's variance toward the league's
+        var = (sq_dev + PRIOR_WEEKS * league_var) / (played + PRIOR_WEEKS)
+        projected = np.asarray(projected, dtype=np.float64)
+        mean = means[teams]
+        has_history = played[teams] > 0
+        has_projection = projected > 0
+        mean = np.where(has_projection & has_history,
+                        PROJECTION_WEIGHT * projected + (1 - PROJECTION_WEIGHT) * mean,
+                        np.where(has_projection, projected, mean))
+        return mean, np.sqrt(var[teams])
+
+    def _state(self):
+        return (self.season.actual_wins(), self.season.points_for(), self.home, self.away,
+                self.home_mean, self.home_sd, self.away_mean, self.away_sd,
+                self.num_playoff_teams, self.divisions)
+
+    def run(self, sims=SIMS, seed=None, parallel=True):
+        """
+        Simulate the remaining schedule
+
+        :param sims: number of seasons to simulate
+        :param seed: seed for reproducible results
+        :param parallel: spread chunks across the process pool
+        :return: PlayoffOdds of arrays indexed by team
+        """
+        chunks = [CHUNK_SIZE] * (sims // CHUNK_SIZE)
+        if sims % CHUNK_SIZE:
+            chunks.append(sims % CHUNK_SIZE)
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        state = self._state()
+        tasks = [(state, n, s) for n, s in zip(chunks, seeds)]
+        if parallel and len(tasks) > 1:
+            results = list(get_pool().map(_simulate_chunk, tasks))
+        else:
+            results = [_simulate_chunk(t) for t in tasks]
+        playoffs, top_seed, wins, seeds_sum = [sum(r[i] for r in results) for i in range(4)]
+        return PlayoffOdds(playoffs / sims, top_seed / sims, wins / sims, seeds_sum / sims, sims)
+
+
+def _simulate_chunk(task):
+    # Top level so it can be pickled into worker processes
+    state, sims, seed = task
+    wins0, pf0, home, away, home_mean, home_sd, away_mean, away_sd, num_playoff_teams, divisions = state
+    rng = np.random.default_rng(seed)
+    teams = len(wins0)
+    home_pts = rng.normal(home_mean, home_sd, size=(sims, len(home)))
+    away_pts = rng.normal(away_mean, away_sd, size=(sims, len(away)))
+    # One-hot (games, teams) matrices turn per-game results into per-team
+    # totals with a single matrix multiply
+    home_onehot = np.zeros((len(home), teams))
+    home_onehot[np.arange(len(home)), home] = 1
+    away_onehot = np.zeros((len(away), teams))
+    away_onehot[np.arange(len(away)), away] = 1
+    tied = 0.5 * (home_pts == away_pts)
+    wins = (wins0 + ((home_pts > away_pts) + tied) @ home_onehot
+            + ((away_pts > home_pts) + tied) @ away_onehot)
+    pf = pf0 + home_pts @ home_onehot + away_pts @ away_onehot
+
+    # Best team first: wins, then points for
+    order = np.lexsort((-pf, -wins), axis=1)
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(teams)[None, :], axis=1)
+    priority = rank.copy()
+    if divisions is not None:
+        for division in np.unique(divisions):
+            members = np.flatnonzero(divisions == division)
+            winner = members[rank[:, members].argmin(axis=1)]
+            priority[np.arange(sims), winner] -= teams
+    seeding = np.argsort(np.argsort(priority, axis=1), axis=1)
+    made = seeding < num_playoff_teams
+    return made.sum(axis=0), (seeding == 0).sum(axis=0), wins.sum(axis=0), (seeding + 1).sum(axis=0)
@@ -0,0 +1,217 @@
+# League records book
+#
+# All time records kept as running aggregates and updated a week at a time
+# as weeks finish, so a record question never needs more than the week
+# that just ended:
+#
+#   high/low scores       best N single week scores, both ends
+#   blowouts/nailbiters   best N winning margins, both ends
+#   win/losing streaks    each manager's current streak and the best N ever,
+#                         ongoing ones included
+#   season highs/lows     best and worst single week of each season
+#   season points         each manager's points per season
+#
+# The top N lists are bounded heaps, so folding in a week costs
+# O(games log N) no matter how much history there is.
+
+import collections
+import heapq
+import json
+
+import numpy as np
+
+
+TOP_N = 10
+
+Record = collections.namedtuple('Record', ['value', 'season', 'week', 'manager', 'name'])
+
+TITLES = collections.OrderedDict([
+    ('high_scores', 'Highest score'),
+    ('low_scores', 'Lowest score'),
+    ('blowouts', 'Biggest blowout'),
+    ('nailbiters', 'Closest game'),
+    ('win_streaks', 'Longest winning streak'),
+    ('loss_streaks', 'Longest losing streak'),
+])
+
+
+class _Top(object):
+    """
+    The n best records; largest values are best unless largest is False
+    """
+    def __init__(self, n, largest=True, records=()):
+        self.n = n
+        self.largest = largest
+        # Min heap of (key, record), so the worst record kept is on top
+        self._heap = []
+        for record in records:
+            self.push(Record(*record))
+
+    def _item(self, record):
+        return (record.value if self.largest else -record.value, record)
+
+    def push(self, record):
+        """
+        :return: True if the record made the list
+        """
+        item = self._item(record)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, item)
+            return True
+        if item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+            return True
+        return False
+
+    def discard(self, record):
+        item = self._item(record)
+        if item in self._heap:
+            self._heap.remove(item)
+            heapq.heapify(self._heap)
+
+    def records(self):
+        """
+        :return: list of Record, best first
+        """
+        return [r for _, r in sorted(self._heap, reverse=True)]
+
+
+class RecordsBook(object):
+    """
+    All time league records, folded in one finished week at a time
+    """
+    def __init__(self, top_n=TOP_N):
+        self.top_n = top_n
+        self.tops = collections.OrderedDict(
+            (name, _Top(top_n, largest=name not in ('low_scores', 'nailbiters'))) for name in TITLES)
+        # (league key, week) already folded in, and league keys looked at,
+        # whether or not any of their weeks had finished
+        self.weeks = set()
+        self.seasons = set()
+        self.season_highs = {}
+        self.season_lows = {}
+        self.season_points = collections.defaultdict(dict)
+        # manager -> (signed streak length, Record of the streak so far)
+        self._current = {}
+
+    def _streak(self, manager, name, result, season, week):
+        length, last = self._current.get(manager, (0, None))
+        if result == 0:
+            self._current[manager] = (0, None)
+            return
+        same = length != 0 and (length > 0) == (result > 0)
+        length = length + result if same else result
+        top = self.tops['win_streaks' if result > 0 else 'loss_streaks']
+        record = Record(abs(length), season, week, manager, name)
+        if same and last is not None:
+            # An ongoing streak replaces its own shorter entry
+            top.discard(last)
+        top.push(record)
+        self._current[manager] = (length, record)
+
+    def _score(self, record):
+        self.tops['high_scores'].push(record)
+        self.tops['low_scores'].push(record)
+        high, low = self.season_highs.get(record.season), self.season_lows.get(record.season)
+        if high is None or record.value > high.value:
+            self.season_highs[record.season] = record
+        if low is None or record.value < low.value:
+            self.season_lows[record.season] = record
+        points = self.season_points[record.season]
+        points[record.manager] = round(points.get(record.manager, 0.0) + record.value, 2)
+
+    def add_season(self, season):
+        """
+        Fold in every week of a season that has finished and is not in yet
+
+        Weeks go in order and stop at the first unfinished one, so calling
+        this after each sync keeps the book current.
+
+        :param season: providers.base.Season
+        :return: list of weeks added
+        """
+        teams, games = season.teams, season.matchups
+        year = season.season or season.key
+        managers = [m or k for m, k in zip(teams.manager_ids, teams.keys)]
+        self.seasons.add(season.key)
+        added = []
+        for week in np.unique(games.weeks).tolist():
+            if (season.key, week) in self.weeks:
+                continue
+            rows = games.take((games.weeks == week) & (games.away >= 0))
+            if not len(rows) or not rows.final.all():
+                break
+            for h, a, hp, ap in zip(rows.home.tolist(), rows.away.tolist(),
+                                    rows.home_points.tolist(), rows.away_points.tolist()):
+                if h >= len(managers) or a >= len(managers):
+                    continue
+                for team, opponent, points, against in ((h, a, hp, ap), (a, h, ap, hp)):
+                    self._score(Record(round(points, 2), year, week, managers[team], teams.names[team]))
+                    self._streak(managers[team], teams.names[team], (points > against) - (points < against),
+                                 year, week)
+                if hp != ap:
+                    winner, loser = (h, a) if hp > ap else (a, h)
+                    margin = Record(round(abs(hp - ap), 2), year, week, managers[winner],
+                                    '%s over %s' % (teams.names[winner], teams.names[loser]))
+                    self.tops['blowouts'].push(margin)
+                    self.tops['nailbiters'].push(margin)
+            self.weeks.add((season.key, week))
+            added.append(week)
+        return added
+
+    def records(self, name):
+        """
+        :param name: one of TITLES
+        :return: list of Record, best first
+        """
+        return self.tops[name].records()
+
+    def most_season_points(self, limit=TOP_N):
+        """
+        :return: list of (points, season, manager), most first
+        """
+        totals = [(points, season, manager) for season, by_manager in self.season_points.items()
+                  for manager, points in by_manager.items()]
+        return sorted(totals, reverse=True)[:limit]
+
+    def set_in(self, season, week):
+        """
+        Records that a week's results made it onto
+
+        :param season: season as shown in records (i.e. '2019')
+        :return: list of (name, rank, Record)
+        """
+        made = []
+        for name, top in self.tops.items():
+            for rank, record in enumerate(top.records(), 1):
+                if record.season == season and record.week == week:
+                    made.append((name, rank, record))
+        return made
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'top_n': self.top_n,
+                'weeks': sorted(self.weeks),
+                'seasons': sorted(self.seasons),
+                'tops': {name: top.records() for name, top in self.tops.items()},
+                'season_highs': self.season_highs,
+                'season_lows': self.season_lows,
+                'season_points': self.season_points,
+                'current': self._current,
+            }, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        book = cls(data['top_n'])
+        book.weeks = set((key, week) for key, week in data['weeks'])
+        book.seasons = set(data.get('seasons', ())) | set(key for key, _ in book.weeks)
+        for name, records in data['tops'].items():
+            book.tops[name] = _Top(book.top_n, book.tops[name].largest, records)
+        book.season_highs = {s: Record(*r) for s, r in data['season_highs'].items()}
+        book.season_lows = {s: Record(*r) for s, r in data['season_lows'].items()}
+        book.season_points.update(data['season_points'])
+        book._current = {m: (length, Record(*r) if r else None) for m, (length, r) in data['current'].items()}
+        return book
@@ -0,0 +1,144 @@
+# Head to head rivalry index
+#
+# Every game ever played between two managers, kept as manager x manager
+# matrices so any pairing is answered with a few array lookups. Managers
+# are keyed by the provider's stable manager id (Yahoo guid, Sleeper user
+# id) rather than team, since teams are renamed and re-keyed every season.
+#
+#   wins[i, j]    games i won against j
+#   ties[i, j]    games i and j tied
+#   points[i, j]  points i scored against j
+#   streaks[i, j] i's current streak against j; +n won the last n, -n lost
+
+import collections
+import json
+
+import numpy as np
+
+
+Rivalry = collections.namedtuple('Rivalry', ['wins', 'losses', 'ties', 'points_for', 'points_against',
+                                             'streak', 'games'])
+
+
+class RivalryIndex(object):
+    """
+    All time head to head results between managers
+    """
+    def __init__(self, managers=(), names=None, aliases=None, seasons=(),
+                 wins=None, ties=None, points=None, streaks=None):
+        self.managers = list(managers)
+        self._index = {m: i for i, m in enumerate(self.managers)}
+        # Latest team name of each manager, and the identifiers Discord users
+        # are mapped to (email, username) for each manager id
+        self.names = dict(names or {})
+        self.aliases = dict(aliases or {})
+        self.seasons = list(seasons)
+        n = len(self.managers)
+        self.wins = np.zeros((n, n), dtype=np.int64) if wins is None else np.asarray(wins, dtype=np.int64)
+        self.ties = np.zeros((n, n), dtype=np.int64) if ties is None else np.asarray(ties, dtype=np.int64)
+        self.points = np.zeros((n, n)) if points is None else np.asarray(points, dtype=np.float64)
+        self.streaks = np.zeros((n, n), dtype=np.int64) if streaks is None else np.asarray(streaks, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.managers)
+
+    def _grow(self, managers):
+        new = [m for m in dict.fromkeys(managers) if m not in self._index]
+        if not new:
+            return
+        for m in new:
+            self._index[m] = len(self.managers)
+            self.managers.append(m)
+        pad = ((0, len(new)), (0, len(new)))
+        self.wins = np.pad(self.wins, pad)
+        self.ties = np.pad(self.ties, pad)
+        self.points = np.pad(self.points, pad)
+        self.streaks = np.pad(self.streaks, pad)
+
+    def add_season(self, season):
+        """
+        Fold a season's finished games in; seasons must be added oldest first
+        for streaks to come out right
+
+        :param season: providers.base.Season
+        :return: number of games added
+        """
+        teams = season.teams
+        self._grow(m for m in teams.manager_ids if m)
+        for m, name, alias in zip(teams.manager_ids, teams.names, teams.managers):
+            if m:
+                self.names[m] = name
+                if alias:
+                    self.aliases[alias] = m
+        self.seasons.append(season.key)
+        games = season.matchups
+        games = games.take(games.final & (games.away >= 0))
+        order = np.argsort(games.weeks, kind='stable')
+        # Team row -> manager row; -1 where the manager is unknown
+        rows = np.full(max([len(teams)] + (games.home + 1).tolist() + (games.away + 1).tolist()), -1)
+        rows[:len(teams)] = [self._index[m] if m else -1 for m in teams.manager_ids]
+        home, away = rows[games.home[order]], rows[games.away[order]]
+        home_points, away_points = games.home_points[order], games.away_points[order]
+        keep = (home >= 0) & (away >= 0) & (home != away)
+        home, away = home[keep], away[keep]
+        home_points, away_points = home_points[keep], away_points[keep]
+        np.add.at(self.wins, (home, away), home_points > away_points)
+        np.add.at(self.wins, (away, home), away_points > home_points)
+        np.add.at(self.ties, (home, away), home_points == away_points)
+        np.add.at(self.ties, (away, home), home_points == away_points)
+        np.add.at(self.points, (home, away), home_points)
+        np.add.at(self.points, (away, home), away_points)
+        # Streaks depend on the order of games so are walked one by one
+        for h, a, hp, ap in zip(home.tolist(), away.tolist(), home_points.tolist(), away_points.tolist()):
+            if hp == ap:
+                streak = 0
+            elif hp > ap:
+                streak = max(self.streaks[h, a], 0) + 1
+            else:
+                streak = min(self.streaks[h, a], 0) - 1
+            self.streaks[h, a], self.streaks[a, h] = streak, -streak
+        return int(keep.sum())
+
+    def copy(self):
+        return RivalryIndex(self.managers, self.names, self.aliases, self.seasons, self.wins.copy(),
+                            self.ties.copy(), self.points.copy(), self.streaks.copy())
+
+    def manager(self, alias):
+        """
+        :param alias: manager id, or email/username a Discord user is mapped to
+        :return: manager id or None
+        """
+        if alias in self._index:
+            return alias
+        return self.aliases.get(alias)
+
+    def head_to_head(self, a, b):
+        """
+        :param a: manager id or alias
+        :param b: manager id or alias
+        :return: Rivalry from a's side, or None if either is unknown
+        """
+        i, j = self._index.get(self.manager(a)), self._index.get(self.manager(b))
+        if i is None or j is None:
+            return None
+        wins, losses, ties = int(self.wins[i, j]), int(self.wins[j, i]), int(self.ties[i, j])
+        return Rivalry(wins, losses, ties, float(self.points[i, j]), float(self.points[j, i]),
+                       int(self.streaks[i, j]), wins + losses + ties)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'managers': self.managers, 'names': self.names, 'aliases': self.aliases,
+                'seasons': self.seasons, 'wins': self.wins.tolist(), 'ties': self.ties.tolist(),
+                'points': np.round(self.points, 2).tolist(), 'streaks': self.streaks.tolist(),
+            }, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        n = len(data['managers'])
+        # Empty matrices do not keep their shape through json
+        shape = lambda m: np.reshape(np.asarray(m, dtype=np.float64), (n, n))
+        return cls(data['managers'], data['names'], data['aliases'], data['seasons'],
+                   shape(data['wins']), shape(data['ties']), shape(data['points']), shape(data['streaks']))
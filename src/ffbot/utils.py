@@ -3,25 +3,98 @@
 # Each discord command should call into a function in this module
 
 import asyncio
+import collections
+import contextvars
 import datetime
 import discord
+import fcntl
+import functools
+import inspect
+import io
 import json
+import logging
 import os
 import prettytable
 import sys
+import time
+
+import numpy as np
 
 from croniter import croniter
+from dateutil import tz
+
+import analytics
+import changes
+import outbound
+import players
+import playoffs
+import records
+import rivalry
+
+logger = logging.getLogger(__name__)
 
 # Add src/ to syspath
 sys.path.append(os.path.realpath(os.path.join(os.curdir, '..')))
 try:
-    import yfantasy
+    import providers
+    import ycache
+    import ylog
+    import yscheduler
+    import ytrace
 except ImportError:
-    print('Failed to import yfantasy')
+    # Before ylog is set up, so this goes to logging's stderr fallback
+    logger.exception('Failed to import providers')
     sys.exit(1)
+# Use the provider tables, so only importable once src/ is on the path
+import lineups
+import pickups
 
+from providers import base
+
+# League data source (yahoo, sleeper) picked from auth.json
+PROVIDER = providers.get_provider()
 # Point global to manager map
 MGR_MAP = 'discmap.json'
+# Seconds one worker may spend syncing league data before another takes over
+SYNC_LEASE_TTL = 600
+# Seconds a command may wait on fresh data before answering from the last
+# good snapshot instead
+LATENCY_BUDGETS = {
+    'standings': 2.0,
+    'mymatchup': 2.0,
+    'player': 1.0,
+    'head_to_head': 1.0,
+    'recommend_pickups': 5.0,
+    'analyze_trade': 5.0,
+    'optimal_lineup': 5.0,
+    'league_records': 1.0,
+    'season_in_review': 10.0,
+    'playoff_odds': 5.0,
+}
+DEFAULT_LATENCY_BUDGET = 3.0
+# Local copy of the league's player pool
+PLAYER_INDEX_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'players.json'))
+_PLAYER_INDEX = None
+# Head to head history of past seasons
+RIVALRY_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'rivalry.json'))
+_RIVALRY = None
+# All time records, updated as weeks finish
+RECORDS_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'records.json'))
+_RECORDS = None
+# Available players, rebuilt once per waiver cycle
+PICKUPS_PATH = os.path.realpath(os.path.join(os.path.dirname(__file__), '..', 'pickups.json'))
+PICKUP_POOL_SIZE = 200
+_PICKUP_POOL = None
+# Seasons simulated on each side of a trade
+TRADE_SIMS = 50000
+# Commands searched and shown by !traces (see ytrace)
+TRACE_WINDOW = 200
+TRACES_SHOWN = 3
+# Longest !profile run, in seconds
+PROFILE_LIMIT = 120
+_PROFILING = False
+# Every message the bot sends goes through here (see outbound)
+OUTBOX = outbound.Outbox()
 
 #
 # Tools to get/set manager config
@@ -37,14 +110,20 @@ def get_mgr_json():
 
 
 async def set_user_team(bot, discord_id, manager_email):
-    mgr_config = get_mgr_json()
-    mgr_config.update({str(discord_id): manager_email})
-    with open(MGR_MAP, 'w') as f:
-        json.dump(mgr_config, f, indent=4, separators=(',', ': '))
+    # Other workers on the host share the file; hold its lock across the
+    # read and write, and replace it whole so readers never see a partial one
+    with open(MGR_MAP + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        mgr_config = get_mgr_json()
+        mgr_config.update({str(discord_id): manager_email})
+        tmp = '%s.%d.tmp' % (MGR_MAP, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(mgr_config, f, indent=4, separators=(',', ': '))
+        os.replace(tmp, MGR_MAP)
     output = '```\n'
     output += json.dumps(mgr_config, indent=4, separators=(',', ': '))
     output += '```'
-    await update_league(bot)
+    await update_league(bot, klass='interactive')
     return output
 
 
@@ -57,64 +136,245 @@ def get_user_team(discord_id):
 #
 
 
+async def run_blocking(klass, fn, *args):
+    """
+    Run a blocking command off the event loop, with any upstream calls it
+    makes scheduled under a request priority class
+
+    :param klass: interactive, live or background (see yscheduler)
+    :param fn: function to run in a worker thread
+    :return: result of fn (generators are returned as lists)
+    """
+    def call():
+        with yscheduler.priority(klass), ytrace.span('run', fn=fn.__name__):
+            result = fn(*args)
+            # Generators have to be drained in the worker too
+            if inspect.isgenerator(result):
+                result = list(result)
+            return result
+    # Executors do not carry the context over, and with it the current trace
+    return await asyncio.get_event_loop().run_in_executor(None, contextvars.copy_context().run, call)
+
+
+def _from_snapshots(fn, *args):
+    with ycache.cached_only() as served:
+        result = fn(*args)
+        if inspect.isgenerator(result):
+            result = list(result)
+        return result, served.age
+
+
+def _as_messages(output):
+    return list(output) if isinstance(output, (list, tuple)) else [output]
+
+
+async def respond(ctx, fn, *args, edit=True):
+    """
+    Reply with fn's output, within the command's latency budget
+
+    If fresh data is not in by the budget (or the fetch fails), reply right
+    away from the last good snapshots, marked with their age. The fresh
+    fetch keeps going in the background, refreshing the snapshots, and the
+    stale reply is edited in place once it lands.
+
+    :param ctx: discord context
+    :param fn: blocking command function returning a message or list of them
+    :param args: arguments for fn
+    :param edit: edit stale replies when fresh data arrives
+    :return: sent messages
+    """
+    start = time.perf_counter()
+    with ytrace.span('command', fn=fn.__name__) as trace:
+        try:
+            return await _respond(ctx, fn, args, edit, trace)
+        finally:
+            ylog.event(logger, 'command', fn=fn.__name__, ms=1000 * (time.perf_counter() - start),
+                       stale=trace.attrs.get('stale', 'no'))
+
+
+async def _respond(ctx, fn, args, edit, trace):
+    budget = LATENCY_BUDGETS.get(fn.__name__, DEFAULT_LATENCY_BUDGET)
+    fresh = asyncio.ensure_future(run_blocking('interactive', fn, *args))
+    try:
+        output = await asyncio.wait_for(asyncio.shield(fresh), budget)
+    except (asyncio.TimeoutError,) + PROVIDER.errors as e:
+        # Only a slow or failing upstream is worth answering from snapshots;
+        # anything else would fail the same way again
+        ylog.event(logger, 'fresh data not ready, trying snapshots', logging.WARNING, fn=fn.__name__,
+                   error=repr(e))
+    else:
+        with ytrace.span('send'):
+            return await OUTBOX.send(ctx.channel, _as_messages(output), bot=ctx.bot)
+    try:
+        output, age = await run_blocking('interactive', _from_snapshots, fn, *args)
+    except ycache.CacheMiss:
+        # Nothing to fall back on, so the only option is to wait
+        output = _as_messages(await fresh)
+        with ytrace.span('send'):
+            return await OUTBOX.send(ctx.channel, output, bot=ctx.bot)
+    trace.attrs['stale'] = ycache.describe_age(age)
+    output = _as_messages(output)
+    if output:
+        output[-1] += '\n*(data from %s ago, refreshing)*' % ycache.describe_age(age)
+    with ytrace.span('send'):
+        messages = await OUTBOX.send(ctx.channel, output, bot=ctx.bot, alone=edit)
+    if edit:
+        asyncio.ensure_future(_edit_when_fresh(fresh, messages))
+    return messages
+
+
+async def _edit_when_fresh(fresh, messages):
+    try:
+        output = _as_messages(await fresh)
+    except Exception as e:
+        logger.warning('Background refresh failed: %r', e)
+        return
+    await OUTBOX.edit(messages, output)
+
+
+def outbox_stats():
+    stats = OUTBOX.stats()
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['requested', 'sent', 'saved', 'paged', 'rate limited', 'rate wait']
+    table.add_row(['-'] * len(table.field_names))
+    table.add_row([stats.get('requested', 0), stats.get('sent', 0), stats['saved'], stats.get('paged', 0),
+                   stats.get('rate_limited', 0), '%.1fs' % (stats.get('rate_wait_ms', 0) / 1000.0)])
+    table.align = 'l'
+    return '```' + str(table) + '```'
+
+
+def scheduler_stats():
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['class', 'requests', 'waiting', 'expired', 'p50 wait', 'p99 wait', 'max wait']
+    table.add_row(['-'] * len(table.field_names))
+    for klass, stats in yscheduler.SCHEDULER.stats().items():
+        table.add_row([klass, stats['requests'], stats['waiting'], stats['expired'],
+                       '%.3fs' % stats['p50_wait'], '%.3fs' % stats['p99_wait'], '%.3fs' % stats['max_wait']])
+    table.align = 'l'
+    return '```' + str(table) + '```'
+
+
+def traces(content=''):
+    """
+    Span trees of the slowest recent commands
+
+    :param content: number of traces, optionally followed by a command name
+    """
+    words = content.split()
+    count = int(words[0]) if words and words[0].isdigit() else TRACES_SHOWN
+    name = next((w for w in words if not w.isdigit()), None)
+    found = [(root, children) for root, children in ytrace.recent(TRACE_WINDOW, name='command')
+             if name is None or root.attrs.get('fn') == name]
+    found = sorted(found, key=lambda t: -t[0].duration)[:count]
+    if not found:
+        return 'No commands traced yet'
+    output = []
+    for root, children in found:
+        lines = ['%9s %9s  %s' % ('total', 'self', datetime.datetime.fromtimestamp(root.start).strftime('%H:%M:%S'))]
+        output.append('```' + '\n'.join(lines + ytrace.format_trace(root, children)) + '```')
+    return output
+
+
+async def profile(ctx, seconds):
+    """
+    Sample every thread's stack for a while and upload the collapsed stacks,
+    ready for flamegraph.pl or speedscope
+
+    :param seconds: how long to sample for, up to PROFILE_LIMIT
+    """
+    global _PROFILING
+    if _PROFILING:
+        return await OUTBOX.send(ctx.channel, 'Already profiling')
+    seconds = max(1, min(seconds, PROFILE_LIMIT))
+    _PROFILING = True
+    try:
+        await OUTBOX.send(ctx.channel, 'Profiling for %ds' % seconds)
+        sampler = ytrace.Sampler().start()
+        await asyncio.sleep(seconds)
+        sampler.stop()
+    finally:
+        _PROFILING = False
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    data = io.BytesIO(sampler.collapsed().encode('utf-8'))
+    return await OUTBOX.upload(ctx.channel, '%d samples, %d distinct stacks' % (sampler.samples, len(sampler.stacks)),
+                               discord.File(data, filename='ffbot-%s.folded' % stamp))
+
+
+def week_header(matchups, week):
+    start, end = matchups.dates.get(week, ('', ''))
+    if start and end:
+        return 'Week %s: %s to %s' % (week, start, end)
+    return 'Week %s' % week
+
+
 def mymatchup(ctx, content=''):
     # Expect `content` contains either None or a list of ints (weeks)
-    league = yfantasy.get()
-    weeks = content or league.current_week
+    league = PROVIDER.league()
+    weeks = content or str(league.current_week)
     weeks = [int(w) for w in weeks.split()]
-    user_email = get_user_team(ctx.message.author.id)
-    result = league.teams_by_email(user_email).matchups(weeks=weeks)
-    matchups = result['matchups']['matchup']
-    if not isinstance(matchups, list):
-        matchups = [matchups]
-    for m in matchups:
-        output = 'Week %s: %s to %s\n\n' % (m['week'], m['week_start'], m['week_end'])
-        for team in m['teams']['team']:
-            output += '* ' + team['name'] + '\n'
+    teams = PROVIDER.teams()
+    mine = teams.by_manager(get_user_team(ctx.message.author.id))
+    if mine is None:
+        logger.warning('%s not found in %s', get_user_team(ctx.message.author.id), teams.managers)
+        return
+    matchups = PROVIDER.matchups(weeks)
+    matchups = matchups.take(matchups.for_team(mine))
+    for week, home, away, points, projected, win_probability in zip(
+            matchups.weeks, matchups.home, matchups.away,
+            zip(matchups.home_points, matchups.away_points),
+            zip(matchups.home_projected, matchups.away_projected),
+            zip(matchups.home_win_probability, matchups.away_win_probability)):
+        output = week_header(matchups, week) + '\n\n'
+        for team, pts, proj, prob in zip((home, away), points, projected, win_probability):
+            if team < 0:
+                continue
+            output += '* ' + teams.names[team] + '\n'
             output += '-' * 25 + '\n'
-            output += f"{'points':<15}{team['team_points']['total']:>10}" + '\n'
-            output += f"{'projected':<15}{team['team_projected_points']['total']:>10}" + '\n'
-            output += f"{'win probability':<15}{str(100.0 * float(team['win_probability'])) + '%':>10}" + '\n'
+            output += f"{'points':<15}{pts:>10.2f}" + '\n'
+            if proj == proj:
+                output += f"{'projected':<15}{proj:>10.2f}" + '\n'
+            if prob == prob:
+                output += f"{'win probability':<15}{str(100.0 * prob) + '%':>10}" + '\n'
             output += '\n'
         output = '```' + output + '```'
         yield output
 
 
 def standings():
-    league = yfantasy.get()
+    teams = PROVIDER.teams()
     table = prettytable.PrettyTable(border=False)
     table.field_names = ['team', 'record', 'pts for', 'pts against']
     table.add_row(['-'] * len(table.field_names))
-    for team in league.standings['standings']['teams']['team']:
-        standing = list()
-        ts = team['team_standings']
-        standing.append(team['name']),
-        standing.append(ts['outcome_totals']['wins'] + ' - ' + ts['outcome_totals']['losses'])
-        standing.append(ts['points_for'])
-        standing.append(ts['points_against'])
-        table.add_row(standing)
+    for name, wins, losses, pf, pa in zip(teams.names, teams.wins, teams.losses,
+                                          teams.points_for, teams.points_against):
+        table.add_row([name, '%d - %d' % (wins, losses), '%.2f' % pf, '%.2f' % pa])
     table.align = 'l'
     table.sortby = 'record'
     return '```' + str(table) + '```'
 
 
 def week_in_review():
-    league = yfantasy.get()
-    scoreboard = league.scoreboard(max([int(league.current_week)-1, 1]))
+    league = PROVIDER.league()
+    week = max([league.current_week - 1, 1])
+    teams = PROVIDER.teams()
+    scoreboard = PROVIDER.matchups([week])
     tracker = {'stinkers': []}
-    for m in scoreboard['scoreboard']['matchups']['matchup']:
-        teams = [{'name': t['name'], 'points': float(t['team_points']['total'])} for t in m['teams']['team']]
-        loser, winner = sorted(teams, key=lambda i: i['points'])
+    for home, away, home_points, away_points in zip(scoreboard.home, scoreboard.away,
+                                                    scoreboard.home_points, scoreboard.away_points):
+        if away < 0:
+            continue
+        teams_pts = [{'name': teams.names[home], 'points': float(home_points)},
+                     {'name': teams.names[away], 'points': float(away_points)}]
+        loser, winner = sorted(teams_pts, key=lambda i: i['points'])
         tracker.setdefault('worst week', loser)
         if loser['points'] < tracker['worst week']['points']:
             tracker['worst week'] = loser
         tracker.setdefault('best week', winner)
         if winner['points'] > tracker['best week']['points']:
             tracker['best week'] = winner
-        tracker['stinkers'].extend([t for t in teams if float(t['points']) < 60.0 and t != tracker['worst week']])
+        tracker['stinkers'].extend([t for t in teams_pts if float(t['points']) < 60.0 and t != tracker['worst week']])
 
-    sb = scoreboard['scoreboard']['matchups']['matchup'][0]
-    output = 'Week in Review: Week %s: %s to %s\n' % (sb['week'], sb['week_start'], sb['week_end'])
+    output = 'Week in Review: ' + week_header(scoreboard, week) + '\n'
     output += '\n'
     output += '\N{CROWN} ' + f"{tracker['best week']['name']:<20}{tracker['best week']['points']:>10}"
     output += ' \N{CROWN}'
@@ -129,33 +389,595 @@ def week_in_review():
         for team in stinkers:
             output += f"{team['name']:<20}{team['points']:>10}" + '\n'
 
+    output += '\nPoints left on the bench:\n' + bench_points([week], teams) + '\n'
+
+    # Only podium finishes are worth a mention
+    made = [m for m in get_records_book().set_in(league.season, week) if m[1] <= 3]
+    if made:
+        output += '\nFor the record books:\n'
+        for name, rank, record in made:
+            output += f"#{rank} {records.TITLES[name].lower()}: {record.name} ({record.value})" + '\n'
+
     return '```' + output + '```'
 
 
-async def update_league(bot):
-    league = yfantasy.get()
-    yfantasy.create_yleague_json(int(league.league_id), update=True)
+def season_in_review():
+    league = PROVIDER.league()
+    # Regular season only; every week is fetched at once and finished ones
+    # come from cache after the first time
+    last_week = min(league.current_week, league.playoff_start_week) - 1
+    teams = PROVIDER.teams()
+    season = season_matrix(league, teams, PROVIDER.matchups(range(league.start_week, last_week + 1)))
+    if not season.played.any():
+        return 'No games played yet this season'
+    leader = int(np.lexsort((-teams.points_for, -teams.wins))[0])
+    output = 'Season in Review: %s %s\n\n' % (league.name, league.season)
+    output += '\N{TROPHY} ' + f"{teams.names[leader]:<20}" + '%d - %d - %d' % (
+        teams.wins[leader], teams.losses[leader], teams.ties[leader]) + ' \N{TROPHY}\n\n'
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['award', 'team', '', 'week']
+    table.add_row(['-'] * len(table.field_names))
+    for award in season.awards():
+        value = '%.3f' % award.value if award.title == 'All-play champ' else '%.2f' % award.value
+        table.add_row([award.title, season.names[award.team], value, award.week or ''])
+    table.align = 'l'
+    return '```' + output + str(table) + '```'
+
+
+def season_matrix(league, teams=None, matchups=None):
+    # Current week is included; unfinished matchups are skipped by analytics
+    if teams is None:
+        teams = PROVIDER.teams()
+    if matchups is None:
+        matchups = PROVIDER.matchups(range(league.start_week, league.current_week + 1))
+    return analytics.from_matchups(teams, matchups)
+
+
+def power_rankings():
+    season = season_matrix(PROVIDER.league())
+    wins, losses, ties = season.all_play()
+    scores = season.power_scores()
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['rank', 'team', 'power', 'all-play', 'pts for']
+    table.add_row(['-'] * len(table.field_names))
+    for rank, i in enumerate(season.power_rankings(), 1):
+        table.add_row([rank, season.names[i], '%.3f' % scores[i],
+                       '%d - %d - %d' % (wins[i], losses[i], ties[i]),
+                       '%.2f' % season.points_for()[i]])
+    table.align = 'l'
+    return '```' + str(table) + '```'
+
+
+def all_play():
+    season = season_matrix(PROVIDER.league())
+    wins, losses, ties = season.all_play()
+    pct = season.all_play_pct()
+    medians = season.median_beats()
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['team', 'all-play', 'pct', 'beat median']
+    table.add_row(['-'] * len(table.field_names))
+    for i in (-pct).argsort(kind='stable'):
+        table.add_row([season.names[i], '%d - %d - %d' % (wins[i], losses[i], ties[i]),
+                       '%.3f' % pct[i], '%d / %d' % (medians[i], season.played[i].sum())])
+    table.align = 'l'
+    return '```' + str(table) + '```'
+
+
+def luck():
+    season = season_matrix(PROVIDER.league())
+    actual = season.actual_wins()
+    expected = season.expected_wins()
+    luck = actual - expected
+    percentile = season.points_for_percentile()
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['team', 'wins', 'expected', 'luck', 'pf pctile']
+    table.add_row(['-'] * len(table.field_names))
+    for i in (-luck).argsort(kind='stable'):
+        table.add_row([season.names[i], '%g' % actual[i], '%.2f' % expected[i],
+                       '%+.2f' % luck[i], '%.0f' % percentile[i]])
+    table.align = 'l'
+    return '```' + str(table) + '```'
+
+
+def regular_season(league, teams):
+    """
+    :return: (SeasonMatrix, games left to play, divisions or None) of the regular season
+    """
+    last_week = league.playoff_start_week - 1
+    matchups = PROVIDER.matchups(range(league.start_week, last_week + 1))
+    divisions = None
+    if len(set(teams.divisions) - {''}) > 1:
+        divisions = teams.divisions
+    return season_matrix(league, teams, matchups), playoffs.remaining_schedule(matchups, last_week), divisions
+
+
+def playoff_odds(sims=playoffs.SIMS):
+    league = PROVIDER.league()
+    teams = PROVIDER.teams()
+    season, games, divisions = regular_season(league, teams)
+    simulator = playoffs.PlayoffSimulator(season, games, league.num_playoff_teams, divisions=divisions)
+    odds = simulator.run(sims=sims)
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['team', 'playoffs', '#1 seed', 'avg seed', 'proj wins']
+    table.add_row(['-'] * len(table.field_names))
+    for i in (-odds.playoffs).argsort(kind='stable'):
+        table.add_row([season.names[i], '%.1f%%' % (100 * odds.playoffs[i]), '%.1f%%' % (100 * odds.top_seed[i]),
+                       '%.1f' % odds.mean_seed[i], '%.1f' % odds.mean_wins[i]])
+    table.align = 'l'
+    output = 'Playoff odds after %d simulations (%d games left)\n\n' % (odds.sims, len(games))
+    return '```' + output + str(table) + '```'
+
+
+def build_player_index():
+    if PROVIDER.paged_players:
+        return players.PlayerIndex.build(lambda start, count: list(PROVIDER.players(start=start, count=count).rows()))
+    return players.PlayerIndex(PROVIDER.players().rows(), updated=time.time())
+
+
+def get_player_index():
+    global _PLAYER_INDEX
+    if _PLAYER_INDEX is None and os.path.exists(PLAYER_INDEX_PATH):
+        _PLAYER_INDEX = players.PlayerIndex.load(PLAYER_INDEX_PATH)
+    if _PLAYER_INDEX is None or _PLAYER_INDEX.stale:
+        _PLAYER_INDEX = build_player_index()
+        _PLAYER_INDEX.save(PLAYER_INDEX_PATH)
+    return _PLAYER_INDEX
+
+
+def refresh_player_index():
+    global _PLAYER_INDEX
+    index = get_player_index()
+    changed = PROVIDER.player_changes(index.updated)
+    if changed is None:
+        # Provider has no change feed; its pool is local so reload it all
+        _PLAYER_INDEX = index = build_player_index()
+        refreshed = len(index)
+    else:
+        refreshed = index.refresh(changed, lambda keys: list(PROVIDER.players(keys=keys).rows()))
+    index.save(PLAYER_INDEX_PATH)
+    return refreshed
+
+
+def player(name):
+    matches = get_player_index().search(name)
+    if not matches:
+        return 'No players found matching `%s`' % name
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['player', 'pos', 'team', 'status', 'owner']
+    table.add_row(['-'] * len(table.field_names))
+    for p in matches:
+        table.add_row([p.name, p.position, p.team.upper(), p.status or '-', p.owner])
+    table.align = 'l'
+    return '```' + str(table) + '```'
+
+
+def last_waivers(now=None):
+    """
+    :return: unix time waivers last ran
+    """
+    now = (now or datetime.datetime.now(tz.tzlocal())).astimezone(WAIVERS.zone)
+    return croniter(WAIVERS.cron, now).get_prev(datetime.datetime).timestamp()
+
+
+def get_pickup_pool():
+    global _PICKUP_POOL
+    cycle = last_waivers()
+    if (_PICKUP_POOL is None or _PICKUP_POOL.built < cycle) and os.path.exists(PICKUPS_PATH):
+        # Another worker may have rebuilt it already
+        _PICKUP_POOL = pickups.Pool.load(PICKUPS_PATH)
+    if _PICKUP_POOL is None or _PICKUP_POOL.built < cycle:
+        _PICKUP_POOL = pickups.Pool(PROVIDER.available(PICKUP_POOL_SIZE))
+        _PICKUP_POOL.save(PICKUPS_PATH)
+    return _PICKUP_POOL
+
+
+def recommend_pickups(ctx, content=''):
+    teams = PROVIDER.teams()
+    mine = teams.by_manager(get_user_team(ctx.message.author.id))
+    if mine is None:
+        return 'Your Discord user is not linked to a team yet'
+    pool = get_pickup_pool()
+    # Free agents are first come first served between waiver runs
+    rostered = set(key for keys in PROVIDER.rosters().values() for key in keys)
+    available = pool.without(rostered)
+    roster = PROVIDER.roster_stats(teams.keys[mine])
+    picks = pickups.rank(available, roster, PROVIDER.lineup_slots(), position=content.strip() or None)
+    if not picks:
+        return 'No pickups would start for %s' % teams.names[mine]
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['player', 'pos', 'team', 'pts/wk', 'gain', 'replaces']
+    table.add_row(['-'] * len(table.field_names))
+    for pick in picks:
+        replaces = roster.names[pick.replaces] if pick.replaces is not None else 'empty slot'
+        table.add_row([available.names[pick.row], available.positions[pick.row], available.teams[pick.row].upper(),
+                       '%.1f' % pick.value, '%+.1f' % pick.gain, replaces])
+    table.align = 'l'
+    output = 'Pickups for %s (pool as of %s ago)\n\n' % (teams.names[mine],
+                                                        ycache.describe_age(time.time() - pool.built))
+    return '```' + output + str(table) + '```'
+
+
+def _find_player(index, name, owner):
+    # Best match for a name among one team's players
+    for p in index.search(name, limit=25):
+        if p.owner == owner:
+            return p
+    return None
+
+
+def analyze_trade(ctx, content=''):
+    give, _, get = content.partition(' for ')
+    give = [n.strip() for n in give.split(',') if n.strip()]
+    get = [n.strip() for n in get.split(',') if n.strip()]
+    if not give or not get:
+        return 'Usage: !trade <your players> for <their players>, names separated by commas'
+    league = PROVIDER.league()
+    teams = PROVIDER.teams()
+    mine = teams.by_manager(get_user_team(ctx.message.author.id))
+    if mine is None:
+        return 'Your Discord user is not linked to a team yet'
+    index = get_player_index()
+    outgoing = [_find_player(index, name, teams.names[mine]) for name in give]
+    # The other side of the trade is whoever has the first player asked for
+    wanted = [p for p in index.search(get[0], limit=25) if p.owner in teams.names and p.owner != teams.names[mine]]
+    if None in outgoing:
+        return 'Could not find on %s: %s' % (teams.names[mine], ', '.join(
+            n for n, p in zip(give, outgoing) if p is None))
+    if not wanted:
+        return 'Could not find on another team: %s' % get[0]
+    theirs = teams.names.index(wanted[0].owner)
+    incoming = [wanted[0]] + [_find_player(index, name, teams.names[theirs]) for name in get[1:]]
+    if None in incoming:
+        return 'Could not find on %s: %s' % (teams.names[theirs], ', '.join(
+            n for n, p in zip(get, incoming) if p is None))
+
+    slots = PROVIDER.lineup_slots()
+    rosters = {team: PROVIDER.roster_stats(teams.keys[team]) for team in (mine, theirs)}
+    moving = {mine: [p.key for p in outgoing], theirs: [p.key for p in incoming]}
+    for team, keys in moving.items():
+        stale = set(keys) - set(rosters[team].keys)
+        if stale:
+            return 'No longer on %s: %s' % (teams.names[team], ', '.join(index.get(k).name for k in stale))
+    weekly = {}
+    for team, other in ((mine, theirs), (theirs, mine)):
+        kept = rosters[team].take(~np.isin(rosters[team].keys, moving[team]))
+        received = rosters[other].take(np.isin(rosters[other].keys, moving[other]))
+        traded = base.PlayerStatsTable.concat([kept, received])
+        weekly[team] = [lineups.total(slots, r.positions, pickups.values(r)) for r in (rosters[team], traded)]
+
+    table = prettytable.PrettyTable(border=False)
+    season, games, divisions = regular_season(league, teams)
+    if games:
+        boost = np.zeros(len(season))
+        for team, (before, after) in weekly.items():
+            boost[team] = after - before
+        # Same seed on both sides so the difference is the trade, not the dice
+        odds = [playoffs.PlayoffSimulator(season, games, league.num_playoff_teams, divisions=divisions,
+                                          boost=b).run(sims=TRADE_SIMS, seed=0) for b in (None, boost)]
+        table.field_names = ['team', 'lineup pts/wk', 'proj wins', 'playoffs']
+        table.add_row(['-'] * len(table.field_names))
+        for team in (mine, theirs):
+            before, after = odds[0], odds[1]
+            table.add_row([teams.names[team], '%.1f -> %.1f' % tuple(weekly[team]),
+                           '%.1f -> %.1f' % (before.mean_wins[team], after.mean_wins[team]),
+                           '%.0f%% -> %.0f%%' % (100 * before.playoffs[team], 100 * after.playoffs[team])])
+    else:
+        table.field_names = ['team', 'lineup pts/wk']
+        table.add_row(['-'] * len(table.field_names))
+        for team in (mine, theirs):
+            table.add_row([teams.names[team], '%.1f -> %.1f' % tuple(weekly[team])])
+    table.align = 'l'
+    output = '%s trades %s to %s for %s\n\n' % (teams.names[mine], ', '.join(p.name for p in outgoing),
+                                               teams.names[theirs], ', '.join(p.name for p in incoming))
+    return '```' + output + str(table) + '```'
+
+
+def bench_points(weeks, teams):
+    """
+    :param weeks: finished weeks
+    :param teams: TeamTable
+    :return: table of what each team scored and could have with its best
+        lineups over weeks, most left on the bench first
+    """
+    results, _ = lineups.best(PROVIDER.lineups(weeks), PROVIDER.lineup_slots())
+    totals = collections.defaultdict(lambda: np.zeros(2))
+    for result in results:
+        totals[result.team] += (result.actual, result.optimal)
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['team', 'scored', 'best', 'left on bench']
+    table.add_row(['-'] * len(table.field_names))
+    for team, (actual, optimal) in sorted(totals.items(), key=lambda t: t[1][0] - t[1][1]):
+        table.add_row([teams.names[team], '%.2f' % actual, '%.2f' % optimal, '%.2f' % (optimal - actual)])
+    table.align = 'l'
+    return str(table)
+
+
+def optimal_lineup(ctx, content=''):
+    league = PROVIDER.league()
+    teams = PROVIDER.teams()
+    last_week = max(league.current_week - 1, 1)
+    content = content.strip().lower()
+    if content == 'season':
+        weeks = range(league.start_week, min(league.current_week, league.playoff_start_week))
+        return '```Points left on the bench this season\n\n' + bench_points(weeks, teams) + '```'
+    if content and not (content.isdigit() and league.start_week <= int(content) <= last_week):
+        return 'Give a finished week (%d-%d) or season' % (league.start_week, last_week)
+    week = int(content) if content else last_week
+    output = ['```Points left on the bench, week %d\n\n' % week + bench_points([week], teams) + '```']
+    mine = teams.by_manager(get_user_team(ctx.message.author.id))
+    if mine is None:
+        return output
+    slots = PROVIDER.lineup_slots()
+    roster = PROVIDER.lineups([week])
+    roster = roster.take(roster.teams == mine)
+    _, seats = lineups.best(roster, slots)
+    best = seats.get((week, mine), [-1] * len(slots))
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['slot', 'best lineup', 'pts', '']
+    table.add_row(['-'] * len(table.field_names))
+    for slot, row in zip(slots, best):
+        if row < 0:
+            table.add_row([slot, 'empty', '', ''])
+            continue
+        table.add_row([slot, roster.names[row], '%.2f' % roster.points[row], '' if roster.started[row] else 'benched'])
+    sat = [row for row in range(len(roster)) if roster.started[row] and row not in best]
+    table.align = 'l'
+    mine_output = '%s, week %d\n\n' % (teams.names[mine], week) + str(table)
+    if sat:
+        mine_output += '\n\nStarted instead: ' + ', '.join('%s (%.2f)' % (roster.names[row], roster.points[row])
+                                                         for row in sat)
+    return output + ['```' + mine_output + '```']
+
+
+def update_history():
+    """
+    Bring the rivalry index and records book up to date
+
+    Past seasons never change, so they are fetched once (following each
+    league back to the one it was renewed from) and kept on disk; later
+    updates only re-read the current season. The records book takes in the
+    current season's weeks as they finish; the rivalry index is rebuilt
+    from past seasons with the current one on top.
+
+    :return: (RivalryIndex, RecordsBook)
+    """
+    pool = playoffs.get_pool()
+    past = rivalry.RivalryIndex()
+    if os.path.exists(RIVALRY_PATH):
+        past = rivalry.RivalryIndex.load(RIVALRY_PATH)
+    book = records.RecordsBook()
+    if os.path.exists(RECORDS_PATH):
+        book = records.RecordsBook.load(RECORDS_PATH)
+    current = PROVIDER.season(pool=pool)
+    missing = []
+    key = current.previous
+    while key and (key not in past.seasons or key not in book.seasons):
+        season = PROVIDER.season(key, pool=pool)
+        missing.append(season)
+        key = season.previous
+    for season in reversed(missing):
+        if season.key not in past.seasons:
+            past.add_season(season)
+        book.add_season(season)
+    if missing:
+        past.save(RIVALRY_PATH)
+    book.add_season(current)
+    book.save(RECORDS_PATH)
+    index = past.copy()
+    index.add_season(current)
+    return index, book
+
+
+def refresh_history():
+    global _RIVALRY, _RECORDS
+    _RIVALRY, _RECORDS = update_history()
+    return len(_RIVALRY.seasons)
+
+
+def get_records_book():
+    global _RECORDS
+    if _RECORDS is None and os.path.exists(RECORDS_PATH):
+        _RECORDS = records.RecordsBook.load(RECORDS_PATH)
+    if _RECORDS is None:
+        refresh_history()
+    return _RECORDS
+
+
+def league_records():
+    book = get_records_book()
+    output = ''
+    for name, title in records.TITLES.items():
+        output += title + '\n'
+        for record in book.records(name)[:3]:
+            output += f"  {record.value:>8}  {record.name:<30}{record.season} wk {record.week}" + '\n'
+        output += '\n'
+    output += 'Most points in a season\n'
+    for points, season, manager in book.most_season_points(3):
+        name = _RIVALRY.names.get(manager, manager) if _RIVALRY is not None else manager
+        output += f"  {points:>8}  {name:<30}{season}" + '\n'
+    return '```' + output + '```'
+
+
+def head_to_head(ctx, member):
+    if _RIVALRY is None:
+        refresh_history()
+    mine, theirs = get_user_team(ctx.message.author.id), get_user_team(member.id)
+    record = _RIVALRY.head_to_head(mine, theirs)
+    if record is None or not record.games:
+        return 'No games found between %s and %s' % (ctx.message.author.display_name, member.display_name)
+    me, them = _RIVALRY.names[_RIVALRY.manager(mine)], _RIVALRY.names[_RIVALRY.manager(theirs)]
+    table = prettytable.PrettyTable(border=False)
+    table.field_names = ['', me, them]
+    table.add_row(['-'] * len(table.field_names))
+    table.add_row(['wins', record.wins, record.losses])
+    table.add_row(['points', '%.2f' % record.points_for, '%.2f' % record.points_against])
+    table.add_row(['avg', '%.2f' % (record.points_for / record.games), '%.2f' % (record.points_against / record.games)])
+    table.align = 'l'
+    output = 'All time: %d games over %d seasons' % (record.games, len(_RIVALRY.seasons))
+    if record.ties:
+        output += ', %d tied' % record.ties
+    if record.streak:
+        output += '\n%s has won the last %d' % (me if record.streak > 0 else them, abs(record.streak))
+    return '```' + output + '\n\n' + str(table) + '```'
+
+
+def sync_league():
+    """
+    Refresh the provider's local league data, unless another worker on the
+    host holds the sync lease and is already doing it
+
+    :return: True if this process synced
+    """
+    with ycache.lease('sync:' + PROVIDER.name, ttl=SYNC_LEASE_TTL) as held:
+        if held:
+            PROVIDER.sync()
+    return held
+
+
+async def update_league(bot, klass='background'):
+    await run_blocking(klass, sync_league)
+    teams = await run_blocking(klass, PROVIDER.teams)
     for disc_id, email in get_mgr_json().items():
-        team = league.teams_by_email(email)
+        team = teams.by_manager(email)
+        if team is None:
+            logger.warning('%s not found in %s', email, teams.managers)
+            continue
         user = discord.utils.get(bot.get_all_members(), id=int(disc_id))
         # Set division role
         division_roles = ['Acorn League East', 'Darby League West']
-        role_name = division_roles[int(team.division_id) - 1]
+        role_name = division_roles[int(teams.divisions[team] or 1) - 1]
         role = discord.utils.get(user.guild.roles, name=role_name)
         for old_role in user.roles:
             if old_role.name in division_roles:
                 await user.remove_roles(old_role)
         await user.add_roles(role)
         # Set team nickname
-        await user.edit(nick=team.name)
+        await user.edit(nick=teams.names[team])
+
+
+#
+# League change feed
+#
 
 
-def waiver_monitor(bot):
-    pass
+FEED = changes.ChangeFeed()
 
 
-def trades_monitor(bot):
-    pass
+def poll_league():
+    """
+    Snapshot the league once and diff it against the previous poll
+
+    :return: list of change events
+    """
+    league = PROVIDER.league()
+    return FEED.update(changes.snapshot(PROVIDER.teams(), PROVIDER.matchups([league.current_week]),
+                                        PROVIDER.rosters()))
+
+
+def _team_name(key):
+    return FEED.snapshot['teams'].get(key, {}).get('name', key)
+
+
+def _player_names(keys):
+    # Only names already indexed; a monitor should never trigger a pool build
+    names = []
+    for key in keys:
+        p = _PLAYER_INDEX.get(key) if _PLAYER_INDEX is not None else None
+        names.append(p.name if p else key)
+    return ', '.join(names)
+
+
+async def waiver_monitor(bot, event):
+    channel = discord.utils.get(bot.get_all_channels(), name='general')
+    output = '**%s**' % _team_name(event.team)
+    if event.added:
+        output += '\n  added: ' + _player_names(event.added)
+    if event.dropped:
+        output += '\n  dropped: ' + _player_names(event.dropped)
+    await OUTBOX.send(channel, output, bot=bot)
+
+
+async def trades_monitor(bot, event):
+    channel = discord.utils.get(bot.get_all_channels(), name='general')
+    output = '**Trade:** ' + ' / '.join(_team_name(t) for t in event.teams)
+    for team, received in event.received.items():
+        output += '\n  %s receives: %s' % (_team_name(team), _player_names(received) or 'nothing')
+    await OUTBOX.send(channel, output, bot=bot)
+
+#
+# Prefetch ahead of peaks
+#
+
+
+# Usage peaks whose first commands should find warm caches. NFL kickoffs and
+# waivers are on US Eastern time; peaks without a zone (the weekly review)
+# run on the host clock like the other crons.
+NFL_TZ = tz.gettz('America/New_York')
+Peak = collections.namedtuple('Peak', ['name', 'cron', 'zone', 'kind'])
+WAIVERS = Peak('Waivers', '0 3 * * 3', NFL_TZ, 'waivers')
+PEAKS = [
+    Peak('Thursday night football', '15 20 * * 4', NFL_TZ, 'games'),
+    Peak('Sunday early games', '0 13 * * 0', NFL_TZ, 'games'),
+    Peak('Sunday late games', '5 16 * * 0', NFL_TZ, 'games'),
+    Peak('Sunday night football', '20 20 * * 0', NFL_TZ, 'games'),
+    Peak('Monday night football', '15 20 * * 1', NFL_TZ, 'games'),
+    WAIVERS,
+]
+# Seconds before a peak to warm everything, then to refresh what expires
+# quickly (upstream responses stay fresh for ycache.FRESH_FOR)
+PREFETCH_LEAD = 300
+PREFETCH_TOP_UP = ycache.FRESH_FOR / 3
+
+
+def next_peak(peaks, now=None):
+    """
+    :param peaks: list of Peak
+    :param now: aware datetime; defaults to now
+    :return: (aware datetime, Peak) of the soonest peak
+    """
+    now = now or datetime.datetime.now(tz.tzlocal())
+    upcoming = []
+    for peak in peaks:
+        start = now.astimezone(peak.zone or tz.tzlocal())
+        upcoming.append((croniter(peak.cron, start).get_next(datetime.datetime), peak))
+    return min(upcoming, key=lambda u: u[0])
+
+
+def in_season(league, peak, when):
+    """
+    Whether the league calendar has anything happening at a peak
+    """
+    if not league.start_date <= when.strftime('%Y-%m-%d') <= league.end_date:
+        return False
+    # Games are over once the final week is reviewed; waivers and the review
+    # of the last week still follow it
+    return peak.kind != 'games' or league.current_week <= league.end_week
+
+
+def prefetch(kind, full=True):
+    """
+    Warm what the commands of a peak read
+
+    :param kind: games (scoreboard, standings, matchups), waivers (rosters,
+        player pool) or review (whole season, records)
+    :param full: also sync and rebuild local indexes; without it only the
+        upstream snapshots are refreshed
+    """
+    if full:
+        sync_league()
+    league = PROVIDER.league()
+    PROVIDER.teams()
+    if kind == 'games':
+        PROVIDER.matchups([league.current_week])
+    elif kind == 'waivers':
+        PROVIDER.rosters()
+        if full:
+            refresh_player_index()
+    elif kind == 'review':
+        PROVIDER.matchups(range(league.start_week, league.current_week + 1))
+        if full:
+            refresh_history()
+
 
 #
 # Crons
@@ -179,24 +1001,50 @@ class CronJob(object):
 # Weekly review 6am Weds
 async def cron_week_in_review(cron, bot):
     await bot.wait_until_ready()
-    league = yfantasy.get()
+    league = PROVIDER.league()
     channel = discord.utils.get(bot.get_all_channels(), name='general')
     cron_obj = CronJob(cron)
     while not bot.is_closed():
         if league.start_date <= cron_obj.now.strftime('%Y-%m-%d') <= league.end_date:
-            await channel.send(week_in_review())
-        print('    UPDATED: cron_week_in_review')
+            await OUTBOX.send(channel, await run_blocking('background', week_in_review), bot=bot)
+            # The week just reviewed closed out the regular season
+            if (await run_blocking('background', PROVIDER.league)).current_week == league.playoff_start_week:
+                await OUTBOX.send(channel, await run_blocking('background', season_in_review), bot=bot)
+        ylog.event(logger, 'cron done', cron='cron_week_in_review')
         await asyncio.sleep(cron_obj.time_to_next)
 
 
-# Grab new waiver claims each morning
-async def cron_waiver_monitor(cron, bot):
-    pass
+# Poll the league for changes; the waiver and trade monitors (and anything
+# else that subscribes to FEED) share the one poll
+async def cron_league_changes(cron, bot):
+    await bot.wait_until_ready()
+    FEED.subscribe('roster', functools.partial(waiver_monitor, bot))
+    FEED.subscribe('trade', functools.partial(trades_monitor, bot))
+    cron_obj = CronJob(cron)
+    while not bot.is_closed():
+        events = await run_blocking('live', poll_league)
+        # Subscribers run together so their messages are packed together
+        await asyncio.gather(*[r for r in FEED.publish(events) if inspect.isawaitable(r)])
+        ylog.event(logger, 'cron done', cron='cron_league_changes')
+        await asyncio.sleep(cron_obj.time_to_next)
 
 
-# Check for new trades every 15 min
-async def cron_trades_monitor(cron, bot):
-    pass
+# Warm caches ahead of each peak: everything PREFETCH_LEAD seconds before,
+# then the short lived snapshots again just before it starts
+async def cron_prefetch(peaks, bot):
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        when, peak = next_peak(peaks)
+        for lead, full in ((PREFETCH_LEAD, True), (PREFETCH_TOP_UP, False)):
+            wait = (when - datetime.datetime.now(tz.tzlocal())).total_seconds() - lead
+            if wait > 0:
+                await asyncio.sleep(wait)
+            league = await run_blocking('background', PROVIDER.league)
+            if in_season(league, peak, when):
+                await run_blocking('background', prefetch, peak.kind, full)
+        ylog.event(logger, 'prefetched', peak=peak.name)
+        # Past the peak before looking for the next one
+        await asyncio.sleep(max(0, (when - datetime.datetime.now(tz.tzlocal())).total_seconds()) + 1)
 
 
 # Update league every night at midnight
@@ -205,5 +1053,9 @@ async def cron_update_league(cron, bot):
     cron_obj = CronJob(cron)
     while not bot.is_closed():
         await update_league(bot)
-        print('    UPDATED: cron_update_league')
+        await run_blocking('background', refresh_player_index)
+        await run_blocking('background', refresh_history)
+        # First run after waivers rebuilds the pool
+        await run_blocking('background', get_pickup_pool)
+        ylog.event(logger, 'cron done', cron='cron_update_league')
         await asyncio.sleep(cron_obj.time_to_next)
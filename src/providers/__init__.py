@@ -0,0 +1,35 @@
+# League data providers
+#
+# Each fantasy platform is wrapped in a Provider that returns the same
+# normalized, column oriented tables (see providers.base) so the discord
+# bot never has to know which site a league lives on.
+
+import importlib
+import os
+
+import yclient
+
+
+PROVIDERS = {
+    'yahoo': 'providers.yahoo.YahooProvider',
+    'sleeper': 'providers.sleeper.SleeperProvider',
+}
+
+
+def get_provider(name=None):
+    """
+    Instantiate a provider by name
+
+    Falls back to FFBOT_PROVIDER, then the "provider" entry in auth.json,
+    then yahoo. Provider modules are only imported when selected, so a
+    Sleeper league never needs Yahoo credentials.
+
+    :param name: yahoo or sleeper
+    :return: Provider
+    """
+    auth = yclient.load_auth()
+    name = name or os.environ.get('FFBOT_PROVIDER') or auth.get('provider') or 'yahoo'
+    if name not in PROVIDERS:
+        raise ValueError('Unknown provider %s (expected one of %s)' % (name, ', '.join(sorted(PROVIDERS))))
+    module, _, cls = PROVIDERS[name].rpartition('.')
+    return getattr(importlib.import_module(module), cls)(auth.get(name) or {})
@@ -0,0 +1,288 @@
+# Normalized league data model
+#
+# Tables are column oriented: numeric columns are numpy arrays and text
+# columns are plain lists, one entry per row. Teams are referred to by
+# their row in TeamTable everywhere else (matchups, analytics, playoffs),
+# which keeps every downstream calculation a vectorized array operation.
+
+import collections
+
+import numpy as np
+
+
+LeagueInfo = collections.namedtuple('LeagueInfo', [
+    'key', 'name', 'season', 'current_week', 'start_week', 'end_week',
+    'start_date', 'end_date', 'num_teams', 'num_playoff_teams', 'playoff_start_week',
+])
+
+# One league season; previous is the key of the season before it, if any
+Season = collections.namedtuple('Season', ['key', 'season', 'teams', 'matchups', 'previous'])
+
+
+class Table(object):
+    """
+    Base for column oriented tables
+
+    Subclasses list their columns; numeric ones are stored as numpy arrays.
+    """
+    columns = ()
+    numeric = {}
+
+    def __init__(self, **columns):
+        for name in self.columns:
+            values = columns.get(name, ())
+            if name in self.numeric:
+                values = np.asarray(values, dtype=self.numeric[name])
+            else:
+                values = list(values)
+            setattr(self, name, values)
+
+    def __len__(self):
+        return len(getattr(self, self.columns[0]))
+
+    def take(self, rows):
+        """
+        Subset of rows
+
+        :param rows: boolean mask or row indices
+        :return: table of the same type
+        """
+        rows = np.arange(len(self))[rows]
+        columns = {}
+        for name in self.columns:
+            values = getattr(self, name)
+            columns[name] = values[rows] if name in self.numeric else [values[i] for i in rows]
+        return self._with(columns)
+
+    def _with(self, columns):
+        return self.__class__(**columns)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = list(tables)
+        if not tables:
+            return cls()
+        columns = {}
+        for name in cls.columns:
+            if name in cls.numeric:
+                columns[name] = np.concatenate([getattr(t, name) for t in tables])
+            else:
+                columns[name] = [v for t in tables for v in getattr(t, name)]
+        return tables[0]._with(columns)
+
+    def rows(self):
+        return zip(*[getattr(self, name) for name in self.columns])
+
+
+class TeamTable(Table):
+    """
+    One row per team, with season to date record
+
+    `managers` is what a Discord user is mapped to (email for Yahoo, username
+    for Sleeper); `manager_ids` are the provider's stable ids for the same
+    people, which carry over from season to season.
+    """
+    columns = ('keys', 'names', 'managers', 'manager_ids', 'divisions', 'wins', 'losses', 'ties',
+               'points_for', 'points_against')
+    numeric = {'wins': np.int64, 'losses': np.int64, 'ties': np.int64,
+               'points_for': np.float64, 'points_against': np.float64}
+
+    def index(self, key):
+        return self.keys.index(key)
+
+    def by_manager(self, manager):
+        """
+        Row of the team run by a manager (email for Yahoo, username for Sleeper)
+
+        :param manager: manager identifier
+        :return: row index or None
+        """
+        if manager in self.managers:
+            return self.managers.index(manager)
+        return None
+
+
+class MatchupTable(Table):
+    """
+    One row per matchup; `away` is -1 for a bye
+
+    Rows index into the TeamTable of the same provider. `dates` maps a week
+    to its (start, end) dates where the provider knows them.
+    """
+    columns = ('weeks', 'home', 'away', 'home_points', 'away_points', 'home_projected',
+               'away_projected', 'home_win_probability', 'away_win_probability', 'final')
+    numeric = {'weeks': np.int64, 'home': np.int64, 'away': np.int64,
+               'home_points': np.float64, 'away_points': np.float64,
+               'home_projected': np.float64, 'away_projected': np.float64,
+               'home_win_probability': np.float64, 'away_win_probability': np.float64,
+               'final': np.bool_}
+
+    def __init__(self, dates=None, **columns):
+        super(MatchupTable, self).__init__(**columns)
+        self.dates = dict(dates or {})
+
+    def _with(self, columns):
+        return MatchupTable(dates=self.dates, **columns)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = list(tables)
+        table = super(MatchupTable, cls).concat(tables)
+        for t in tables:
+            table.dates.update(t.dates)
+        return table
+
+    def for_team(self, team):
+        return (self.home == team) | (self.away == team)
+
+
+class PlayerTable(Table):
+    """
+    One row per player; owner is a team name, 'waivers' or 'freeagents'
+    """
+    columns = ('keys', 'names', 'positions', 'teams', 'statuses', 'owners')
+
+
+class PlayerStatsTable(Table):
+    """
+    One row per player with fantasy points per week: recent (about the last
+    month), season to date and projected for the coming week, plus percent
+    of leagues the player is rostered in. Whatever a provider does not
+    have is NaN.
+    """
+    columns = ('keys', 'names', 'positions', 'teams', 'statuses', 'recent', 'season', 'projected', 'owned')
+    numeric = {'recent': np.float64, 'season': np.float64, 'projected': np.float64, 'owned': np.float64}
+
+
+class LineupTable(Table):
+    """
+    One row per player on a team's roster in a week: the team is its row in
+    TeamTable, points are what the player scored that week and started is
+    True if the player was in the team's starting lineup
+    """
+    columns = ('weeks', 'teams', 'keys', 'names', 'positions', 'points', 'started')
+    numeric = {'weeks': np.int64, 'teams': np.int64, 'points': np.float64, 'started': bool}
+
+
+# Positions each starting lineup slot takes, in both Yahoo's and Sleeper's
+# names for the slots. Slots not listed (bench, IR, taxi) do not start.
+SLOT_POSITIONS = {
+    'QB': ('QB',), 'RB': ('RB',), 'WR': ('WR',), 'TE': ('TE',), 'K': ('K',), 'DEF': ('DEF',),
+    'DL': ('DL',), 'LB': ('LB',), 'DB': ('DB',),
+    'W/R': ('WR', 'RB'), 'WRRB_FLEX': ('WR', 'RB'),
+    'W/T': ('WR', 'TE'), 'REC_FLEX': ('WR', 'TE'),
+    'W/R/T': ('WR', 'RB', 'TE'), 'FLEX': ('WR', 'RB', 'TE'),
+    'Q/W/R/T': ('QB', 'WR', 'RB', 'TE'), 'SUPER_FLEX': ('QB', 'WR', 'RB', 'TE'),
+    'D': ('DL', 'LB', 'DB'), 'IDP_FLEX': ('DL', 'LB', 'DB'),
+}
+
+
+def fits(slot, position):
+    """
+    :param slot: lineup slot, i.e. W/R/T
+    :param position: player position; Yahoo gives several as "WR,RB"
+    :return: True if the player can start in the slot
+    """
+    return any(p in SLOT_POSITIONS.get(slot, ()) for p in position.split(','))
+
+
+class Provider(object):
+    """
+    Interface every league source implements
+    """
+    name = None
+    # True when players can only be fetched a page at a time
+    paged_players = False
+    # Raised when the site can not be reached or does not answer in time
+    errors = ()
+
+    def __init__(self, config):
+        self.config = config
+
+    def league(self):
+        """
+        :return: LeagueInfo
+        """
+        raise NotImplementedError
+
+    def teams(self):
+        """
+        :return: TeamTable with standings
+        """
+        raise NotImplementedError
+
+    def matchups(self, weeks):
+        """
+        :param weeks: iterable of week numbers
+        :return: MatchupTable
+        """
+        raise NotImplementedError
+
+    def players(self, start=None, count=None, keys=None):
+        """
+        Player pool, a page of it, or specific players
+
+        :return: PlayerTable
+        """
+        raise NotImplementedError
+
+    def season(self, key=None, pool=None):
+        """
+        A whole season, current or past, with every week's matchups
+
+        :param key: league key of the season; the current league if None
+        :param pool: executor to spread response parsing over, if any
+        :return: Season
+        """
+        raise NotImplementedError
+
+    def rosters(self):
+        """
+        :return: dict of team key -> list of player keys on its roster
+        """
+        raise NotImplementedError
+
+    def available(self, count=100):
+        """
+        Free agents and players on waivers, best recent form first
+
+        :param count: roughly how many players to consider
+        :return: PlayerStatsTable
+        """
+        raise NotImplementedError
+
+    def roster_stats(self, team_key):
+        """
+        :param team_key: team key as in TeamTable
+        :return: PlayerStatsTable of the team's roster
+        """
+        raise NotImplementedError
+
+    def lineup_slots(self):
+        """
+        :return: list of starting lineup slots, one per slot (see SLOT_POSITIONS)
+        """
+        raise NotImplementedError
+
+    def lineups(self, weeks):
+        """
+        Every team's roster, points and starters
+
+        :param weeks: iterable of finished week numbers
+        :return: LineupTable
+        """
+        raise NotImplementedError
+
+    def player_changes(self, since):
+        """
+        Keys of players whose ownership changed since a unix timestamp
+
+        :return: list of keys, or None if the pool must be reloaded whole
+        """
+        return None
+
+    def sync(self):
+        """
+        Refresh any locally stored league data
+        """
+        pass
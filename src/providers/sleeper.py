@@ -0,0 +1,329 @@
+# Sleeper provider
+#
+# Sleeper serves everything as bulk JSON with no auth. Responses are kept
+# as local fixture files (refreshed by `sync`) and read from disk, so
+# commands never wait on the network:
+#
+#   league.json, users.json, rosters.json, state.json,
+#   matchups_<week>.json, players.json,
+#   stats_<week>.json, projections_<week>.json
+#
+# Weekly stats and projections are cut down to each player's fantasy
+# points under the league's scoring.
+#
+# players.json is Sleeper's multi-megabyte dump of every NFL player. It is
+# parsed once and the handful of fields the bot needs are written to
+# players.min.json, which is what later loads read.
+
+import datetime
+import json
+import math
+import os
+
+import numpy as np
+import requests
+import yscheduler
+
+from providers import base
+
+
+API_URL = 'https://api.sleeper.app/v1/'
+FIXTURES_PATH = os.path.abspath(os.path.join(os.path.realpath(__file__), '..', '..', 'sleeper'))
+# Weeks averaged for a player's recent form
+RECENT_WEEKS = 4
+# Injury statuses in Yahoo's abbreviations, which the tables use
+STATUSES = {'Questionable': 'Q', 'Doubtful': 'D', 'Out': 'O', 'Sus': 'SUSP', 'PUP': 'PUP-R'}
+
+
+class SleeperProvider(base.Provider):
+    name = 'sleeper'
+    errors = (requests.RequestException, yscheduler.DeadlineExceeded)
+
+    def __init__(self, config):
+        super(SleeperProvider, self).__init__(config)
+        self.league_id = config.get('league_id')
+        self.path = config.get('fixtures') or FIXTURES_PATH
+        self._cache = {}
+
+    def _load(self, name, default=None):
+        # Keep parsed files around until they change on disk
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            return default
+        mtime = os.path.getmtime(path)
+        cached = self._cache.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'r') as f:
+            data = json.load(f)
+        self._cache[name] = (mtime, data)
+        return data
+
+    def _rosters(self):
+        # Rosters in roster_id order define the team rows
+        return sorted(self._load('rosters.json', []), key=lambda r: r['roster_id'])
+
+    def _users(self):
+        return {u['user_id']: u for u in self._load('users.json', [])}
+
+    def _team_names(self):
+        users = self._users()
+        names = {}
+        for roster in self._rosters():
+            user = users.get(roster.get('owner_id')) or {}
+            metadata = user.get('metadata') or {}
+            names[roster['roster_id']] = (metadata.get('team_name') or user.get('display_name')
+                                          or 'Team %s' % roster['roster_id'])
+        return names
+
+    def league(self):
+        league = self._load('league.json', {})
+        settings = league.get('settings') or {}
+        state = self._load('state.json', {})
+        playoff_teams = int(settings.get('playoff_teams') or 0)
+        playoff_start = int(settings.get('playoff_week_start') or 15)
+        end_week = _end_week(settings)
+        start_date = state.get('season_start_date') or ''
+        end_date = ''
+        if start_date:
+            end = datetime.datetime.strptime(start_date, '%Y-%m-%d') + datetime.timedelta(weeks=end_week + 1)
+            end_date = end.strftime('%Y-%m-%d')
+        current_week = int(state.get('week') or settings.get('leg') or 1)
+        if league.get('status') == 'complete':
+            # The nfl state is this season's; a finished league is past all its weeks
+            current_week = end_week + 1
+        return base.LeagueInfo(
+            league.get('league_id', self.league_id), league.get('name', ''), league.get('season', ''),
+            current_week, int(settings.get('start_week') or 1), end_week, start_date, end_date,
+            int(league.get('total_rosters') or 0), playoff_teams, playoff_start,
+        )
+
+    def teams(self):
+        users = self._users()
+        names = self._team_names()
+        columns = dict((name, []) for name in base.TeamTable.columns)
+        for roster in self._rosters():
+            settings = roster.get('settings') or {}
+            user = users.get(roster.get('owner_id')) or {}
+            columns['keys'].append(str(roster['roster_id']))
+            columns['names'].append(names[roster['roster_id']])
+            columns['managers'].append(user.get('display_name', ''))
+            columns['manager_ids'].append(roster.get('owner_id') or '')
+            columns['divisions'].append(str(settings.get('division') or ''))
+            columns['wins'].append(settings.get('wins', 0))
+            columns['losses'].append(settings.get('losses', 0))
+            columns['ties'].append(settings.get('ties', 0))
+            # Sleeper splits points into whole and hundredths
+            columns['points_for'].append(settings.get('fpts', 0) + settings.get('fpts_decimal', 0) / 100.0)
+            columns['points_against'].append(settings.get('fpts_against', 0)
+                                             + settings.get('fpts_against_decimal', 0) / 100.0)
+        return base.TeamTable(**columns)
+
+    def matchups(self, weeks):
+        index = {r['roster_id']: i for i, r in enumerate(self._rosters())}
+        current_week = self.league().current_week
+        nan = float('nan')
+        rows = []
+        for week in weeks:
+            games = {}
+            for entry in self._load('matchups_%d.json' % week, []):
+                games.setdefault(entry.get('matchup_id'), []).append(entry)
+            for matchup_id, entries in sorted(games.items(), key=lambda g: str(g[0])):
+                # A null matchup_id means the roster has no game that week
+                pairs = [[e] for e in entries] if matchup_id is None else [entries]
+                for pair in pairs:
+                    home = pair[0]
+                    away = pair[1] if len(pair) > 1 else {}
+                    rows.append((week, index[home['roster_id']], index.get(away.get('roster_id'), -1),
+                                 float(home.get('points') or 0), float(away.get('points') or 0) if away else nan,
+                                 nan, nan, nan, nan, week < current_week))
+        if not rows:
+            return base.MatchupTable()
+        return base.MatchupTable(**dict(zip(base.MatchupTable.columns, zip(*rows))))
+
+    def players(self, start=None, count=None, keys=None):
+        owners = {}
+        names = self._team_names()
+        for roster in self._rosters():
+            for player_id in roster.get('players') or []:
+                owners[player_id] = names[roster['roster_id']]
+        rows = []
+        for key, name, position, team, status in self._compact_players():
+            if keys and key not in keys:
+                continue
+            rows.append((key, name, position, team, status, owners.get(key, 'freeagents')))
+        rows = rows[start or 0:(start or 0) + count if count else None]
+        if not rows:
+            return base.PlayerTable()
+        return base.PlayerTable(**dict(zip(base.PlayerTable.columns, zip(*rows))))
+
+    def season(self, key=None, pool=None):
+        provider = self
+        if key and key != self.league_id:
+            # Past leagues are downloaded once into their own fixtures
+            provider = SleeperProvider({'league_id': key, 'fixtures': os.path.join(self.path, 'history', key)})
+            if provider._load('league.json') is None:
+                provider.sync()
+        league = provider.league()
+        previous = provider._load('league.json', {}).get('previous_league_id')
+        return base.Season(league.key, league.season, provider.teams(),
+                           provider.matchups(range(league.start_week, league.end_week + 1)),
+                           previous if previous and previous != '0' else None)
+
+    def rosters(self):
+        return {str(r['roster_id']): list(r.get('players') or []) for r in self._rosters()}
+
+    def _player_stats(self, rows):
+        """
+        :param rows: compact player records
+        :return: PlayerStatsTable in rows order
+        """
+        nan = float('nan')
+        week = self.league().current_week
+        weeks = [self._load('stats_%d.json' % w, {}) for w in range(1, week)]
+        projections = self._load('projections_%d.json' % week, {})
+
+        def mean(key, weeks):
+            # Over the weeks the player played; byes are not zeros
+            points = [w[key] for w in weeks if key in w]
+            return sum(points) / len(points) if points else nan
+
+        stats = [(key, name, position, team, status, mean(key, weeks[-RECENT_WEEKS:]), mean(key, weeks),
+                  projections.get(key, nan), nan) for key, name, position, team, status in rows]
+        if not stats:
+            return base.PlayerStatsTable()
+        return base.PlayerStatsTable(**dict(zip(base.PlayerStatsTable.columns, zip(*stats))))
+
+    def available(self, count=100):
+        rostered = set(key for keys in self.rosters().values() for key in keys)
+        table = self._player_stats([p for p in self._compact_players() if p[0] not in rostered])
+        # Best recent form first; players with no stats last
+        order = (-np.where(np.isnan(table.recent), -np.inf, table.recent)).argsort(kind='stable')
+        return table.take(order[:count])
+
+    def roster_stats(self, team_key):
+        keys = set(self.rosters().get(team_key) or ())
+        return self._player_stats([p for p in self._compact_players() if p[0] in keys])
+
+    def lineup_slots(self):
+        positions = self._load('league.json', {}).get('roster_positions') or []
+        return [p for p in positions if p in base.SLOT_POSITIONS]
+
+    def lineups(self, weeks):
+        index = {r['roster_id']: i for i, r in enumerate(self._rosters())}
+        players = dict((p[0], p) for p in self._compact_players())
+        rows = []
+        for week in weeks:
+            for entry in self._load('matchups_%d.json' % week, []):
+                if entry.get('roster_id') not in index:
+                    continue
+                starters = set(entry.get('starters') or ())
+                points = entry.get('players_points') or {}
+                for key in entry.get('players') or ():
+                    _, name, position, _, _ = players.get(key) or (key, key, '', '', '')
+                    rows.append((week, index[entry['roster_id']], key, name, position, points.get(key, 0.0),
+                                 key in starters))
+        if not rows:
+            return base.LineupTable()
+        return base.LineupTable(**dict(zip(base.LineupTable.columns, zip(*rows))))
+
+    def _compact_players(self):
+        full = os.path.join(self.path, 'players.json')
+        compact = os.path.join(self.path, 'players.min.json')
+        if os.path.exists(full) and (not os.path.exists(compact)
+                                     or os.path.getmtime(compact) < os.path.getmtime(full)):
+            with open(full, 'r') as f:
+                dump = json.load(f)
+            rows = []
+            for key, p in dump.items():
+                if not p.get('active', True):
+                    continue
+                name = p.get('full_name') or ' '.join(filter(None, [p.get('first_name'), p.get('last_name')]))
+                status = p.get('injury_status') or ''
+                rows.append([key, name, p.get('position') or '', p.get('team') or '', STATUSES.get(status, status)])
+            with open(compact, 'w') as f:
+                json.dump(rows, f, separators=(',', ':'))
+            # Free the full dump right away, it is an order of magnitude larger
+            del dump
+        return self._load('players.min.json', [])
+
+    def sync(self):
+        """
+        Download fresh fixtures from Sleeper
+        """
+        assert self.league_id, 'Sleeper league_id must be set in auth.json'
+        os.makedirs(self.path, exist_ok=True)
+        state = self._fetch('state/nfl')
+        league = self._fetch('league/%s' % self.league_id)
+        files = {
+            'state.json': state,
+            'league.json': league,
+            'users.json': self._fetch('league/%s/users' % self.league_id),
+            'rosters.json': self._fetch('league/%s/rosters' % self.league_id),
+        }
+        complete = league.get('status') == 'complete'
+        # Future regular season weeks are fetched too for their schedule, and
+        # finished leagues whole, playoffs included
+        settings = league.get('settings') or {}
+        last_week = _end_week(settings) if complete else int(settings.get('playoff_week_start') or 15) - 1
+        for week in range(1, max(1 if complete else int(state.get('week') or 1), last_week) + 1):
+            files['matchups_%d.json' % week] = self._fetch('league/%s/matchups/%d' % (self.league_id, week))
+        # The players dump is large and Sleeper asks that it be pulled at
+        # most once a day; finished leagues have no use for it
+        players_path = os.path.join(self.path, 'players.json')
+        if not complete and (not os.path.exists(players_path) or os.path.getmtime(players_path) < _day_ago()):
+            files['players.json'] = self._fetch('players/nfl')
+        if not complete:
+            files.update(self._sync_stats(league, state))
+        for name, data in files.items():
+            tmp = os.path.join(self.path, name + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp, os.path.join(self.path, name))
+
+    def _sync_stats(self, league, state):
+        # Finished weeks never change, so only last week is fetched again
+        season, week = league.get('season'), int(state.get('week') or 1)
+        key = _points_key(league)
+        files = {}
+        for w in range(1, week):
+            name = 'stats_%d.json' % w
+            if w < week - 1 and os.path.exists(os.path.join(self.path, name)):
+                continue
+            files[name] = _compact_points(self._fetch('stats/nfl/regular/%s/%d' % (season, w)), key)
+        files['projections_%d.json' % week] = _compact_points(
+            self._fetch('projections/nfl/regular/%s/%d' % (season, week)), key)
+        return files
+
+    def _fetch(self, uri):
+        r = yscheduler.SCHEDULER.call(requests.get, API_URL + uri, timeout=30)
+        r.raise_for_status()
+        return r.json()
+
+
+def _end_week(settings):
+    # Sleeper only says when playoffs start; each round takes a week
+    playoff_teams = int(settings.get('playoff_teams') or 0)
+    rounds = int(math.ceil(math.log(playoff_teams, 2))) if playoff_teams > 1 else 0
+    return int(settings.get('playoff_week_start') or 15) + rounds - 1
+
+
+def _points_key(league):
+    # Sleeper totals points under each of the common scoring formats
+    reception = float((league.get('scoring_settings') or {}).get('rec') or 0)
+    return 'pts_ppr' if reception >= 1 else 'pts_half_ppr' if reception >= 0.5 else 'pts_std'
+
+
+def _compact_points(stats, key):
+    """
+    :param stats: Sleeper stats or projections of a week, either
+        {player id: stats} or [{player_id, stats}]
+    :return: dict of player id -> fantasy points
+    """
+    if isinstance(stats, list):
+        stats = dict((s.get('player_id'), s.get('stats')) for s in stats)
+    return dict((player_id, round(s[key], 2)) for player_id, s in stats.items() if s and s.get(key) is not None)
+
+
+def _day_ago():
+    return (datetime.datetime.now() - datetime.timedelta(days=1)).timestamp()
@@ -0,0 +1,252 @@
+# Yahoo provider
+# Translates the xmltodict shaped json from yfantasy into the normalized
+# tables in providers.base
+
+import requests
+import yfantasy
+import yquery
+import yscheduler
+
+from providers import base
+from yquery import _as_list
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+# Yahoo's lastmonth stats span about this many weeks
+RECENT_WEEKS = 4
+
+
+def _manager(team, field='email'):
+    managers = _as_list((team.get('managers') or {}).get('manager'))
+    return managers[0].get(field, '') if managers else ''
+
+
+def parse_players(content):
+    """
+    Convert a players collection response into a PlayerTable
+
+    :param content: raw json of a resource with a players collection
+    :return: PlayerTable
+    """
+    rows = []
+    for p in _as_list((content.get('players') or {}).get('player')):
+        ownership = p.get('ownership') or {}
+        owner = ownership.get('owner_team_name') or ownership.get('ownership_type') or ''
+        # Yahoo writes most teams as "Det"; Sleeper and the tables use "DET"
+        rows.append((p['player_key'], p['name']['full'], p.get('display_position', ''),
+                     p.get('editorial_team_abbr', '').upper(), p.get('status', ''), owner))
+    return base.PlayerTable(**dict(zip(base.PlayerTable.columns, zip(*rows)))) if rows else base.PlayerTable()
+
+
+def parse_scoreboards(scoreboards, team_keys):
+    """
+    Convert scoreboards from League.scoreboard into a MatchupTable
+
+    :param scoreboards: iterable of scoreboard json
+    :param team_keys: team keys in TeamTable order
+    :return: MatchupTable
+    """
+    index = {k: i for i, k in enumerate(team_keys)}
+    rows = []
+    dates = {}
+    for sb in scoreboards:
+        for m in _as_list(sb['scoreboard']['matchups']['matchup']):
+            week = int(m['week'])
+            dates[week] = (m.get('week_start', ''), m.get('week_end', ''))
+            teams = _as_list(m['teams']['team'])
+            for team in teams:
+                if team['team_key'] not in index:
+                    index[team['team_key']] = len(index)
+            home = teams[0]
+            away = teams[1] if len(teams) > 1 else {}
+            rows.append((
+                week, index[home['team_key']], index.get(away.get('team_key'), -1),
+                _float((home.get('team_points') or {}).get('total')),
+                _float((away.get('team_points') or {}).get('total')),
+                _float((home.get('team_projected_points') or {}).get('total')),
+                _float((away.get('team_projected_points') or {}).get('total')),
+                _float(home.get('win_probability')), _float(away.get('win_probability')),
+                m.get('status') == 'postevent',
+            ))
+    if not rows:
+        return base.MatchupTable(dates=dates)
+    return base.MatchupTable(dates=dates, **dict(zip(base.MatchupTable.columns, zip(*rows))))
+
+
+class YahooProvider(base.Provider):
+    name = 'yahoo'
+    paged_players = True
+    errors = (requests.RequestException, yscheduler.DeadlineExceeded, yfantasy.YahooResourceException)
+
+    @property
+    def _league(self):
+        return yfantasy.get()
+
+    def _team_keys(self, league=None):
+        league = league or self._league
+        return [t['team_key'] for t in league.teams or []]
+
+    def league(self):
+        league = self._league
+        settings = league.json.get('settings') or league.settings['settings']
+        return base.LeagueInfo(
+            league.league_key, league.name, league.season, int(league.current_week),
+            int(league.start_week), int(league.end_week), league.start_date, league.end_date,
+            int(league.num_teams), int(settings['num_playoff_teams']), int(settings['playoff_start_week']),
+        )
+
+    def teams(self):
+        league = self._league
+        keys = self._team_keys(league)
+        standings = _as_list(league.standings['standings']['teams']['team'])
+        for team in standings:
+            if team['team_key'] not in keys:
+                keys.append(team['team_key'])
+        by_key = {t['team_key']: t for t in standings}
+        columns = dict((name, []) for name in base.TeamTable.columns)
+        for key in keys:
+            team = by_key.get(key, {})
+            ts = team.get('team_standings') or {}
+            totals = ts.get('outcome_totals') or {}
+            columns['keys'].append(key)
+            columns['names'].append(team.get('name', ''))
+            columns['managers'].append(_manager(team))
+            columns['manager_ids'].append(_manager(team, 'guid'))
+            columns['divisions'].append(team.get('division_id') or '')
+            columns['wins'].append(int(totals.get('wins') or 0))
+            columns['losses'].append(int(totals.get('losses') or 0))
+            columns['ties'].append(int(totals.get('ties') or 0))
+            columns['points_for'].append(_float(ts.get('points_for') or 0))
+            columns['points_against'].append(_float(ts.get('points_against') or 0))
+        return base.TeamTable(**columns)
+
+    def matchups(self, weeks):
+        league = self._league
+        return parse_scoreboards(league.scoreboards(weeks), self._team_keys(league))
+
+    def players(self, start=None, count=None, keys=None):
+        league = self._league
+        if keys:
+            return parse_players(league.players(keys=keys))
+        return parse_players(league.players(start=start or 0, count=count or 25))
+
+    def season(self, key=None, pool=None):
+        key = key or self._league.league_key
+        query = yquery.Query('league', key)
+        league = yfantasy.get(raw_uri=str(query.sub('teams')), raw_data=True)
+        teams = _as_list(league['teams']['team'])
+        # Past seasons only need who played whom, not standings
+        columns = dict((name, [0] * len(teams)) for name in base.TeamTable.columns)
+        columns['keys'] = [t['team_key'] for t in teams]
+        columns['names'] = [t.get('name', '') for t in teams]
+        columns['managers'] = [_manager(t) for t in teams]
+        columns['manager_ids'] = [_manager(t, 'guid') for t in teams]
+        columns['divisions'] = [t.get('division_id') or '' for t in teams]
+        current_week = None if league.get('is_finished') == '1' else int(league['current_week'])
+        weeks = range(int(league['start_week']), int(current_week or league['end_week']) + 1)
+        scoreboards = yfantasy.scoreboards(key, weeks, current_week, pool=pool)
+        # renew is the previous season's <game id>_<league id>
+        renew = league.get('renew')
+        previous = '%s.l.%s' % tuple(renew.split('_')) if renew else None
+        return base.Season(key, league.get('season', ''), base.TeamTable(**columns),
+                           parse_scoreboards(scoreboards, columns['keys']), previous)
+
+    def rosters(self):
+        league = self._league
+        rosters = {}
+        # One batched request for every team's roster
+        for team in league.team_rosters(self._team_keys(league)):
+            players = _as_list(((team.json.get('roster') or {}).get('players') or {}).get('player'))
+            rosters[team.team_key] = [p['player_key'] for p in players]
+        return rosters
+
+    def _player_stats(self, listing, league):
+        """
+        :param listing: player json with name, position and ownership
+        :return: PlayerStatsTable in listing order
+        """
+        nan = float('nan')
+        keys = [p['player_key'] for p in listing]
+        chunks = [keys[i:i + yquery.MAX_KEYS] for i in range(0, len(keys), yquery.MAX_KEYS)]
+        spans = ('lastmonth', 'season')
+        uris = [str(league.query.sub('players', player_keys=chunk).sub('stats', type=span))
+                for span in spans for chunk in chunks]
+        points = dict((key, [nan, nan]) for key in keys)
+        for i, content in enumerate(yfantasy.get_many(uris, api='league')):
+            for p in _as_list((content.get('players') or {}).get('player')):
+                points[p['player_key']][i // len(chunks)] = _float((p.get('player_points') or {}).get('total'))
+        weeks_played = max(1, int(league.current_week) - int(league.start_week))
+        rows = []
+        for p in listing:
+            recent, season = points[p['player_key']]
+            rows.append((p['player_key'], p['name']['full'], p.get('display_position', ''),
+                         p.get('editorial_team_abbr', ''), p.get('status', ''), recent / RECENT_WEEKS,
+                         season / weeks_played, nan, _float((p.get('percent_owned') or {}).get('value'))))
+        if not rows:
+            return base.PlayerStatsTable()
+        return base.PlayerStatsTable(**dict(zip(base.PlayerStatsTable.columns, zip(*rows))))
+
+    def available(self, count=100):
+        league = self._league
+        # Pages of free agents and waivers, ranked by points over the last month
+        uris = [str(league.query.sub('players', status='A', sort='AR', sort_type='lastmonth', start=start,
+                                     count=25, out='percent_owned')) for start in range(0, count, 25)]
+        listing = [p for content in yfantasy.get_many(uris, api='league')
+                   for p in _as_list((content.get('players') or {}).get('player'))]
+        return self._player_stats(listing, league)
+
+    def roster_stats(self, team_key):
+        query = yquery.Query('team', team_key).sub('roster').sub('players', out='percent_owned')
+        team = yfantasy.get(raw_uri=str(query), raw_data=True)
+        listing = _as_list(((team.get('roster') or {}).get('players') or {}).get('player'))
+        return self._player_stats(listing, self._league)
+
+    def lineup_slots(self):
+        league = self._league
+        settings = league.json.get('settings') or league.settings['settings']
+        slots = []
+        for position in _as_list((settings.get('roster_positions') or {}).get('roster_position')):
+            if position.get('position') in base.SLOT_POSITIONS:
+                slots.extend([position['position']] * int(position.get('count') or 1))
+        return slots
+
+    def lineups(self, weeks):
+        league = self._league
+        keys = self._team_keys(league)
+        index = {k: i for i, k in enumerate(keys)}
+        weeks = list(weeks)
+        # Stat corrections are in a week after the games, then rosters never change
+        settled = [w for w in weeks if yfantasy.settled(w, league.current_week)]
+        recent = [w for w in weeks if w not in settled]
+        rows = []
+        for group, final in ((settled, lambda content: True), (recent, None)):
+            pairs = [(week, key) for week in group for key in keys]
+            queries = [yquery.Query('team', key).sub('roster', week=week).sub('players').sub(
+                'stats', type='week', week=week) for week, key in pairs]
+            for (week, key), team in zip(pairs, yfantasy.batch(queries, final=final)):
+                for p in _as_list(((team.get('roster') or {}).get('players') or {}).get('player')):
+                    slot = (p.get('selected_position') or {}).get('position')
+                    rows.append((week, index[key], p['player_key'], p['name']['full'], p.get('display_position', ''),
+                                 _float((p.get('player_points') or {}).get('total')), slot in base.SLOT_POSITIONS))
+        if not rows:
+            return base.LineupTable()
+        return base.LineupTable(**dict(zip(base.LineupTable.columns, zip(*rows))))
+
+    def player_changes(self, since):
+        changed = set()
+        transactions = self._league.transactions()
+        for t in _as_list((transactions.get('transactions') or {}).get('transaction')):
+            if float(t.get('timestamp') or 0) < since:
+                continue
+            for p in _as_list((t.get('players') or {}).get('player')):
+                changed.add(p['player_key'])
+        return sorted(changed)
+
+    def sync(self):
+        yfantasy.create_yleague_json(int(self._league.league_id), update=True)
@@ -0,0 +1,316 @@
+# Snapshot cache of upstream responses
+#
+# Every successful upstream response is kept as the last good snapshot
+# for its request. Normally snapshots are only written; when a command
+# runs out of latency budget it is re-run inside `cached_only()`, which
+# answers every request from its snapshot (or raises CacheMiss) and
+# records how old the oldest snapshot it used was.
+#
+# Responses that can no longer change (finished weeks) are stored final:
+# they are never evicted and are reused without asking upstream again.
+#
+# Fetches go through `fetch()`, which also coalesces them: a snapshot
+# younger than FRESH_FOR is reused as is, and otherwise a lease on the key
+# elects a single refresher while everyone else waits for its result.
+# Setting FFBOT_CACHE to a file path swaps the in-process LRU for a SQLite
+# database in WAL mode, so every bot worker on the host shares snapshots
+# and leases and each upstream request is sent once per host instead of
+# once per process.
+
+import collections
+import contextlib
+import contextvars
+import json
+import marshal
+import os
+import sqlite3
+import threading
+import time
+
+
+# Seconds a snapshot is reused without asking upstream again
+FRESH_FOR = 30.0
+# Seconds a refresher may hold its lease before others give up on it
+LEASE_TTL = 30.0
+POLL_INTERVAL = 0.05
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def _owner():
+    return '%d:%d' % (os.getpid(), threading.get_ident())
+
+
+class SnapshotCache(object):
+    """
+    In-process LRU of the last good response per key
+
+    Values are kept marshal encoded, so like the SQLite cache every get
+    returns a copy of its own that the caller is free to change.
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._final = {}
+
+    def get(self, key):
+        """
+        :return: (value, unix time stored, final) or None
+        """
+        with self._lock:
+            entry = self._final.get(key)
+            if entry is None:
+                entry = self._data.get(key)
+                if entry is None:
+                    return None
+                self._data.move_to_end(key)
+        return (marshal.loads(entry[0]),) + entry[1:]
+
+    def put(self, key, value, final=False):
+        """
+        :param final: value will never change; keep it out of the LRU
+        """
+        value = marshal.dumps(value)
+        with self._lock:
+            if final:
+                self._data.pop(key, None)
+                self._final[key] = (value, time.time(), True)
+                return
+            self._data[key] = (value, time.time(), False)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._data) + len(self._final),
+                    'final': len(self._final), 'leases': len(self._leases)}
+
+    def acquire(self, key, ttl=LEASE_TTL):
+        """
+        Try to become the refresher of a key
+
+        :return: True if the lease was taken
+        """
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(key)
+            if holder and holder[1] > now and holder[0] != _owner():
+                return False
+            self._leases[key] = (_owner(), now + ttl)
+            return True
+
+    def release(self, key):
+        with self._lock:
+            if self._leases.get(key, (None,))[0] == _owner():
+                del self._leases[key]
+
+
+class SQLiteSnapshotCache(object):
+    """
+    Snapshots and leases in a SQLite database shared by every process on a host
+
+    WAL mode lets any number of readers proceed alongside the one writer,
+    and writes are single row upserts, so workers rarely wait on each other.
+    Values are stored as compact json.
+    """
+    def __init__(self, path, max_entries=4096):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._puts = 0
+        with self._db() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS snapshots (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                       'stored REAL NOT NULL, final INTEGER NOT NULL DEFAULT 0)')
+            if 'final' not in [row[1] for row in db.execute('PRAGMA table_info(snapshots)')]:
+                db.execute('ALTER TABLE snapshots ADD COLUMN final INTEGER NOT NULL DEFAULT 0')
+            db.execute('CREATE INDEX IF NOT EXISTS snapshots_stored ON snapshots (stored)')
+            db.execute('CREATE TABLE IF NOT EXISTS leases '
+                       '(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)')
+
+    def _db(self):
+        # sqlite3 connections may not be shared between threads
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        """
+        :return: (value, unix time stored, final) or None
+        """
+        row = self._db().execute('SELECT value, stored, final FROM snapshots WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], bool(row[2])
+
+    def put(self, key, value, final=False):
+        """
+        :param final: value will never change; never trim it
+        """
+        db = self._db()
+        db.execute('INSERT OR REPLACE INTO snapshots (key, value, stored, final) VALUES (?, ?, ?, ?)',
+                   (key, json.dumps(value, separators=(',', ':')), time.time(), int(final)))
+        self._puts += 1
+        if self._puts % 100 == 0:
+            # Trim the oldest snapshots now and then rather than on every write
+            db.execute('DELETE FROM snapshots WHERE key IN (SELECT key FROM snapshots WHERE final = 0 '
+                       'ORDER BY stored DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def stats(self):
+        db = self._db()
+        entries, final, size = db.execute('SELECT COUNT(*), COALESCE(SUM(final), 0), '
+                                          'COALESCE(SUM(LENGTH(value)), 0) FROM snapshots').fetchone()
+        leases = db.execute('SELECT COUNT(*) FROM leases WHERE expires > ?', (time.time(),)).fetchone()[0]
+        return {'backend': 'sqlite %s' % self.path, 'entries': entries, 'final': final,
+                'leases': leases, 'bytes': size}
+
+    def acquire(self, key, ttl=LEASE_TTL):
+        """
+        Try to become the refresher of a key, host wide
+
+        :return: True if the lease was taken
+        """
+        db = self._db()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front so two workers cannot both
+        # see the lease as free
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT owner, expires FROM leases WHERE key = ?', (key,)).fetchone()
+            if row and row[1] > now and row[0] != _owner():
+                db.execute('ROLLBACK')
+                return False
+            db.execute('INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)',
+                       (key, _owner(), now + ttl))
+            db.execute('COMMIT')
+            return True
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def release(self, key):
+        self._db().execute('DELETE FROM leases WHERE key = ? AND owner = ?', (key, _owner()))
+
+
+class Served(object):
+    """
+    Tracks the snapshots used while answering from cache
+    """
+    def __init__(self, cache):
+        self.cache = cache
+        self.oldest = None
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            raise CacheMiss(key)
+        value, stored = entry[:2]
+        self.oldest = stored if self.oldest is None else min(self.oldest, stored)
+        return value
+
+    @property
+    def age(self):
+        return time.time() - self.oldest if self.oldest is not None else 0.0
+
+
+def open_cache(path=None):
+    """
+    :param path: SQLite file to share snapshots through; in-process if empty
+    :return: SnapshotCache or SQLiteSnapshotCache
+    """
+    if path:
+        return SQLiteSnapshotCache(path)
+    return SnapshotCache()
+
+
+CACHE = open_cache(os.environ.get('FFBOT_CACHE'))
+_served = contextvars.ContextVar('ycache_served', default=None)
+
+
+@contextlib.contextmanager
+def cached_only(cache=None):
+    """
+    Answer upstream requests inside the block from snapshots only
+
+    :param cache: SnapshotCache to serve from; the shared CACHE if None
+    :return: Served, whose age is that of the oldest snapshot used
+    """
+    served = Served(cache or CACHE)
+    token = _served.set(served)
+    try:
+        yield served
+    finally:
+        _served.reset(token)
+
+
+def serving():
+    """
+    :return: Served if the calling context is answering from cache, else None
+    """
+    return _served.get()
+
+
+@contextlib.contextmanager
+def lease(key, cache=None, ttl=LEASE_TTL):
+    """
+    Hold the refresher lease of a key for the block
+
+    :return: True inside the block if this caller holds the lease
+    """
+    cache = cache or CACHE
+    held = cache.acquire(key, ttl)
+    try:
+        yield held
+    finally:
+        if held:
+            cache.release(key)
+
+
+def fetch(key, fn, fresh_for=FRESH_FOR, final=None, cache=None):
+    """
+    Snapshot of key, refreshed with fn once it is older than fresh_for
+
+    Only the holder of the key's lease calls fn; concurrent callers, in
+    this process or another sharing the cache, wait for its snapshot. If
+    the holder fails or its lease runs out the next caller takes over.
+
+    :param fn: function returning a fresh value
+    :param final: function of a value, True if it can never change again
+    :return: value
+    """
+    cache = cache or CACHE
+    started = time.time()
+    usable = lambda entry: entry is not None and (entry[2] or time.time() - entry[1] < fresh_for
+                                                  or entry[1] >= started)
+    while True:
+        entry = cache.get(key)
+        if usable(entry):
+            return entry[0]
+        with lease(key, cache) as held:
+            if held:
+                # The last holder may have stored its value since we looked
+                entry = cache.get(key)
+                if usable(entry):
+                    return entry[0]
+                value = fn()
+                cache.put(key, value, final=bool(final and final(value)))
+                return value
+        time.sleep(POLL_INTERVAL)
+
+
+def describe_age(seconds):
+    if seconds < 90:
+        return '%ds' % seconds
+    if seconds < 90 * 60:
+        return '%dm' % (seconds // 60)
+    if seconds < 36 * 60 * 60:
+        return '%dh' % (seconds // 3600)
+    return '%dd' % (seconds // 86400)
@@ -1,16 +1,44 @@
 # Interface for Yahoo Fantasy
 
+import concurrent.futures
+import contextvars
 import datetime
 import json
+import logging
 import os
+import time
 import yclient
+import ycache
+import yquery
+import yscheduler
+import ylog
+import ysnapshot
+import ytrace
 import xmltodict
 
-from yclient import logging
+logger = logging.getLogger(__name__)
 
 
-YAPI = yclient.YahooAPIClient()
+def _client():
+    # FFBOT_REPLAY serves recorded responses offline; FFBOT_RECORD records
+    # live ones (see yclient.RecordingClient); FFBOT_YAHOO_URL points at a
+    # stand-in server
+    if os.environ.get('FFBOT_YAHOO_URL'):
+        return yclient.StubClient(os.environ['FFBOT_YAHOO_URL'])
+    if os.environ.get('FFBOT_REPLAY'):
+        return yclient.ReplayClient(os.environ['FFBOT_REPLAY'],
+                                    latency=float(os.environ.get('FFBOT_REPLAY_LATENCY') or 0))
+    if os.environ.get('FFBOT_RECORD'):
+        return yclient.RecordingClient(os.environ['FFBOT_RECORD'], yclient.YahooAPIClient())
+    return yclient.YahooAPIClient()
+
+
+YAPI = _client()
+LEAGUE_SNAPSHOT_PATH = os.path.abspath(os.path.join(os.path.realpath(__file__), '..', 'league.snap'))
+# Read until the first snapshot is written
 LEAGUE_JSON_PATH = os.path.abspath(os.path.join(os.path.realpath(__file__), '..', 'league.json'))
+# Parts of the league saved on their own, decoded only when used
+LEAGUE_SECTIONS = ('settings', 'teams')
 
 
 def xml_to_json(xmltext, api, nest_map=''):
@@ -22,11 +50,9 @@ def xml_to_json(xmltext, api, nest_map=''):
     :param nest_map: comma separated map to data in json (i.e. team,roster)
     :return:
     """
-    # need to dump and load in order to access as dict
     api = api.lower()
-    convert = json.dumps(xmltodict.parse(xmltext), indent=4, separators=(',', ': '))
-    logging.info(convert)
-    content = json.loads(convert)['fantasy_content']
+    # Plain dicts, the same as a json round trip gives but without one
+    content = xmltodict.parse(xmltext, dict_constructor=dict)['fantasy_content']
     # sometimes info is nested in other content
     # if we want something in a deeper level, provide a map to the resource
     if nest_map:
@@ -35,48 +61,68 @@ def xml_to_json(xmltext, api, nest_map=''):
     return content.get(api, content)
 
 
-def get_yleague_json(path=LEAGUE_JSON_PATH):
+def get_yleague_json(path=LEAGUE_SNAPSHOT_PATH):
     """
-    Retrieve yahoo league json file if it exists; create if it
-    does not.
+    Retrieve the league saved by create_yleague_json
 
-    :return:
+    The snapshot is mapped once per update and its settings and teams are
+    only decoded when used, so this is cheap enough to call per request.
+    A snapshot this Python can not read (written by another version, or
+    damaged) is built again from Yahoo.
+
+    :return: read only mapping of league data; None if there is none
     """
-    with open(path, 'r') as f:
+    try:
+        return ysnapshot.load(path)
+    except FileNotFoundError:
+        pass
+    except ysnapshot.SnapshotError as e:
         try:
-            yleague = json.load(f)
-        except json.JSONDecodeError:
-            # If league.json file does not exist or is empty
-            return None
-    return yleague
-
-
-def create_yleague_json(league_id, update=False):
+            league_id = ysnapshot.read_meta(path).get('league_id')
+        except ysnapshot.SnapshotError:
+            league_id = None
+        if league_id is not None:
+            logger.warning('Rebuilding league snapshot: %s', e)
+            return create_yleague_json(league_id, update=True, path=path)
+        logger.error('Unreadable league snapshot, run ffbot sync: %s', e)
+    try:
+        with open(LEAGUE_JSON_PATH, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        # If league.json file does not exist or is empty
+        return None
+
+
+def create_yleague_json(league_id, update=False, path=LEAGUE_SNAPSHOT_PATH):
     """
-    There are certain unchanging characteristics of a given league
-    that do not make sense to request on the fly. On first use, this
-    module will capture this data and dump into a json file.
-    This will greatly speed up requests.
+    Save the league, its settings and teams, which rarely change, as a
+    snapshot (see ysnapshot) so requests read them from disk rather than
+    asking Yahoo every time.
 
-    Likely run this as a daily cron
+    Run once with the league id to set up, then daily with update to pick
+    up changes (see ffbot sync).
 
-    :return:
+    :param league_id: Yahoo league id, the number in the league's url
+    :param update: replace a snapshot that is already there
+    :param path: snapshot file
+    :return: league data
     """
-    if get_yleague_json():
-        assert update, 'Must be updating league.json to make changes!'
+    if not update:
+        assert not get_yleague_json(path), 'Must be updating the league snapshot to make changes!'
     # First, get season id
     season = get(raw_uri='game/nfl', raw_data=True)
     season_id = season['game_id']
-    # Get league data for current season
-    league_uri = 'league/%s.l.%d' % (season_id, league_id)
-    league = get(raw_uri=league_uri, raw_data=True)
+    # Get league data (and settings, which do not change mid season) for current season
+    league_uri = yquery.Query('league', '%s.l.%d' % (season_id, league_id)).out('settings')
+    # Copied since the response is also the cached snapshot
+    league = dict(get(raw_uri=str(league_uri), raw_data=True))
     # Get data for each team
     league['teams'] = []
     for i in range(1, int(league['num_teams']) + 1):
         team_uri = 'team/' + league['league_key'] + '.t.' + str(i)
         league['teams'].append(get(raw_uri=team_uri, raw_data=True))
-    with open(LEAGUE_JSON_PATH, 'w') as f:
-        json.dump(league, f, indent=4, separators=(',', ': '))
+    # Replaced atomically so other workers never read a half written file
+    ysnapshot.write(path, league, sections=LEAGUE_SECTIONS, meta={'league_id': league_id})
     return league
 
 
@@ -84,26 +130,38 @@ def get(**kwargs):
     """
     Primary entry point for python API client
 
-    :param kwargs: currently supports: <empty>, raw_uri, raw_data, api
+    :param kwargs: currently supports: <empty>, raw_uri, raw_data, api, nest_map,
+        fresh_for (seconds a cached response is reused, see ycache), final (function of
+        a response, True if it can never change), pool (process pool to parse xml in)
     :return:
     """
-    league = League(json=get_yleague_json())
     if not kwargs:
-        return league
+        return League(json=get_yleague_json())
     api_json = {}
     api = kwargs.get('api')
     raw_uri = kwargs.get('raw_uri')
     if raw_uri:
         api = kwargs.get('api') or raw_uri.split('/')[0]
-        xml = YAPI.send_get(uri=raw_uri)
-        if not xml:
-            raise YahooResourceNotFoundException('Resource at %s not found' % raw_uri)
-        api_json = xml_to_json(xml.text, api, nest_map=kwargs.get('nest_map'))
+        cache_key = '|'.join([raw_uri, api, kwargs.get('nest_map') or ''])
+        served = ycache.serving()
+        if served:
+            # Out of latency budget; answer from the last good response
+            api_json = served.get(cache_key)
+        else:
+            # Recent snapshots are reused and concurrent fetches of the same
+            # uri, from any worker sharing the cache, go upstream once
+            # A cache hit is a yahoo.get span without an http child
+            with ytrace.span('yahoo.get', uri=raw_uri):
+                api_json = ycache.fetch(cache_key,
+                                        lambda: _fetch(raw_uri, api, kwargs.get('nest_map'), kwargs.get('pool')),
+                                        fresh_for=kwargs.get('fresh_for', ycache.FRESH_FOR),
+                                        final=kwargs.get('final'))
     if kwargs.get('team'):
         # team and league are not really subject to change much
         # we will update this json once a day and can explore live updates if needed
+        # Only read here: rebuilding the snapshot fetches through get
         team_id = kwargs.get('team')
-        api_json = [t for t in league.teams if t['team_id'] == team_id][0]
+        api_json = [t for t in League(json=get_yleague_json()).teams if t['team_id'] == team_id][0]
     if kwargs.get('raw_data'):
         return api_json
     # api must be defined
@@ -111,6 +169,107 @@ def get(**kwargs):
     return YResource(json=api_json, api=target_api)
 
 
+def _fetch(raw_uri, api, nest_map, pool=None):
+    # Wait for a slot by the caller's priority class (see yscheduler)
+    start = time.perf_counter()
+    with ytrace.span('http', uri=raw_uri) as span:
+        xml = yscheduler.SCHEDULER.call(YAPI.send_get, uri=raw_uri)
+    ylog.event(logger, 'fetch', uri=yquery.template(raw_uri), status='ok' if xml else 'failed',
+               bytes=len(xml.text) if xml else 0, ms=1000 * (time.perf_counter() - start),
+               queued_ms=1000 * span.attrs.get('queued', 0.0))
+    if not xml:
+        raise YahooResourceNotFoundException('Resource at %s not found' % raw_uri)
+    ylog.payload(logger, raw_uri, xml.text)
+    with ytrace.span('xml', size=len(xml.text)):
+        if pool is not None:
+            return pool.submit(xml_to_json, xml.text, api, nest_map).result()
+        return xml_to_json(xml.text, api, nest_map=nest_map)
+
+
+def get_many(uris, api=None, pool=None, workers=4, final=None):
+    """
+    Fetch several uris at once
+
+    Each uri is fetched (or answered from cache) by `get` on its own thread,
+    so requests go out concurrently while the scheduler still caps how many
+    are in flight. Turning large responses into json is cpu bound, so the
+    xml is parsed across pool when one is given.
+
+    :param uris: list of uri strings
+    :param api: api of every uri; taken from each uri if None
+    :param pool: process pool executor to parse responses in
+    :param final: function of a response, True if it can never change (see ycache)
+    :return: list of raw data, in the same order as uris
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        # Each request runs in a copy of the caller's context to keep its
+        # priority and cache mode
+        futures = [executor.submit(contextvars.copy_context().run, get, raw_uri=uri, raw_data=True,
+                                   api=api, pool=pool, final=final) for uri in uris]
+        return [f.result() for f in futures]
+
+
+def settled(week, current_week):
+    """
+    Stat corrections land in the week after the games, after that a week's
+    points never change
+
+    :param week: week number
+    :param current_week: league's current week, None once the season is over
+    :return: True if the week can be cached for good
+    """
+    return current_week is None or int(week) < int(current_week) - 1
+
+
+def scoreboards(league_key, weeks, current_week, pool=None):
+    """
+    Scoreboards of many weeks, fetched concurrently
+
+    Settled weeks never change, so they are served from cache for good.
+
+    :param league_key: league key
+    :param weeks: iterable of week numbers
+    :param current_week: league's current week, None once the season is over
+    :param pool: process pool executor to parse responses in
+    :return: list of league json with scoreboard, in the same order as weeks
+    """
+    query = yquery.Query('league', league_key)
+    weeks = list(weeks)
+    done = [w for w in weeks if settled(w, current_week)]
+    recent = [w for w in weeks if not settled(w, current_week)]
+    by_week = {}
+    for group, final in ((done, lambda content: True), (recent, None)):
+        if group:
+            contents = get_many([str(query.sub('scoreboard', week=w)) for w in group], api='league',
+                                pool=pool, final=final)
+            by_week.update(zip(group, contents))
+    return [by_week[w] for w in weeks]
+
+
+def batch(queries, final=None, workers=4):
+    """
+    Fetch many queries in as few requests as possible
+
+    Queries against the same resource are folded together with ;out= and
+    queries that only differ by key are sent as one keyed collection. The
+    combined responses are split back out per query. When that still takes
+    several requests they go out concurrently, as in get_many.
+
+    :param queries: list of yquery.Query or uri strings
+    :param final: function of a response, True if it can never change (see ycache)
+    :return: list of raw data, in the same order as queries
+    """
+    requests = yquery.plan(queries)
+    if len(requests) == 1:
+        contents = [get(raw_uri=str(requests[0]), raw_data=True, api=requests[0].api, final=final)]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, get, raw_uri=str(request), raw_data=True,
+                                       api=request.api, final=final) for request in requests]
+            contents = [f.result() for f in futures]
+    return yquery.assemble(requests, contents, len(queries))
+
+
 # ------------------------------------------------- #
 #                    Named Classes                  #
 # ------------------------------------------------- #
@@ -172,21 +331,73 @@ class League(YResource):
 
     @property
     def uri_prefix(self):
-        return self.__class__.__name__.lower() + '/' + self.league_key
+        return str(self.query)
+
+    @property
+    def query(self):
+        return yquery.Query(self.__class__.__name__.lower(), self.league_key)
 
     @property
     def trades(self):
-        uri = self.uri_prefix + '/transactions;type=trade'
-        return get(raw_uri=uri, raw_data=True)
+        uri = self.query.sub('transactions', type='trade')
+        return get(raw_uri=str(uri), raw_data=True)
+
+    def transactions(self, types='add,drop,trade'):
+        uri = self.query.sub('transactions', types=types)
+        return get(raw_uri=str(uri), raw_data=True)
+
+    def players(self, start=0, count=25, keys=None, out='ownership'):
+        # Yahoo pages the players collection 25 at a time
+        if keys:
+            uri = self.query.sub('players', player_keys=list(keys), out=out)
+        else:
+            uri = self.query.sub('players', start=start, count=count, out=out)
+        return get(raw_uri=str(uri), raw_data=True)
+
+    @property
+    def settings(self):
+        uri = self.query.sub('settings')
+        return get(raw_uri=str(uri), raw_data=True)
 
     @property
     def standings(self):
-        uri = 'league/%s/standings' % self.league_key
-        return get(raw_uri=uri, raw_data=True)
+        uri = self.query.sub('standings')
+        return get(raw_uri=str(uri), raw_data=True)
 
     def scoreboard(self, week):
-        uri = self.uri_prefix + '/scoreboard;week=%s' % str(week)
-        return get(raw_uri=uri, raw_data=True)
+        uri = self.query.sub('scoreboard', week=week)
+        final = (lambda content: True) if settled(week, self._current_week) else None
+        return get(raw_uri=str(uri), raw_data=True, final=final)
+
+    def scoreboards(self, weeks, pool=None):
+        return scoreboards(self.league_key, weeks, self._current_week, pool=pool)
+
+    @property
+    def _current_week(self):
+        # None once the season is over, see settled
+        return None if self.is_finished == '1' else self.current_week
+
+    def team_rosters(self, team_keys, week=None, stats=False):
+        """
+        Rosters for several teams in a single request
+
+        :param team_keys: list of team keys
+        :param week: roster (and stats) for this week; current if None
+        :param stats: include each player's stats
+        :return: list of Team with roster populated
+        """
+        queries = []
+        for key in team_keys:
+            query = yquery.Query('team', key).sub('roster', week=week).sub('players')
+            if stats:
+                query = query.sub('stats', type='week' if week else None, week=week)
+            queries.append(query)
+        teams = []
+        for team_json in batch(queries):
+            team = Team(json=team_json)
+            team.league = self
+            teams.append(team)
+        return teams
 
     @property
     def _teams(self):
@@ -203,25 +414,28 @@ class League(YResource):
             if email == team.json['managers']['manager']['email']:
                 return team
             all_emails.append(team.json['managers']['manager']['email'])
-        print(email + ' not found in ' + str(all_emails))
+        logger.warning('%s not found in %s', email, all_emails)
 
 
 class Team(YResource):
 
     @property
     def uri_prefix(self):
-        return self.__class__.__name__.lower() + '/' + self.team_key
+        return str(self.query)
+
+    @property
+    def query(self):
+        return yquery.Query(self.__class__.__name__.lower(), self.team_key)
 
     @property
     def roster(self):
-        uri = self.uri_prefix + '/roster/players'
-        return get(raw_uri=uri, nest_map='team')
+        uri = self.query.sub('roster').sub('players')
+        return get(raw_uri=str(uri), nest_map='team')
 
     def matchups(self, weeks=[]):
         for week in weeks:
             if not 1 <= week <= int(self.league.end_week):
                 e = 'Matchup weeks must be between 1 and %s! (%d)'
                 raise YahooResourceUnavailableException(e % (self.end_week, week))
-        _weeks = ','.join([str(w) for w in weeks])
-        uri = self.uri_prefix + '/matchups;weeks=' + _weeks
-        return get(raw_uri=uri, raw_data=True)
+        uri = self.query.sub('matchups', weeks=list(weeks))
+        return get(raw_uri=str(uri), raw_data=True)
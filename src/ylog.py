@@ -0,0 +1,138 @@
+# Logging
+#
+# Logging calls only put the record on a bounded queue; a listener thread
+# formats and writes it, so no command or event loop ever waits on a
+# terminal or disk. When the writer falls behind records are dropped and
+# counted rather than queued without end.
+#
+# Records carry structured fields, written as key=value after the message:
+#
+#   ylog.event(logger, 'fetch', uri='league/{key}/scoreboard;week={}', bytes=5120, ms=182.0)
+#
+# Response bodies are only logged at DEBUG, or for a sampled fraction of
+# requests (FFBOT_LOG_SAMPLE), so log volume does not grow with traffic.
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+
+LEVEL = os.environ.get('FFBOT_LOG_LEVEL') or 'INFO'
+# Fraction of response bodies logged at INFO
+PAYLOAD_SAMPLE = float(os.environ.get('FFBOT_LOG_SAMPLE') or 0)
+# Longest body logged, in characters
+PAYLOAD_LIMIT = 20000
+QUEUE_SIZE = 10000
+FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_listener = None
+_handler = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Standard format followed by the record's fields as key=value
+    """
+    def format(self, record):
+        line = super(StructuredFormatter, self).format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join('%s=%s' % (k, _value(v)) for k, v in fields.items())
+        return line
+
+
+def _value(value):
+    if isinstance(value, float):
+        return '%.1f' % value
+    value = str(value)
+    # Quoted only when it would not read back as one token
+    return json.dumps(value) if not value or any(c in value for c in ' ="\n') else value
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records without ever blocking; counts what did not fit
+    """
+    def __init__(self, q):
+        super(DroppingQueueHandler, self).__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup(level=LEVEL, stream=None):
+    """
+    Send every logger's records through the queue to stream; safe to call
+    more than once, later calls only change the level
+
+    :param level: minimum level logged
+    :param stream: where records are written; stderr if None
+    """
+    global _listener, _handler
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(StructuredFormatter(FORMAT, DATE_FORMAT))
+    q = queue.Queue(QUEUE_SIZE)
+    _handler = DroppingQueueHandler(q)
+    root.handlers[:] = [_handler]
+    _listener = logging.handlers.QueueListener(q, writer)
+    _listener.start()
+    atexit.register(stop)
+
+
+def stop():
+    """
+    Write out whatever is still queued
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped():
+    """
+    :return: records dropped because the queue was full
+    """
+    return _handler.dropped if _handler is not None else 0
+
+
+def event(logger, message, level=logging.INFO, **fields):
+    """
+    Log a message with structured fields
+
+    :param logger: logging.Logger
+    :param message: what happened, a short fixed string
+    :param fields: details, written as key=value
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={'fields': fields})
+
+
+def payload(logger, uri, text):
+    """
+    Log a response body at DEBUG, or at INFO for a sampled fraction of them
+
+    :param uri: what the body is a response to
+    :param text: the body
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        level = logging.DEBUG
+    elif PAYLOAD_SAMPLE and random.random() < PAYLOAD_SAMPLE and logger.isEnabledFor(logging.INFO):
+        level = logging.INFO
+    else:
+        return
+    event(logger, 'payload', level, uri=uri, bytes=len(text), body=text[:PAYLOAD_LIMIT])
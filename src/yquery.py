@@ -0,0 +1,356 @@
+# Query builder for Yahoo Fantasy
+#
+# Yahoo URIs are a chain of resources and collections, each optionally
+# carrying ;key=value filters, e.g.
+#
+#   teams;team_keys=a,b/roster/players/stats;type=week;week=5
+#
+# Queries are built from segments instead of string concatenation, which
+# lets `plan` combine many small queries into the fewest requests:
+#
+#  - sibling sub-resources of one resource become `;out=a,b`
+#  - the same query against several keys becomes one keyed collection
+#
+# `Request.split` undoes the merge so every query gets back the json it
+# would have received had it been sent on its own.
+
+import collections
+
+
+# Resources addressed as <name>/<key>; their collections are <name>s with a
+# <name>_keys filter
+RESOURCES = ('game', 'league', 'team', 'player', 'transaction')
+# Yahoo will not accept more keys than this in a single filter
+MAX_KEYS = 25
+
+
+def _as_list(item):
+    # xmltodict collapses single element lists into a dict
+    if item is None:
+        return []
+    if not isinstance(item, list):
+        return [item]
+    return item
+
+
+class Segment(object):
+    """
+    One piece of a URI: a resource (with key), a collection or sub-resource
+    """
+    def __init__(self, name, key=None, **params):
+        self.name = name
+        self.key = key
+        self.params = collections.OrderedDict(
+            (k, ','.join(str(i) for i in v) if isinstance(v, (list, tuple)) else str(v))
+            for k, v in params.items() if v is not None
+        )
+
+    def __str__(self):
+        uri = self.name
+        if self.key:
+            uri += '/' + self.key
+        for k, v in self.params.items():
+            uri += ';%s=%s' % (k, v)
+        return uri
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    @property
+    def singular(self):
+        return self.name[:-1] if self.name.endswith('s') else self.name
+
+    @property
+    def keys_param(self):
+        return self.singular + '_keys'
+
+    def keys(self):
+        """
+        Keys this segment addresses, either as a resource or collection filter
+
+        :return: list of keys or None if segment is not keyed
+        """
+        if self.key:
+            return [self.key]
+        if self.keys_param in self.params:
+            return self.params[self.keys_param].split(',')
+        return None
+
+    def with_keys(self, keys):
+        # Always in collection form, which is the only way to ask for many
+        params = collections.OrderedDict([(self.singular + '_keys', list(keys))])
+        params.update((k, v) for k, v in self.params.items() if k != self.keys_param)
+        return Segment(self.singular + 's', **params)
+
+    def with_out(self, names):
+        params = collections.OrderedDict((k, v) for k, v in self.params.items() if k != 'out')
+        params['out'] = sorted(names)
+        return Segment(self.name, self.key, **params)
+
+
+class Query(object):
+    """
+    Immutable chain of segments
+
+    Query('team', 'nfl.l.1.t.1').sub('roster').sub('players')
+    """
+    def __init__(self, resource=None, key=None, segments=None, **params):
+        if segments is None:
+            segments = [Segment(resource, key, **params)]
+        self.segments = list(segments)
+
+    def __str__(self):
+        return '/'.join(str(s) for s in self.segments)
+
+    def __repr__(self):
+        return '<Query: %s>' % self
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+    @property
+    def api(self):
+        return self.segments[0].name
+
+    def sub(self, name, key=None, **params):
+        """
+        Append a sub-resource or collection
+
+        :param name: resource name, i.e. roster
+        :param key: key if name is a resource
+        :param params: filters, i.e. type='week', week=5
+        :return: new Query
+        """
+        return Query(segments=self.segments + [Segment(name, key, **params)])
+
+    def out(self, *names):
+        """
+        Ask for sub-resources alongside the final segment
+
+        :param names: sub-resource names, i.e. 'settings', 'standings'
+        :return: new Query
+        """
+        return Query(segments=self.segments[:-1] + [self.segments[-1].with_out(names)])
+
+    @classmethod
+    def parse(cls, uri):
+        """
+        Build a Query from a uri string
+
+        :param uri: i.e. league/nfl.l.1/players;start=0;count=25
+        :return: Query
+        """
+        segments = []
+        parts = uri.strip('/').split('/')
+        while parts:
+            name, _, rest = parts.pop(0).partition(';')
+            params = collections.OrderedDict(p.split('=', 1) for p in rest.split(';') if p)
+            key = None
+            if name in RESOURCES and not params and parts:
+                # The key carries the resource's filters, i.e. league/<key>;out=settings
+                key, _, rest = parts.pop(0).partition(';')
+                params = collections.OrderedDict(p.split('=', 1) for p in rest.split(';') if p)
+            segments.append(Segment(name, key, **params))
+        return cls(segments=segments)
+
+
+class Request(object):
+    """
+    A single Yahoo request serving one or more queries
+
+    `parts` holds (query index, keys, as resource) for each query served.
+    Keys is None unless the query was folded into the keyed segment at
+    `merge_index`; as resource is set when a top level <name>/<key> was
+    turned into a collection and the query expects the bare resource back.
+    """
+    def __init__(self, segments, parts, merge_index=None):
+        self.segments = segments
+        self.parts = parts
+        self.merge_index = merge_index
+
+    def __str__(self):
+        return '/'.join(str(s) for s in self.segments)
+
+    @property
+    def api(self):
+        return self.segments[0].name
+
+    def split(self, content):
+        """
+        Split a combined response back into per query results
+
+        :param content: json under fantasy_content[api] for this request
+        :return: list of (query index, json)
+        """
+        if self.merge_index is None:
+            return [(index, content) for index, _, _ in self.parts]
+        return [(index, self._narrow(content, keys, as_resource)) for index, keys, as_resource in self.parts]
+
+    def _narrow(self, content, keys, as_resource):
+        seg = self.segments[self.merge_index]
+        match = lambda item: item.get(seg.singular + '_key') in keys
+        if self.merge_index == 0:
+            items = [i for i in _as_list(content.get(seg.singular)) if match(i)]
+            if as_resource:
+                return items[0] if items else {}
+            return self._collection(content, items)
+        # Copy the path down to the merged collection and filter it
+        node = root = dict(content)
+        for parent in self.segments[1:self.merge_index]:
+            node[parent.name] = dict(node[parent.name])
+            node = node[parent.name]
+        collection = node.get(seg.name) or {}
+        items = [i for i in _as_list(collection.get(seg.singular)) if match(i)]
+        node[seg.name] = self._collection(collection, items)
+        return root
+
+    def join(self, first, other):
+        """
+        Add a later chunk of a query that was split over several requests
+
+        :param first: what split gave for the query so far
+        :param other: what split gave for it from this request
+        :return: json with the keyed items of both
+        """
+        seg = self.segments[self.merge_index]
+        if self.merge_index == 0:
+            return self._collection(first, _as_list(first.get(seg.singular)) + _as_list(other.get(seg.singular)))
+        # split copied the path down to the collection, so it can be changed in place
+        node, theirs = first, other
+        for parent in self.segments[1:self.merge_index]:
+            node, theirs = node[parent.name], theirs[parent.name]
+        items = _as_list(node[seg.name].get(seg.singular)) + _as_list(theirs[seg.name].get(seg.singular))
+        node[seg.name] = self._collection(node[seg.name], items)
+        return first
+
+    def _collection(self, collection, items):
+        seg = self.segments[self.merge_index]
+        collection = dict(collection)
+        collection['@count'] = str(len(items))
+        collection[seg.singular] = items[0] if len(items) == 1 else items
+        return collection
+
+
+def _merge_out(queries):
+    # Fold queries that differ only by a trailing, unfiltered sub-resource
+    # of a keyed resource into one query with ;out=
+    groups = collections.OrderedDict()
+    for index, query in enumerate(queries):
+        *prefix, leaf = query.segments
+        if prefix and prefix[-1].key and not leaf.key and not leaf.params:
+            group = groups.setdefault(('out', tuple(prefix)), [])
+        else:
+            group = groups.setdefault(('as is', index), [])
+        group.append((index, query))
+    merged = []
+    for (kind, prefix), members in groups.items():
+        if kind == 'out' and len(members) > 1:
+            names = sorted({q.segments[-1].name for _, q in members})
+            prefix = list(prefix)
+            query = Query(segments=prefix[:-1] + [prefix[-1].with_out(names)])
+            merged.append(([i for i, _ in members], query))
+        else:
+            merged.extend(([i], q) for i, q in members)
+    return merged
+
+
+def _key_position(query):
+    # Segment whose keys can be merged: a keyed collection reached only
+    # through single resources, otherwise the top level resource
+    position = None
+    for i, seg in enumerate(query.segments):
+        if seg.keys() and (i == 0 or seg.keys_param in seg.params):
+            position = i
+        if not seg.key:
+            break
+    return position
+
+
+def _merge_keys(merged):
+    # Fold queries that are identical apart from the keys of one segment
+    # into keyed collection requests of up to MAX_KEYS
+    groups = collections.OrderedDict()
+    for indexes, query in merged:
+        position = _key_position(query)
+        if position is None:
+            groups[('as is', id(query))] = (None, [(indexes, query)])
+            continue
+        segments = list(query.segments)
+        segments[position] = segments[position].with_keys([])
+        signature = (position, tuple(str(s) for s in segments))
+        groups.setdefault(signature, (position, []))[1].append((indexes, query))
+    requests = []
+    for position, members in groups.values():
+        if position is None or (len(members) == 1 and len(members[0][1].segments[position].keys()) <= MAX_KEYS):
+            indexes, query = members[0]
+            requests.append(Request(query.segments, [(i, None, False) for i in indexes]))
+            continue
+        keys = []
+        for _, query in members:
+            keys.extend(k for k in query.segments[position].keys() if k not in keys)
+        for start in range(0, len(keys), MAX_KEYS):
+            chunk = keys[start:start + MAX_KEYS]
+            segments = list(members[0][1].segments)
+            segments[position] = segments[position].with_keys(chunk)
+            parts = []
+            for indexes, query in members:
+                wanted = [k for k in query.segments[position].keys() if k in chunk]
+                as_resource = position == 0 and bool(query.segments[0].key)
+                parts.extend((i, wanted, as_resource) for i in indexes if wanted)
+            requests.append(Request(segments, parts, merge_index=position))
+    return requests
+
+
+def assemble(requests, contents, count):
+    """
+    Per query results from the responses to planned requests; queries with
+    more keys than one request takes get their chunks joined back together
+
+    :param requests: list of Request from plan
+    :param contents: json of each request's response, in the same order
+    :param count: number of queries planned
+    :return: list of json, in query order
+    """
+    results = [None] * count
+    for request, content in zip(requests, contents):
+        for index, data in request.split(content):
+            results[index] = data if results[index] is None else request.join(results[index], data)
+    return results
+
+
+# Parameters whose values change what a response holds, kept in templates
+SHAPE_PARAMS = ('out', 'type')
+
+
+def template(uri):
+    """
+    The shape of a uri with its keys and filter values blanked out, to group
+    requests by, i.e. league/{key}/scoreboard;week={}
+
+    :param uri: Query or uri string
+    :return: str
+    """
+    query = uri if isinstance(uri, Query) else Query.parse(uri)
+    parts = []
+    for segment in query.segments:
+        part = segment.name + ('/{key}' if segment.key else '')
+        part += ''.join(';%s=%s' % (k, v if k in SHAPE_PARAMS else '{}') for k, v in segment.params.items())
+        parts.append(part)
+    return '/'.join(parts)
+
+
+def plan(queries):
+    """
+    Combine queries into as few requests as possible
+
+    :param queries: list of Query or uri strings
+    :return: list of Request
+    """
+    queries = [q if isinstance(q, Query) else Query.parse(q) for q in queries]
+    return _merge_keys(_merge_out(queries))
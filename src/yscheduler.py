@@ -0,0 +1,196 @@
+# Priority aware request scheduler for the Yahoo client
+#
+# Every upstream call takes a slot from the scheduler before it is sent.
+# Slots are handed out strictly by priority class, then earliest deadline:
+#
+#   interactive > live > background
+#
+# Each class has its own concurrency limit under a shared global limit,
+# and background work is capped low enough that it can never occupy every
+# slot, so a user's command is at most one slot wait away from being sent
+# even while a sync cron is running. Each request's deadline starts when it
+# is queued; requests still waiting for a slot when it passes are dropped
+# instead of being sent late.
+#
+# The class and timeout of a request come from the caller's context:
+#
+#   with yscheduler.priority('background'):
+#       league.scoreboard(5)
+
+import collections
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+
+import ytrace
+
+
+CLASSES = ('interactive', 'live', 'background')
+# Default per class concurrency and deadline (seconds a request may wait for a slot)
+LIMITS = {'interactive': 4, 'live': 2, 'background': 1}
+DEADLINES = {'interactive': 10.0, 'live': 30.0, 'background': 300.0}
+MAX_CONCURRENCY = 4
+
+_context = contextvars.ContextVar('yscheduler_priority', default=('interactive', None))
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def priority(klass, timeout=None):
+    """
+    Run upstream calls made inside the block under a priority class
+
+    :param klass: interactive, live or background
+    :param timeout: seconds each call may wait for a slot once queued; class default if None
+    """
+    assert klass in CLASSES, 'Unknown priority class %s' % klass
+    token = _context.set((klass, timeout))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current():
+    """
+    :return: (class, absolute deadline) for a request the calling context queues now
+    """
+    klass, timeout = _context.get()
+    return klass, time.time() + (timeout if timeout is not None else DEADLINES[klass])
+
+
+class _ClassStats(object):
+    samples = 1000
+
+    def __init__(self):
+        self.requests = 0
+        self.expired = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.waits = collections.deque(maxlen=self.samples)
+
+    def record(self, wait):
+        self.requests += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.waits.append(wait)
+
+    def summary(self):
+        waits = sorted(self.waits)
+        pct = lambda p: waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+        return {
+            'requests': self.requests,
+            'expired': self.expired,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'mean_wait': self.total_wait / self.requests if self.requests else 0.0,
+            'p50_wait': pct(0.5),
+            'p99_wait': pct(0.99),
+            'max_wait': self.max_wait,
+        }
+
+
+class RequestScheduler(object):
+    """
+    Hands out upstream request slots by priority class and deadline
+
+    Callers run their own request once granted a slot; there are no worker
+    threads, so a request that is never queued behind anything costs one
+    lock round trip.
+    """
+    def __init__(self, limits=None, max_concurrency=MAX_CONCURRENCY):
+        self.limits = dict(LIMITS, **(limits or {}))
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._queues = {k: [] for k in CLASSES}
+        self._granted = set()
+        self._seq = itertools.count()
+        self._stats = {k: _ClassStats() for k in CLASSES}
+
+    def _in_flight(self):
+        return sum(s.in_flight for s in self._stats.values())
+
+    def _dispatch(self):
+        # Grant slots to the most important waiting tickets while there is
+        # room, then wake waiters so the granted ones can proceed
+        self._cond.notify_all()
+        while self._in_flight() < self.max_concurrency:
+            for klass in CLASSES:
+                queue = self._queues[klass]
+                if queue and self._stats[klass].in_flight < self.limits[klass]:
+                    ticket = heapq.heappop(queue)
+                    self._granted.add(ticket[1])
+                    self._stats[klass].waiting -= 1
+                    self._stats[klass].in_flight += 1
+                    break
+            else:
+                return
+
+    @contextlib.contextmanager
+    def slot(self, klass=None, deadline=None):
+        """
+        Hold an upstream request slot for the duration of the block
+
+        :param klass: priority class; taken from context if None
+        :param deadline: absolute time the slot must be granted by
+        """
+        if klass is None:
+            klass, context_deadline = current()
+            deadline = deadline or context_deadline
+        deadline = deadline or time.time() + DEADLINES[klass]
+        stats = self._stats[klass]
+        queued = time.time()
+        with self._cond:
+            seq = next(self._seq)
+            heapq.heappush(self._queues[klass], (deadline, seq))
+            stats.waiting += 1
+            self._dispatch()
+            while seq not in self._granted:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._queues[klass].remove((deadline, seq))
+                    heapq.heapify(self._queues[klass])
+                    stats.waiting -= 1
+                    stats.expired += 1
+                    raise DeadlineExceeded('%s request queued %.2fs past its deadline'
+                                           % (klass, time.time() - queued))
+                self._cond.wait(remaining)
+            self._granted.discard(seq)
+            stats.record(time.time() - queued)
+        ytrace.annotate(queued=time.time() - queued)
+        try:
+            yield
+        finally:
+            with self._cond:
+                stats.in_flight -= 1
+                self._dispatch()
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Run fn once a slot for the calling context's priority is free
+
+        :return: whatever fn returns
+        """
+        with self.slot():
+            return fn(*args, **kwargs)
+
+    def stats(self):
+        """
+        Queue wait metrics per priority class
+
+        :return: dict of class -> dict of metrics
+        """
+        with self._cond:
+            return {k: self._stats[k].summary() for k in CLASSES}
+
+
+# Shared by everything that talks to an upstream API
+SCHEDULER = RequestScheduler()
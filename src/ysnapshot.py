@@ -0,0 +1,195 @@
+# Versioned binary snapshots of json-like documents
+#
+# A snapshot splits a document into sections: each key named as a section
+# gets one of its own, everything else shares the root section. The layout,
+# integers little endian:
+#
+#   'FFBS' | version u16 | marshal version u16 | python major u8 | minor u8
+#   section count u16 | meta length u32 | meta (utf-8 json)
+#   per section: name (16 bytes utf-8, null padded) | offset u64 | length u64 | crc32 u32
+#   the sections, each marshal encoded
+#
+# Readers memory map the file, read the index and decode a section only
+# when one of its keys is used, so looking up the league key never pays for
+# decoding every team. Writers replace the file atomically; a reader keeps
+# the version it mapped until it loads again.
+#
+# marshal's format is only promised to one Python version, so a snapshot
+# written by another (or damaged on disk) fails to open with SnapshotError
+# and has to be written again. meta is plain json and stays readable, for
+# whatever is needed to do that.
+#
+#   ysnapshot.write(path, league, sections=('settings', 'teams'), meta={'league_id': 1})
+#   ysnapshot.load(path)['teams']
+
+import collections.abc
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+
+
+MAGIC = b'FFBS'
+VERSION = 2
+_PREFIX = struct.Struct('<4sH')
+_HEADER = struct.Struct('<4sHHBBHI')
+_ENTRY = struct.Struct('<16sQQI')
+# Section holding the keys without a section of their own
+ROOT = ''
+
+# path -> (file identity, Snapshot) of snapshots already mapped
+_LOADED = {}
+_lock = threading.Lock()
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def write(path, document, sections=(), meta=None):
+    """
+    Save a document, replacing any snapshot at path atomically
+
+    :param path: file to write
+    :param document: dict of json-like values (dicts, lists, str, numbers, bool, None)
+    :param sections: keys of document stored (and loaded) on their own
+    :param meta: small json-able dict readable by any version (see read_meta)
+    """
+    sections = [name for name in sections if name in document]
+    root = {k: v for k, v in document.items() if k not in sections}
+    parts = [(ROOT, marshal.dumps(root))] + [(name, marshal.dumps(document[name])) for name in sections]
+    meta = json.dumps(meta or {}, separators=(',', ':')).encode('utf-8')
+    offset = _HEADER.size + len(meta) + _ENTRY.size * len(parts)
+    index = []
+    for name, data in parts:
+        encoded = name.encode('utf-8')
+        assert len(encoded) <= 16, 'Section name %r is too long' % name
+        index.append(_ENTRY.pack(encoded, offset, len(data), zlib.crc32(data)))
+        offset += len(data)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, marshal.version, sys.version_info[0], sys.version_info[1],
+                             len(parts), len(meta)))
+        f.write(meta)
+        f.write(b''.join(index))
+        for _, data in parts:
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Snapshot(collections.abc.Mapping):
+    """
+    Read only view of a saved document that decodes sections on first use
+
+    :param path: snapshot file
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise SnapshotError('%s is not a snapshot' % path)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        count, self.meta, start = _read_header(path, self._map, size)
+        marshal_version, major, minor = _HEADER.unpack_from(self._map, 0)[2:5]
+        if (marshal_version, major, minor) != (marshal.version,) + tuple(sys.version_info[:2]):
+            raise SnapshotError('%s was written by Python %d.%d (marshal %d), not this one'
+                                % (path, major, minor, marshal_version))
+        if start + count * _ENTRY.size > size:
+            raise SnapshotError('%s is truncated' % path)
+        self.index = collections.OrderedDict()
+        for i in range(count):
+            name, offset, length, crc = _ENTRY.unpack_from(self._map, start + i * _ENTRY.size)
+            if offset + length > size:
+                raise SnapshotError('%s is truncated' % path)
+            # Checked once per mapping, so a damaged file fails here and
+            # not halfway through whoever uses it
+            if zlib.crc32(self._map[offset:offset + length]) != crc:
+                raise SnapshotError('%s is damaged' % path)
+            self.index[name.rstrip(b'\0').decode('utf-8')] = (offset, length)
+        self._sections = {}
+
+    def section(self, name):
+        """
+        :return: the decoded section
+        :raises SnapshotError: if it does not decode
+        """
+        if name not in self._sections:
+            offset, length = self.index[name]
+            try:
+                self._sections[name] = marshal.loads(self._map[offset:offset + length])
+            except (EOFError, ValueError, TypeError) as e:
+                raise SnapshotError('Section %r does not decode: %s' % (name, e))
+        return self._sections[name]
+
+    def __getitem__(self, key):
+        if key != ROOT and key in self.index:
+            return self.section(key)
+        return self.section(ROOT)[key]
+
+    def __iter__(self):
+        yield from self.section(ROOT)
+        yield from (name for name in self.index if name != ROOT)
+
+    def __len__(self):
+        return len(self.section(ROOT)) + len(self.index) - 1
+
+    def decoded(self):
+        """
+        :return: names of the sections decoded so far
+        """
+        return sorted(self._sections)
+
+
+def _read_header(path, data, size):
+    # :return: (section count, meta, offset of the index)
+    magic, version = _PREFIX.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise SnapshotError('%s is not a snapshot' % path)
+    if version != VERSION:
+        raise SnapshotError('%s is snapshot version %d, this reads %d' % (path, version, VERSION))
+    count, length = _HEADER.unpack_from(data, 0)[-2:]
+    if _HEADER.size + length > size:
+        raise SnapshotError('%s is truncated' % path)
+    try:
+        meta = json.loads(bytes(data[_HEADER.size:_HEADER.size + length]).decode('utf-8'))
+    except ValueError:
+        raise SnapshotError('%s is damaged' % path)
+    return count, meta, _HEADER.size + length
+
+
+def read_meta(path):
+    """
+    meta saved with a snapshot, readable whichever Python wrote it
+
+    :raises FileNotFoundError: if there is no snapshot
+    :raises SnapshotError: if the file is not a snapshot of this format
+    """
+    with open(path, 'rb') as f:
+        head = f.read(_HEADER.size)
+        if len(head) < _HEADER.size:
+            raise SnapshotError('%s is not a snapshot' % path)
+        length = _HEADER.unpack(head)[-1] if _PREFIX.unpack_from(head) == (MAGIC, VERSION) else 0
+        data = head + f.read(length)
+    return _read_header(path, data, len(data))[1]
+
+
+def load(path):
+    """
+    Snapshot at path, mapped once per version of the file
+
+    :raises FileNotFoundError: if there is no snapshot
+    :raises SnapshotError: if the file is not a snapshot this version can read
+    """
+    stat = os.stat(path)
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        loaded = _LOADED.get(path)
+        if loaded is None or loaded[0] != identity:
+            loaded = _LOADED[path] = (identity, Snapshot(path))
+        return loaded[1]
@@ -0,0 +1,191 @@
+# Request tracing and stack sampling
+#
+# A trace is the tree of spans a command makes on its way through the bot:
+#
+#   command -> run -> yahoo.get -> http (queue wait noted) -> xml -> send
+#
+# Spans find their parent through a context variable, so nesting follows
+# the code wherever it runs as long as the context is carried along (tasks
+# copy it themselves; thread pools need contextvars.copy_context().run).
+# Finished spans go into a fixed size ring buffer, so tracing is always on
+# and costs a few microseconds per span.
+#
+#   with ytrace.span('http', uri=uri):
+#       ...
+#
+# The Sampler is for when spans are not enough: it walks the stack of every
+# thread every few milliseconds and counts them in the collapsed format
+# flamegraph.pl and speedscope read ("frame;frame;frame count").
+
+import collections
+import contextlib
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+
+
+# Finished spans kept, across all traces
+BUFFER_SIZE = 20000
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+_current = contextvars.ContextVar('ytrace_span', default=None)
+_ids = itertools.count(1)
+_SPANS = collections.deque(maxlen=BUFFER_SIZE)
+
+
+class Span(object):
+    __slots__ = ('id', 'parent', 'trace', 'name', 'attrs', 'start', 'duration')
+
+    def __init__(self, name, parent, attrs):
+        self.id = next(_ids)
+        self.parent = parent.id if parent else None
+        self.trace = parent.trace if parent else self.id
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.duration = None
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """
+    Time the block as a child of the calling context's span
+
+    :param name: what the block does
+    :param attrs: details shown with the span
+    :return: the Span (attrs can be added while it runs)
+    """
+    s = Span(name, _current.get(), attrs)
+    token = _current.set(s)
+    start = time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.duration = time.perf_counter() - start
+        _current.reset(token)
+        _SPANS.append(s)
+
+
+def annotate(**attrs):
+    """
+    Add details to the calling context's span, if there is one
+    """
+    s = _current.get()
+    if s is not None:
+        s.attrs.update(attrs)
+
+
+def recent(count=5, name=None, slower_than=0.0):
+    """
+    Most recent finished traces
+
+    :param count: number of traces
+    :param name: only traces whose root span has this name
+    :param slower_than: only traces taking longer than this many seconds
+    :return: list of (root span, dict of span id -> child spans), newest first
+    """
+    spans = list(_SPANS)
+    children = collections.defaultdict(list)
+    roots = []
+    for s in spans:
+        if s.parent is None:
+            if (name is None or s.name == name) and s.duration > slower_than:
+                roots.append(s)
+        else:
+            children[s.parent].append(s)
+    for kids in children.values():
+        kids.sort(key=lambda s: s.start)
+    return [(root, children) for root in roots[::-1][:count]]
+
+
+def _describe(s):
+    attrs = ' '.join('%s=%s' % (k, _short(v)) for k, v in s.attrs.items())
+    return '%s %s' % (s.name, attrs) if attrs else s.name
+
+
+def _short(value, limit=48):
+    value = '%.3fs' % value if isinstance(value, float) else str(value)
+    return value if len(value) <= limit else '...' + value[-(limit - 3):]
+
+
+def format_trace(root, children):
+    """
+    :return: list of lines, one per span, indented by depth with its time and
+        the time spent in the span itself (outside its children)
+    """
+    lines = []
+
+    def walk(s, depth):
+        kids = children.get(s.id, [])
+        own = s.duration - sum(k.duration for k in kids)
+        lines.append('%7.1fms %7.1fms  %s%s' % (1000 * s.duration, 1000 * max(own, 0.0), '  ' * depth,
+                                               _describe(s)))
+        for k in kids:
+            walk(k, depth + 1)
+    walk(root, 0)
+    return lines
+
+
+#
+# Sampling profiler
+#
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class Sampler(object):
+    """
+    Counts the stacks of every thread at a fixed interval, from a thread
+    of its own, so nothing being profiled pays for it beyond the GIL the
+    sampler briefly holds
+
+    :param interval: seconds between samples
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ytrace-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        # Thread names are looked up again only when a new thread shows up
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, 'thread-%d' % ident))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """
+        :return: the samples as collapsed stacks, one "frame;frame count" per line
+        """
+        return ''.join('%s %d\n' % (stack, count) for stack, count in self.stacks.most_common())
+
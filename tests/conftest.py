@@ -1,11 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-    Dummy conftest.py for ffbot.
+    conftest.py for ffbot.
 
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    https://pytest.org/latest/plugins.html
+    The bot's modules import each other by bare name (they run from
+    src/ffbot), and the upstream modules sit flat in src, so both go on
+    the path the way they are when the bot runs.
 """
 
-# import pytest
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path[:0] = [SRC, os.path.join(SRC, 'ffbot')]
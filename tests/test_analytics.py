@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import numpy as np
+import pytest
+
+import analytics
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+def season(seed, teams=8, weeks=6):
+    """
+    Random season with ties, byes and an unplayed final week
+    """
+    rng = random.Random(seed)
+    scores = np.full((teams, weeks), np.nan)
+    opponents = np.full((teams, weeks), -1)
+    for w in range(weeks - 1):
+        order = list(range(teams))
+        rng.shuffle(order)
+        # Last team in an odd count (and sometimes one pair) sits out
+        for home, away in zip(order[::2], order[1::2]):
+            scores[home, w], scores[away, w] = rng.randint(80, 90), rng.randint(80, 90)
+            opponents[home, w], opponents[away, w] = away, home
+        if teams % 2:
+            scores[order[-1], w] = rng.randint(80, 90)
+    return analytics.SeasonMatrix(range(teams), ['Team %d' % t for t in range(teams)], list(range(1, weeks + 1)),
+                                  scores, opponents)
+
+
+def brute_all_play(m):
+    record = np.zeros((len(m), 3))
+    for w in range(len(m.weeks)):
+        for t in range(len(m)):
+            for o in range(len(m)):
+                a, b = m.scores[t, w], m.scores[o, w]
+                if t == o or np.isnan(a) or np.isnan(b):
+                    continue
+                record[t, 0 if a > b else 1 if a < b else 2] += 1
+    return record
+
+
+def brute_luck(m):
+    luck = np.zeros(len(m))
+    for w in range(len(m.weeks)):
+        played = [t for t in range(len(m)) if not np.isnan(m.scores[t, w])]
+        for t in played:
+            others = [m.scores[o, w] for o in played if o != t]
+            expected = sum(1.0 if m.scores[t, w] > s else 0.5 if m.scores[t, w] == s else 0.0 for s in others)
+            luck[t] -= expected / len(others)
+            opp = m.opponents[t, w]
+            if opp >= 0:
+                a, b = m.scores[t, w], m.scores[opp, w]
+                luck[t] += 1.0 if a > b else 0.5 if a == b else 0.0
+    return luck
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('teams', [2, 7, 10])
+def test_all_play(seed, teams):
+    m = season(seed, teams)
+    assert np.array_equal(np.column_stack(m.all_play()), brute_all_play(m))
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('teams', [2, 7, 10])
+def test_luck(seed, teams):
+    m = season(seed, teams)
+    assert np.allclose(m.luck(), brute_luck(m))
+
+
+def test_empty_season():
+    m = analytics.SeasonMatrix([], [], [], np.zeros((0, 0)), np.zeros((0, 0)))
+    assert [len(x) for x in m.all_play()] == [0, 0, 0]
+    assert m.awards() == []
+
+
+def test_awards():
+    # 0 beats 1 and 2 beats 3 in week 1; 2 beats 0 and 3 beats 1 by a point in week 2
+    scores = [[100, 60], [90, 95], [80, 110], [70, 96]]
+    opponents = [[1, 2], [0, 3], [3, 0], [2, 1]]
+    m = analytics.SeasonMatrix('abcd', 'ABCD', [1, 2], scores, opponents)
+    awards = dict((a.title, (a.team, pytest.approx(a.value), a.week)) for a in m.awards())
+    assert awards == {
+        'Most points': (2, 190, None),
+        'Fewest points': (0, 160, None),
+        'Most points against': (0, 200, None),
+        'All-play champ': (2, 4 / 6.0, None),
+        'Luckiest': (2, 2 / 3.0, None),
+        'Unluckiest': (1, -1, None),
+        'Best week': (2, 110, 2),
+        'Worst week': (0, 60, 2),
+        'Biggest blowout': (2, 50, 2),
+        'Closest win': (3, 1, 2),
+        'Most consistent': (1, 2.5, None),
+        'Boom or bust': (0, 20, None),
+    }
+
+
+def test_awards_skip_unplayed_weeks():
+    m = analytics.SeasonMatrix('ab', 'AB', [1, 2], [[100, np.nan], [90, np.nan]], [[1, -1], [0, -1]])
+    awards = dict((a.title, (a.team, a.value, a.week)) for a in m.awards())
+    assert awards['Worst week'] == (1, 90, 1)
+    # One game each is no spread to speak of
+    assert 'Most consistent' not in awards
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import changes
+from providers import base
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+TEAMS = ['a', 'b', 'c', 'd']
+
+
+def league(rosters, wins=(3, 2, 1, 0), points=(0.0, 0.0, 10.0, 0.0), final=False):
+    teams = base.TeamTable(keys=TEAMS, names=[k.upper() for k in TEAMS], managers=TEAMS, manager_ids=TEAMS,
+                           divisions=[''] * 4, wins=list(wins), losses=[3 - w for w in wins], ties=[0] * 4,
+                           points_for=[100.0] * 4, points_against=[100.0] * 4)
+    matchups = base.MatchupTable(weeks=[5, 5], home=[0, 2], away=[1, 3], home_points=points[:2],
+                                 away_points=points[2:], home_projected=[0, 0], away_projected=[0, 0],
+                                 home_win_probability=[0, 0], away_win_probability=[0, 0], final=[final] * 2)
+    return changes.snapshot(teams, matchups, rosters)
+
+
+ROSTERS = {'a': ['a1', 'a2'], 'b': ['b1', 'b2'], 'c': ['c1'], 'd': ['d1']}
+
+
+def events(old, new, kind):
+    feed = changes.ChangeFeed()
+    assert feed.update(old) == []
+    return [e for e in feed.update(new) if e.kind == kind]
+
+
+def test_trade():
+    after = dict(ROSTERS, a=['a2', 'b1'], b=['a1', 'b2'])
+    assert events(league(ROSTERS), league(after), 'trade') == [
+        changes.Trade(('a', 'b'), {'a': ['b1'], 'b': ['a1']})]
+    assert events(league(ROSTERS), league(after), 'roster') == []
+
+
+def test_trade_alongside_moves():
+    after = dict(ROSTERS, a=['b1', 'b2', 'x'], b=['a1', 'a2'], c=[])
+    assert events(league(ROSTERS), league(after), 'trade') == [
+        changes.Trade(('a', 'b'), {'a': ['b1', 'b2'], 'b': ['a1', 'a2']})]
+    assert events(league(ROSTERS), league(after), 'roster') == [
+        changes.RosterMove('a', ['x'], []), changes.RosterMove('c', [], ['c1'])]
+
+
+def test_claim_of_dropped_player_is_not_a_trade():
+    # c drops c1 and d picks him up in the same poll
+    after = dict(ROSTERS, c=[], d=['c1', 'd1'])
+    assert events(league(ROSTERS), league(after), 'trade') == []
+    assert events(league(ROSTERS), league(after), 'roster') == [
+        changes.RosterMove('c', [], ['c1']), changes.RosterMove('d', ['c1'], [])]
+
+
+def test_one_way_moves_between_two_teams():
+    # a claims b's drop while b claims a free agent: not a trade either
+    after = dict(ROSTERS, a=['a1', 'a2', 'b1'], b=['b2', 'x'])
+    assert events(league(ROSTERS), league(after), 'trade') == []
+    assert events(league(ROSTERS), league(after), 'roster') == [
+        changes.RosterMove('a', ['b1'], []), changes.RosterMove('b', ['x'], ['b1'])]
+
+
+def test_two_trades():
+    after = {'a': ['a2', 'b1'], 'b': ['a1', 'b2'], 'c': ['d1'], 'd': ['c1']}
+    assert events(league(ROSTERS), league(after), 'trade') == [
+        changes.Trade(('a', 'b'), {'a': ['b1'], 'b': ['a1']}),
+        changes.Trade(('c', 'd'), {'c': ['d1'], 'd': ['c1']})]
+
+
+def test_standings_and_matchups():
+    old = league(ROSTERS, points=(10.0, 0.0, 0.0, 0.0))
+    new = league(ROSTERS, wins=(2, 3, 1, 0), points=(10.0, 0.0, 20.0, 0.0))
+    assert sorted(events(old, new, 'standings')) == [changes.StandingsMove('a', 1, 2),
+                                                     changes.StandingsMove('b', 2, 1)]
+    assert events(old, new, 'lead_change') == [changes.LeadChange(5, 'b', 'a', 20.0, 10.0)]
+    done = league(ROSTERS, wins=(2, 3, 1, 0), points=(10.0, 0.0, 20.0, 0.0), final=True)
+    assert events(new, done, 'final') == [changes.MatchupFinal(5, 'b', 'a', 20.0, 10.0)]
+
+
+def test_unchanged():
+    assert events(league(ROSTERS), league(ROSTERS), 'trade') == []
+    feed = changes.ChangeFeed()
+    feed.update(league(ROSTERS))
+    assert feed.update(league(ROSTERS)) == []
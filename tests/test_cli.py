@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+
+import pytest
+
+import cli
+import ylog
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+# Responses as --record DIR writes them
+REPLAY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'replay')
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    # main sets the environment and takes over the root logger
+    for name in ('FFBOT_PROVIDER', 'FFBOT_CACHE', 'FFBOT_RECORD', 'FFBOT_REPLAY', 'FFBOT_REPLAY_LATENCY'):
+        monkeypatch.delenv(name, raising=False)
+    root = logging.getLogger()
+    monkeypatch.setattr(root, 'handlers', list(root.handlers))
+    monkeypatch.setattr(root, 'level', root.level)
+    monkeypatch.setattr(ylog, '_listener', None)
+    monkeypatch.setattr(ylog, '_handler', None)
+    yield
+    ylog.stop()
+
+
+def test_bench(capsys):
+    import bench
+    cli.main(['--replay', REPLAY, 'bench', '-n', '1'])
+    assert os.environ['FFBOT_REPLAY'] == REPLAY
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ['benchmark', 'best', 'mean']
+    assert [line.split()[0] for line in lines[1:]] == list(bench.BENCHMARKS)
+    # Best and mean of a single run
+    assert all(line.split()[1] == line.split()[2] for line in lines[1:])
+
+
+def test_bench_unknown():
+    with pytest.raises(SystemExit) as e:
+        cli.main(['--replay', REPLAY, 'bench', '-n', '1', 'nope'])
+    assert str(e.value).startswith('Unknown benchmarks: nope (have ')
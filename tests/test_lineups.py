@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import numpy as np
+import pytest
+
+import lineups
+from providers import base
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+SLOTS = ['QB', 'RB', 'RB', 'WR', 'WR', 'TE', 'W/R/T', 'SUPER_FLEX', 'K', 'DEF']
+POSITIONS = ['QB', 'RB', 'WR', 'TE', 'K', 'DEF', 'WR,RB', 'RB,TE']
+
+
+def brute_force(slots, positions, points):
+    """
+    :return: (players seated, points) of the best lineup: as many slots
+        filled as can be, then the most points
+    """
+    best = (0, 0.0)
+
+    def fill(slot, used, seated, total):
+        nonlocal best
+        if slot == len(slots):
+            best = max(best, (seated, total))
+            return
+        fill(slot + 1, used, seated, total)
+        for row, position in enumerate(positions):
+            if row not in used and base.fits(slots[slot], position):
+                fill(slot + 1, used | {row}, seated + 1, total + points[row])
+
+    fill(0, frozenset(), 0, 0.0)
+    return best
+
+
+def random_roster(rng, size):
+    positions = [rng.choice(POSITIONS) for _ in range(size)]
+    # Repeated values make ties, and a few players score below zero
+    points = [float(rng.choice([-2, 0, 3, 3, 7, 12, 12, 20, 31])) for _ in range(size)]
+    return positions, points
+
+
+@pytest.mark.parametrize('seed', range(400))
+def test_fill_matches_brute_force(seed):
+    rng = random.Random(seed)
+    slots = rng.sample(SLOTS, rng.randint(1, 6))
+    positions, points = random_roster(rng, rng.randint(0, 8))
+    lineup = lineups.fill(slots, positions, points)
+    rows = [row for _, row in lineup if row is not None]
+    assert [slot for slot, _ in lineup] == slots
+    assert len(rows) == len(set(rows))
+    assert all(base.fits(slot, positions[row]) for slot, row in lineup if row is not None)
+    assert (len(rows), lineups.total(slots, positions, points)) == brute_force(slots, positions, points)
+
+
+def test_reshuffles_flex():
+    # The RB,TE player has to move from RB to TE for the best lineup
+    lineup = lineups.fill(['RB', 'TE'], ['RB,TE', 'RB'], [20.0, 10.0])
+    assert lineup == [('RB', 1), ('TE', 0)]
+
+
+def test_best():
+    rng = random.Random(0)
+    rows = []
+    for week in (2, 1):
+        for team in (1, 0, 2):
+            positions, points = random_roster(rng, 8)
+            started = [rng.random() < 0.5 for _ in positions]
+            rows.extend((week, team, 'p%d' % i, 'P%d' % i, position, p, s)
+                        for i, (position, p, s) in enumerate(zip(positions, points, started)))
+    rng.shuffle(rows)
+    table = base.LineupTable(**dict(zip(base.LineupTable.columns, zip(*rows))))
+    slots = SLOTS[:6]
+    results, seats = lineups.best(table, slots)
+    assert [(w.week, w.team) for w in results] == [(1, 0), (1, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+    for w in results:
+        mine = (table.weeks == w.week) & (table.teams == w.team)
+        assert w.actual == table.points[mine & table.started].sum()
+        assert w.optimal == lineups.total(slots, [table.positions[i] for i in np.flatnonzero(mine)],
+                                          table.points[mine])
+        seated = [i for i in seats[w.week, w.team] if i >= 0]
+        assert all(mine[i] for i in seated)
+        assert w.optimal == sum(table.points[i] for i in seated)
+    assert lineups.best(base.LineupTable(), slots) == ([], {})
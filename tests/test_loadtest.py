@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import os
+import types
+
+import loadtest
+import yclient
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+RECORDED = {
+    'league/399.l.7/standings': '<fantasy_content><league><name>League</name></league></fantasy_content>',
+    'league/399.l.7/scoreboard;week=1': '<fantasy_content><league><scoreboard/></league></fantasy_content>',
+}
+
+
+def record(path):
+    for uri, xml in RECORDED.items():
+        with open(os.path.join(str(path), yclient.ReplayClient.filename(uri)), 'w') as f:
+            f.write(xml)
+
+
+def command(client, uri):
+    # A bot command that reads one uri and posts what came back
+    async def callback(ctx):
+        r = await asyncio.get_event_loop().run_in_executor(None, client.send_get, uri)
+        if r is None:
+            raise ValueError('Nothing recorded for %s' % uri)
+        await ctx.send(r.text)
+    return types.SimpleNamespace(callback=callback)
+
+
+def test_smoke(tmp_path, caplog):
+    record(tmp_path)
+    stub = loadtest.StubYahoo(str(tmp_path)).start()
+    try:
+        client = yclient.StubClient(stub.url)
+        bot = types.SimpleNamespace(standings=command(client, 'league/399.l.7/standings'),
+                                    scoreboard=command(client, 'league/399.l.7/scoreboard;week=1'),
+                                    roster=command(client, 'team/399.l.7.t.1/roster'))
+        channel = loadtest.FakeChannel(latency=0.0)
+        ctx = loadtest.fake_context(loadtest.FakeBot(), channel, 1)
+        calls = [(name, ctx, {}) for name in ('standings', 'scoreboard', 'standings', 'roster')]
+        with caplog.at_level(logging.WARNING, logger=loadtest.logger.name):
+            latencies, failed, elapsed, lags = asyncio.run(loadtest._load(bot, calls, 2))
+    finally:
+        stub.stop()
+    assert sorted((name, len(times)) for name, times in latencies.items()) == [('scoreboard', 1), ('standings', 2)]
+    assert failed == {'roster': 1}
+    assert sorted(m.content for m in channel.messages) == sorted(RECORDED[u] for u in (
+        'league/399.l.7/standings', 'league/399.l.7/scoreboard;week=1', 'league/399.l.7/standings'))
+    assert stub.stats() == {'requests': 4, 'uris': 3, 'throttled': 0, 'not_recorded': 1}
+    assert [r.getMessage() for r in caplog.records if r.name == loadtest.logger.name] == [
+        "roster failed: ValueError('Nothing recorded for team/399.l.7.t.1/roster')"]
+
+    report = loadtest.Report(3, failed, elapsed, latencies, lags, stub.stats(), 4, len(channel.messages), 0)
+    lines = loadtest.report_lines(report)
+    assert lines[0].startswith('3 commands in') and lines[0].endswith(', 1 failed')
+    assert [line.split()[0] for line in lines[2:5]] == ['scoreboard', 'standings', 'all']
+
+
+def test_throttled(tmp_path):
+    record(tmp_path)
+    stub = loadtest.StubYahoo(str(tmp_path), errors=1.0).start()
+    try:
+        r = yclient.StubClient(stub.url).send_get('league/399.l.7/standings')
+        assert (r.status_code, r.text) == (loadtest.THROTTLED, 'Request denied')
+    finally:
+        stub.stop()
+    assert stub.stats() == {'requests': 1, 'uris': 1, 'throttled': 1, 'not_recorded': 0}
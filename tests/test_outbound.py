@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import random
+
+import pytest
+
+import outbound
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+def random_text(rng, lines):
+    return '\n'.join(''.join(rng.choice('ab c') for _ in range(rng.choice([0, 5, 30, 90, 250])))
+                     for _ in range(lines))
+
+
+def unfence(piece, first):
+    assert piece.startswith('```') and piece.endswith('```')
+    return piece[3:-3] if first else piece[4:-3]
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_split(seed):
+    rng = random.Random(seed)
+    limit = rng.choice([60, 100, 400])
+    content = random_text(rng, rng.randint(1, 40))
+    pieces = outbound.split(content, limit)
+    assert all(len(p) <= limit for p in pieces)
+    assert ''.join(pieces) == content
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_split_code_block(seed):
+    rng = random.Random(seed)
+    limit = rng.choice([60, 100, 400])
+    body = random_text(rng, rng.randint(1, 40))
+    pieces = outbound.split('```' + body + '```', limit)
+    assert all(len(p) <= limit for p in pieces)
+    if len(pieces) > 1:
+        assert ''.join(unfence(p, i == 0) for i, p in enumerate(pieces)) == body
+
+
+def test_split_on_lines():
+    assert outbound.split('aaaa\nbbbb\ncccc', 10) == ['aaaa\nbbbb\n', 'cccc']
+    assert outbound.split('```aaaa\nbbbb\ncccc```', 17) == ['```aaaa\nbbbb\n```', '```\ncccc```']
+    assert outbound.split('short', 10) == ['short']
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_pack(seed):
+    rng = random.Random(seed)
+    limit = rng.choice([60, 100, 400])
+    contents = [random_text(rng, rng.randint(1, 5)) for _ in range(rng.randint(1, 12))]
+    messages, unpacked = outbound.pack(contents, limit)
+    pieces = [p for c in contents if c for p in outbound.split(c, limit)]
+    assert unpacked == len(pieces)
+    assert all(len(m) <= limit for m in messages)
+    assert '\n'.join(messages) == '\n'.join(pieces)
+    # No two neighbours would have fit in one
+    assert all(len(a) + 1 + len(b) > limit for a, b in zip(messages, messages[1:]))
+
+
+def test_pack_fills_messages():
+    assert outbound.pack(['a' * 4, 'b' * 4, 'c' * 4, '', 'd' * 12], 10) == (['aaaa\nbbbb', 'cccc', 'd' * 10, 'dd'],
+                                                                             5)
+
+
+class Channel(object):
+    id = 1
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content, **kwargs):
+        self.sent.append(content)
+        return len(self.sent)
+
+
+def test_outbox_packs_what_is_queued_together():
+    channel = Channel()
+    outbox = outbound.Outbox(rate=(100, 1.0))
+
+    async def main():
+        return await asyncio.gather(outbox.send(channel, 'one'), outbox.send(channel, ['two', 'three']),
+                                    outbox.send(channel, 'alone', alone=True))
+
+    results = asyncio.run(main())
+    assert channel.sent == ['one\ntwo\nthree', 'alone']
+    assert results == [[1], [1], [2]]
+    assert outbox.stats()['saved'] == 2
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+import pickups
+from providers import base
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+nan = float('nan')
+
+
+def table(rows):
+    """
+    :param rows: (key, position, recent, season, projected)
+    """
+    keys, positions, recent, season, projected = zip(*rows)
+    return base.PlayerStatsTable(keys=keys, names=[k.upper() for k in keys], positions=positions,
+                                 teams=['FA'] * len(rows), statuses=[''] * len(rows), recent=recent,
+                                 season=season, projected=projected, owned=[nan] * len(rows))
+
+
+POOL = table([
+    ('p1', 'RB', 20, 10, 15),
+    ('p2', 'WR', 12, nan, nan),
+    ('p3', 'TE', nan, nan, nan),
+    ('p4', 'QB', 30, nan, 25),
+    ('p5', 'WR,RB', 9, 9, 9),
+])
+# The tight end starts at flex over the second receiver
+ROSTER = table([
+    ('q1', 'QB', 20, 20, 20),
+    ('r1', 'RB', 14, 14, 14),
+    ('w1', 'WR', 10, 10, 10),
+    ('w2', 'WR', 5, 5, 5),
+    ('t1', 'TE', 8, 8, 8),
+])
+SLOTS = ['QB', 'RB', 'WR', 'W/R/T']
+
+
+def picks(found, pool=POOL, roster=ROSTER):
+    return [(pool.keys[p.row], pytest.approx(p.gain), roster.keys[p.replaces] if p.replaces is not None else None)
+            for p in found]
+
+
+def test_values():
+    # Weights of the missing numbers are left out
+    assert pickups.values(POOL).tolist() == pytest.approx([16.5, 12, 0, 28.125, 9])
+    assert len(pickups.values(base.PlayerStatsTable())) == 0
+
+
+def test_rank():
+    assert picks(pickups.rank(POOL, ROSTER, SLOTS)) == [
+        ('p1', 8.5, 't1'), ('p4', 8.125, 'q1'), ('p2', 4, 't1'), ('p5', 1, 't1')]
+    assert picks(pickups.rank(POOL, ROSTER, SLOTS, limit=2)) == [('p1', 8.5, 't1'), ('p4', 8.125, 'q1')]
+
+
+def test_rank_position():
+    found = pickups.rank(POOL, ROSTER, SLOTS, position='wr')
+    # Rows are still rows of the whole pool
+    assert [p.row for p in found] == [1, 4]
+    assert picks(found) == [('p2', 4, 't1'), ('p5', 1, 't1')]
+    assert pickups.rank(POOL, ROSTER, SLOTS, position='K') == []
+
+
+def test_rank_empty_slot():
+    pool = table([('k1', 'K', 3, nan, nan)])
+    assert picks(pickups.rank(pool, ROSTER, SLOTS + ['K']), pool=pool) == [('k1', 3, None)]
+    assert pickups.rank(pool, ROSTER, []) == []
+
+
+def test_no_pickup_beats_a_starter():
+    roster = table([('q1', 'QB', 40, 40, 40), ('r1', 'RB', 40, 40, 40), ('w1', 'WR', 40, 40, 40),
+                    ('w2', 'WR', 40, 40, 40)])
+    assert pickups.rank(POOL, roster, SLOTS) == []
+
+
+def test_pool_without_rostered_players(tmp_path):
+    pool = pickups.Pool(POOL, built=1.0)
+    available = pool.without({'p1', 'p4', 'x9'})
+    assert available.keys == ['p2', 'p3', 'p5']
+    assert picks(pickups.rank(available, ROSTER, SLOTS), pool=available) == [('p2', 4, 't1'), ('p5', 1, 't1')]
+    assert pool.without(set()).keys == POOL.keys
+
+    path = str(tmp_path / 'pickups.json')
+    pool.save(path)
+    loaded = pickups.Pool.load(path)
+    assert loaded.built == 1.0
+    assert loaded.players.keys == POOL.keys
+    np.testing.assert_array_equal(loaded.players.recent, POOL.recent)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import players
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+POOL = [
+    ('p.1', 'Patrick Mahomes', 'QB', 'KC', '', 'freeagents'),
+    ('p.2', 'Pat Freiermuth', 'TE', 'PIT', '', 'Team A'),
+    ('p.3', "Le'Veon Bell", 'RB', 'TB', '', 'freeagents'),
+    ('p.4', 'Amon-Ra St. Brown', 'WR', 'DET', '', 'Team B'),
+    ('p.5', 'Equanimeous St. Brown', 'WR', 'CHI', '', 'waivers'),
+    ('p.6', 'Ja\'Marr Chase', 'WR', 'CIN', '', 'Team A'),
+    ('p.7', 'Pat', 'K', 'FA', '', 'freeagents'),
+]
+
+
+def keys(found):
+    return [p.key for p in found]
+
+
+def test_prefix():
+    index = players.PlayerIndex(POOL)
+    assert keys(index.prefix('pat')) == ['p.1', 'p.2', 'p.7']
+    assert keys(index.prefix('pat mah')) == ['p.1']
+    # Words match in any order
+    assert keys(index.prefix('mah pat')) == ['p.1']
+    assert index.prefix('pat zzz') == []
+
+
+def test_punctuation():
+    index = players.PlayerIndex(POOL)
+    assert keys(index.search('leveon')) == ['p.3']
+    assert keys(index.search("Le'Veon Bell")) == ['p.3']
+    assert keys(index.search('st brown')) == ['p.4', 'p.5']
+    assert keys(index.search('amon ra')) == ['p.4']
+    assert keys(index.search('JaMarr')) == ['p.6']
+
+
+def test_exact_name_first():
+    index = players.PlayerIndex(POOL)
+    assert keys(index.search('pat')) == ['p.7', 'p.1', 'p.2']
+    assert keys(index.search('pat', limit=1)) == ['p.7']
+
+
+def test_typos():
+    index = players.PlayerIndex(POOL)
+    assert index.prefix('mahommes') == []
+    assert keys(index.search('mahommes'))[0] == 'p.1'
+    assert keys(index.search('patrik mahomes'))[0] == 'p.1'
+    assert keys(index.search('freirmuth'))[0] == 'p.2'
+    assert index.search('xqzvw') == []
+
+
+def test_empty_query():
+    index = players.PlayerIndex(POOL)
+    assert index.prefix('') == []
+    assert index.search('') == []
+    assert index.search(" '- ") == []
+    assert players.PlayerIndex().search('pat') == []
+
+
+def test_build_pages():
+    pool = [('p.%d' % i, 'Player %d' % i, 'WR', 'FA', '', 'freeagents') for i in range(230)]
+    asked = []
+
+    def fetch_page(start, count):
+        asked.append(start)
+        return pool[start:start + count]
+
+    index = players.PlayerIndex.build(fetch_page)
+    assert keys(index.players) == [p[0] for p in pool]
+    # Two waves of eight pages, the second one comes back short
+    assert sorted(asked) == list(range(0, 400, 25))
+    assert not index.stale
+
+
+def test_refresh_from_transactions(tmp_path):
+    index = players.PlayerIndex(POOL, updated=1.0)
+    assert index.stale
+    fetched = []
+
+    def fetch_keys(chunk):
+        fetched.append(chunk)
+        moved = {'p.1': ('p.1', 'Patrick Mahomes', 'QB', 'KC', '', 'Team B'),
+                 'p.8': ('p.8', 'Puka Nacua', 'WR', 'LAR', '', 'Team A')}
+        return [moved[k] for k in chunk]
+
+    assert index.refresh({'p.8', 'p.1'}, fetch_keys) == 2
+    assert fetched == [['p.1', 'p.8']]
+    assert index.get('p.1').owner == 'Team B'
+    assert len(index) == 8
+    # New players are searchable straight away
+    assert keys(index.search('puka')) == ['p.8']
+    assert keys(index.search('nacau')) == ['p.8']
+    assert not index.stale
+
+    path = str(tmp_path / 'players.json')
+    index.save(path)
+    loaded = players.PlayerIndex.load(path)
+    assert loaded.players == index.players
+    assert loaded.updated == index.updated
+
+
+def test_refresh_nothing_changed():
+    index = players.PlayerIndex(POOL, updated=1.0)
+    assert index.refresh(set(), lambda chunk: []) == 0
+    assert not index.stale
+    assert len(index) == len(POOL)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+import analytics
+import playoffs
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+def season(teams=10, played=8, weeks=13, seed=0):
+    rng = np.random.default_rng(seed)
+    scores = np.full((teams, weeks), np.nan)
+    opponents = np.full((teams, weeks), -1)
+    games = []
+    for w in range(weeks):
+        order = rng.permutation(teams)
+        for home, away in zip(order[::2], order[1::2]):
+            if w < played:
+                scores[[home, away], w] = rng.normal(110, 25, 2)
+                opponents[home, w], opponents[away, w] = away, home
+            else:
+                games.append((w + 1, int(home), int(away), 0.0, 0.0))
+    m = analytics.SeasonMatrix(range(teams), ['Team %d' % t for t in range(teams)], list(range(1, weeks + 1)),
+                               scores, opponents)
+    return m, games
+
+
+@pytest.mark.parametrize('spots', [1, 4, 6])
+@pytest.mark.parametrize('divisions', [None, [0, 1] * 5, [0, 0, 1, 1, 1, 2, 2, 2, 2, 0]])
+def test_odds_sum_to_spots(spots, divisions):
+    m, games = season()
+    odds = playoffs.PlayoffSimulator(m, games, spots, divisions=divisions).run(sims=3000, seed=1, parallel=False)
+    assert odds.playoffs.sum() == pytest.approx(spots)
+    assert odds.top_seed.sum() == pytest.approx(1)
+    assert odds.mean_seed.sum() == pytest.approx(sum(range(1, len(m) + 1)))
+    assert ((odds.playoffs >= 0) & (odds.playoffs <= 1)).all()
+
+
+def test_division_winners_make_it():
+    m, games = season(played=13)
+    divisions = [0] * 9 + [1]
+    odds = playoffs.PlayoffSimulator(m, games, 2, divisions=divisions).run(sims=100, seed=1, parallel=False)
+    assert odds.playoffs[9] == 1
+
+
+def test_finished_season_is_certain():
+    m, games = season(played=13)
+    assert games == []
+    odds = playoffs.PlayoffSimulator(m, games, 4).run(sims=100, parallel=False)
+    assert sorted(odds.playoffs.tolist()) == [0.0] * 6 + [1.0] * 4
+    assert np.array_equal(odds.mean_wins, m.actual_wins())
+
+
+def test_seeded_runs_repeat():
+    m, games = season()
+    simulator = playoffs.PlayoffSimulator(m, games, 4)
+    first, second = [simulator.run(sims=30000, seed=7, parallel=False) for _ in range(2)]
+    assert np.array_equal(first.playoffs, second.playoffs)
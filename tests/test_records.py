@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+import records
+from providers import base
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+def season(key, managers, games, final=None):
+    """
+    :param managers: manager id of each team
+    :param games: list of (week, home, away, home points, away points)
+    :param final: whether each game is over; all are if None
+    """
+    n = len(games)
+    teams = base.TeamTable(keys=['%s.t.%d' % (key, i) for i in range(len(managers))],
+                           names=['Team %s' % m for m in managers], managers=managers, manager_ids=managers,
+                           divisions=[''] * len(managers), wins=[0] * len(managers), losses=[0] * len(managers),
+                           ties=[0] * len(managers), points_for=[0.0] * len(managers),
+                           points_against=[0.0] * len(managers))
+    weeks, home, away, home_points, away_points = zip(*games)
+    matchups = base.MatchupTable(weeks=weeks, home=home, away=away, home_points=home_points,
+                                 away_points=away_points, home_projected=[0] * n, away_projected=[0] * n,
+                                 home_win_probability=[0] * n, away_win_probability=[0] * n,
+                                 final=[True] * n if final is None else final)
+    return base.Season(key, key[1:], teams, matchups, None)
+
+
+def random_seasons(seed, count=3, weeks=8):
+    rng = random.Random(seed)
+    seasons = []
+    for s in range(count):
+        managers = ['m%d' % i for i in range(4)]
+        rng.shuffle(managers)
+        games = []
+        for week in range(1, weeks + 1):
+            order = list(range(4))
+            rng.shuffle(order)
+            for h, a in ((order[0], order[1]), (order[2], order[3])):
+                games.append((week, h, a, rng.randint(0, 3), rng.randint(0, 3)))
+        seasons.append(season('s%d' % s, managers, games))
+    return seasons
+
+
+def brute_streaks(seasons):
+    # Every streak ever, ongoing ones included, as (length, won)
+    results = {}
+    for s in seasons:
+        m, ids = s.matchups, s.teams.manager_ids
+        for _, h, a, hp, ap in sorted(zip(m.weeks.tolist(), m.home.tolist(), m.away.tolist(),
+                                          m.home_points.tolist(), m.away_points.tolist())):
+            results.setdefault(ids[h], []).append((hp > ap) - (hp < ap))
+            results.setdefault(ids[a], []).append((ap > hp) - (ap < hp))
+    streaks = []
+    for games in results.values():
+        run, sign = 0, 0
+        for result in games + [0]:
+            if result == sign and result:
+                run += 1
+                continue
+            if sign:
+                streaks.append((run, sign > 0))
+            run, sign = (1, result) if result else (0, 0)
+    return streaks
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_streaks_match_brute_force(seed, tmp_path):
+    seasons = random_seasons(seed)
+    book = records.RecordsBook(top_n=5)
+    book.add_season(seasons[0])
+    # Ongoing streaks carry over a save
+    book.save(str(tmp_path / 'records.json'))
+    book = records.RecordsBook.load(str(tmp_path / 'records.json'))
+    for s in seasons[1:]:
+        book.add_season(s)
+    streaks = brute_streaks(seasons)
+    for name, won in (('win_streaks', True), ('loss_streaks', False)):
+        expected = sorted((length for length, w in streaks if w == won), reverse=True)[:5]
+        assert [r.value for r in book.records(name)] == expected
+
+
+def test_streak_records():
+    # a beats b three weeks running, then b wins
+    book = records.RecordsBook()
+    games = [(1, 0, 1, 10, 5), (2, 1, 0, 5, 10), (3, 0, 1, 10, 5), (4, 0, 1, 5, 10)]
+    assert book.add_season(season('s2019', ['a', 'b'], games)) == [1, 2, 3, 4]
+    best = book.records('win_streaks')[0]
+    assert (best.value, best.season, best.week, best.manager) == (3, '2019', 3, 'a')
+    assert [r.value for r in book.records('loss_streaks')] == [3, 1]
+    # A streak is listed once, at its longest
+    assert [r.manager for r in book.records('win_streaks')] == ['a', 'b']
+
+
+def test_weeks_are_added_once_in_order():
+    book = records.RecordsBook()
+    games = [(1, 0, 1, 10, 5), (2, 0, 1, 10, 5), (3, 0, 1, 10, 5)]
+    assert book.add_season(season('s2019', ['a', 'b'], games, final=[True, False, True])) == [1]
+    assert book.add_season(season('s2019', ['a', 'b'], games)) == [2, 3]
+    assert book.add_season(season('s2019', ['a', 'b'], games)) == []
+    assert book.records('win_streaks')[0].value == 3
+    assert book.most_season_points()[0] == (30.0, '2019', 'a')
+
+
+def test_scores_and_margins():
+    book = records.RecordsBook(top_n=2)
+    book.add_season(season('s2019', ['a', 'b', 'c', 'd'], [(1, 0, 1, 100, 50), (1, 2, 3, 80, 79.5),
+                                                          (2, 0, 2, 120, 60), (2, 1, 3, 70, 70)]))
+    assert [r.value for r in book.records('high_scores')] == [120, 100]
+    assert [r.value for r in book.records('low_scores')] == [50, 60]
+    assert [r.value for r in book.records('blowouts')] == [60, 50]
+    assert [r.value for r in book.records('nailbiters')] == [0.5, 50]
+    assert book.season_highs['2019'].value == 120
+    made = [(name, rank) for name, rank, _ in book.set_in('2019', 2)]
+    assert ('high_scores', 1) in made and ('blowouts', 1) in made and ('nailbiters', 1) not in made
+
+
+def test_seasons_without_finished_weeks_are_kept(tmp_path):
+    book = records.RecordsBook()
+    assert book.add_season(season('s2019', ['a', 'b'], [(1, 0, 1, 10, 5)], final=[False])) == []
+    assert 's2019' in book.seasons
+    book.save(str(tmp_path / 'records.json'))
+    assert 's2019' in records.RecordsBook.load(str(tmp_path / 'records.json')).seasons
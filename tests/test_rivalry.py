@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+import rivalry
+from providers import base
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+def season(key, managers, games):
+    """
+    :param managers: manager id of each team ('' if unknown)
+    :param games: list of (week, home, away, home points, away points)
+    """
+    n = len(games)
+    teams = base.TeamTable(keys=['%s.t.%d' % (key, i) for i in range(len(managers))],
+                           names=['Team %s' % m for m in managers], managers=['%s@x' % m for m in managers],
+                           manager_ids=managers, divisions=[''] * len(managers), wins=[0] * len(managers),
+                           losses=[0] * len(managers), ties=[0] * len(managers),
+                           points_for=[0.0] * len(managers), points_against=[0.0] * len(managers))
+    weeks, home, away, home_points, away_points = zip(*games) if games else ((),) * 5
+    matchups = base.MatchupTable(weeks=weeks, home=home, away=away, home_points=home_points,
+                                 away_points=away_points, home_projected=[0] * n, away_projected=[0] * n,
+                                 home_win_probability=[0] * n, away_win_probability=[0] * n, final=[True] * n)
+    return base.Season(key, key, teams, matchups, None)
+
+
+def random_seasons(seed, count=4):
+    rng = random.Random(seed)
+    everyone = ['m%d' % i for i in range(6)]
+    seasons = []
+    for s in range(count):
+        # Managers come and go, and teams are re-keyed every season
+        managers = rng.sample(everyone, 4)
+        games = []
+        for week in range(1, 8):
+            order = list(range(4))
+            rng.shuffle(order)
+            for h, a in ((order[0], order[1]), (order[2], order[3])):
+                games.append((week, h, a, rng.randint(0, 3), rng.randint(0, 3)))
+        # Providers do not list games by week
+        rng.shuffle(games)
+        seasons.append(season('s%d' % s, managers, games))
+    return seasons
+
+
+def brute_force(seasons):
+    # Every game between two managers, in order, from a's side
+    played = {}
+    for s in seasons:
+        ids = s.teams.manager_ids
+        m = s.matchups
+        for _, h, a, hp, ap in sorted(zip(m.weeks.tolist(), m.home.tolist(), m.away.tolist(),
+                                          m.home_points.tolist(), m.away_points.tolist())):
+            played.setdefault((ids[h], ids[a]), []).append((hp > ap) - (hp < ap))
+            played.setdefault((ids[a], ids[h]), []).append((ap > hp) - (ap < hp))
+    expected = {}
+    for pair, results in played.items():
+        streak = 0
+        for result in results:
+            streak = 0 if not result else streak + result if streak * result > 0 else result
+        expected[pair] = (results.count(1), results.count(-1), results.count(0), streak)
+    return expected
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_matches_brute_force(seed, tmp_path):
+    seasons = random_seasons(seed)
+    index = rivalry.RivalryIndex()
+    for s in seasons[:2]:
+        index.add_season(s)
+    # Picks up where it left off after a save
+    index.save(str(tmp_path / 'rivalry.json'))
+    index = rivalry.RivalryIndex.load(str(tmp_path / 'rivalry.json'))
+    for s in seasons[2:]:
+        index.add_season(s)
+    for (a, b), (wins, losses, ties, streak) in brute_force(seasons).items():
+        h2h = index.head_to_head(a, b)
+        assert (h2h.wins, h2h.losses, h2h.ties, h2h.streak) == (wins, losses, ties, streak)
+        assert h2h.games == wins + losses + ties
+
+
+def test_streaks():
+    index = rivalry.RivalryIndex()
+    index.add_season(season('s0', ['a', 'b'], [(1, 0, 1, 10, 5), (2, 1, 0, 5, 10), (3, 0, 1, 10, 5)]))
+    assert index.head_to_head('a', 'b').streak == 3
+    assert index.head_to_head('b@x', 'a@x').streak == -3
+    index.add_season(season('s1', ['b', 'a'], [(1, 0, 1, 7, 7)]))
+    assert index.head_to_head('a', 'b').streak == 0
+    index.add_season(season('s2', ['b', 'a'], [(2, 0, 1, 9, 8), (1, 0, 1, 9, 8)]))
+    assert index.head_to_head('a', 'b').streak == -2
+    assert index.head_to_head('a', 'b').ties == 1
+    assert index.head_to_head('a', 'nobody') is None
+
+
+def test_unknown_managers_are_skipped():
+    index = rivalry.RivalryIndex()
+    assert index.add_season(season('s0', ['a', ''], [(1, 0, 1, 10, 5)])) == 0
+    assert index.managers == ['a']
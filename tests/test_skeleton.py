@@ -1,11 +0,0 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-import pytest
-from ffbot.skeleton import fib
-
-__author__ = "Greg"
-__copyright__ = "Greg"
-__license__ = "mit"
-
-
@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import datetime
+import os
+import tempfile
+import types
+
+import pytest
+from dateutil import tz
+
+# Recorded responses instead of Yahoo, so no credentials are needed
+os.environ.setdefault('FFBOT_REPLAY', tempfile.gettempdir())
+
+import players  # noqa: E402
+import utils  # noqa: E402
+from providers import base  # noqa: E402
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+class FakeProvider(base.Provider):
+    """
+    Four team league that starts in week 3, with one game a week between
+    0 and 1 and between 2 and 3
+    """
+    name = 'fake'
+
+    def __init__(self, current_week=6, start_week=3, playoff_start_week=6):
+        super(FakeProvider, self).__init__({})
+        self.info = base.LeagueInfo('l', 'League', '2024', current_week, start_week, 8, '', '', 4, 2,
+                                    playoff_start_week)
+        self.asked = []
+
+    def league(self):
+        return self.info
+
+    def teams(self):
+        return base.TeamTable(keys=list('abcd'), names=['Team %s' % k.upper() for k in 'abcd'],
+                              managers=list('abcd'), manager_ids=list('abcd'), divisions=[''] * 4,
+                              wins=[3, 0, 2, 1], losses=[0, 3, 1, 2], ties=[0] * 4,
+                              points_for=[330.0, 270.0, 300.0, 290.0], points_against=[270.0] * 4)
+
+    def matchups(self, weeks):
+        weeks = list(weeks)
+        self.asked.append(weeks)
+        # Team a scores 110 + week, b 90; c scores 100 and d 95 + week
+        rows = [(w, 0, 1, 110.0 + w, 90.0) for w in weeks] + [(w, 2, 3, 100.0, 95.0 + w) for w in weeks]
+        weeks, home, away, home_points, away_points = zip(*rows) if rows else ((),) * 5
+        final = [w < self.info.current_week for w in weeks]
+        return base.MatchupTable(weeks=weeks, home=home, away=away, home_points=home_points,
+                                 away_points=away_points, home_projected=[0.0] * len(rows),
+                                 away_projected=[0.0] * len(rows), home_win_probability=[0.5] * len(rows),
+                                 away_win_probability=[0.5] * len(rows), final=final)
+
+    def lineup_slots(self):
+        return ['QB', 'RB', 'W/R/T']
+
+    def roster_stats(self, team_key):
+        rows = [p for p in ROSTERS if p[5] == 'Team %s' % team_key.upper()]
+        keys, names, positions, _, _, _, points = zip(*rows)
+        return base.PlayerStatsTable(keys=keys, names=names, positions=positions, teams=['FA'] * len(rows),
+                                     statuses=[''] * len(rows), recent=points, season=points, projected=points,
+                                     owned=[0.0] * len(rows))
+
+
+# (key, name, position, team, status, owner, points a week)
+ROSTERS = [
+    ('p.1', 'Patrick Mahomes', 'QB', 'KC', '', 'Team A', 20.0),
+    ('p.2', 'Saquon Barkley', 'RB', 'PHI', '', 'Team A', 15.0),
+    ('p.3', 'Tyreek Hill', 'WR', 'MIA', '', 'Team A', 10.0),
+    ('p.4', 'Josh Allen', 'QB', 'BUF', '', 'Team B', 18.0),
+    ('p.5', 'Derrick Henry', 'RB', 'BAL', '', 'Team B', 25.0),
+    ('p.6', 'Davante Adams', 'WR', 'NYJ', '', 'Team B', 12.0),
+]
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setattr(utils, 'PROVIDER', provider)
+    return provider
+
+
+def test_regular_season_starts_at_start_week(provider):
+    season, games, divisions = utils.regular_season(provider.league(), provider.teams())
+    assert provider.asked == [[3, 4, 5]]
+    assert season.weeks == [3, 4, 5]
+    assert divisions is None
+
+
+def test_season_in_review(provider):
+    review = utils.season_in_review()
+    assert provider.asked == [[3, 4, 5]]
+    lines = review.strip('`').splitlines()
+    assert lines[0] == 'Season in Review: League 2024'
+    # Leader by wins
+    assert 'Team A' in lines[2]
+    assert '3 - 0 - 0' in lines[2]
+    awards = dict((line[:21].strip(), line[21:].split()) for line in lines[6:])
+    assert awards['Most points'] == ['Team', 'A', '342.00']
+    assert awards['Fewest points'] == ['Team', 'B', '270.00']
+    assert awards['All-play champ'] == ['Team', 'A', '1.000']
+    # c wins 100 - 99 in week 4, week 5 is a tie
+    assert awards['Closest win'] == ['Team', 'C', '1.00', '4']
+
+
+def test_season_in_review_before_kickoff(monkeypatch):
+    monkeypatch.setattr(utils, 'PROVIDER', FakeProvider(current_week=3))
+    assert utils.season_in_review() == 'No games played yet this season'
+
+
+@pytest.fixture
+def trade(monkeypatch):
+    # Team A's manager asks, with three weeks of the regular season left
+    provider = FakeProvider(current_week=5, playoff_start_week=8)
+    monkeypatch.setattr(utils, 'PROVIDER', provider)
+    monkeypatch.setattr(utils, 'TRADE_SIMS', 2000)
+    monkeypatch.setattr(utils, 'get_user_team', lambda discord_id: 'a')
+    monkeypatch.setattr(utils, 'get_player_index', lambda: players.PlayerIndex([p[:6] for p in ROSTERS]))
+    ctx = types.SimpleNamespace(message=types.SimpleNamespace(author=types.SimpleNamespace(id=1)))
+    return lambda content: utils.analyze_trade(ctx, content)
+
+
+def test_analyze_trade(trade):
+    lines = trade('Tyreek Hill for Derrick Henry').strip('`').splitlines()
+    assert lines[0] == 'Team A trades Tyreek Hill to Team B for Derrick Henry'
+    rows = dict((line[:8].strip(), line[8:].split()) for line in lines[4:])
+    # a: Henry starts at RB and Barkley moves to flex; b is left without a running back
+    assert rows['Team A'] == ['45.0', '->', '60.0', '5.0', '->', '5.0', '100%', '->', '100%']
+    assert rows['Team B'] == ['55.0', '->', '30.0', '0.0', '->', '0.0', '0%', '->', '0%']
+
+
+def test_analyze_trade_after_the_regular_season(trade, monkeypatch):
+    monkeypatch.setattr(utils, 'PROVIDER', FakeProvider(current_week=8, playoff_start_week=8))
+    lines = trade('Tyreek Hill for Derrick Henry').strip('`').splitlines()
+    assert lines[2].split() == ['team', 'lineup', 'pts/wk']
+    assert lines[4].split() == ['Team', 'A', '45.0', '->', '60.0']
+
+
+def test_analyze_trade_players_not_found(trade):
+    assert trade('Tyreek Hill').startswith('Usage:')
+    assert trade('Josh Allen for Derrick Henry') == 'Could not find on Team A: Josh Allen'
+    assert trade('Tyreek Hill for Saquon Barkley') == 'Could not find on another team: Saquon Barkley'
+    assert trade('Tyreek Hill for Derrick Henry, Patrick Mahomes') == 'Could not find on Team B: Patrick Mahomes'
+
+
+def eastern(*args):
+    return datetime.datetime(*args, tzinfo=utils.NFL_TZ)
+
+
+# One week of peaks in order, starting with waivers on Wednesday
+WEEK = [
+    (eastern(2024, 9, 11, 3, 0), 'Waivers'),
+    (eastern(2024, 9, 12, 20, 15), 'Thursday night football'),
+    (eastern(2024, 9, 15, 13, 0), 'Sunday early games'),
+    (eastern(2024, 9, 15, 16, 5), 'Sunday late games'),
+    (eastern(2024, 9, 15, 20, 20), 'Sunday night football'),
+    (eastern(2024, 9, 16, 20, 15), 'Monday night football'),
+    (eastern(2024, 9, 18, 3, 0), 'Waivers'),
+]
+MINUTE = datetime.timedelta(minutes=1)
+
+
+@pytest.mark.parametrize('i', range(len(WEEK) - 1))
+def test_next_peak(i):
+    when, name = WEEK[i]
+    following, following_name = WEEK[i + 1]
+    # Host clocks are on UTC
+    peak_when, peak = utils.next_peak(utils.PEAKS, (when - MINUTE).astimezone(tz.UTC))
+    assert (peak_when, peak.name) == (when, name)
+    # A peak that is starting or just started is past; the next one is up
+    for now in (when, when + MINUTE):
+        peak_when, peak = utils.next_peak(utils.PEAKS, now)
+        assert (peak_when, peak.name) == (following, following_name)
+
+
+def test_next_peak_across_dst():
+    # Clocks fall back at 2am on November 3rd, kickoff stays at 1pm Eastern
+    when, peak = utils.next_peak(utils.PEAKS, datetime.datetime(2024, 11, 3, 5, 0, tzinfo=tz.UTC))
+    assert peak.name == 'Sunday early games'
+    assert when.astimezone(tz.UTC) == datetime.datetime(2024, 11, 3, 18, 0, tzinfo=tz.UTC)
+    when, peak = utils.next_peak(utils.PEAKS, datetime.datetime(2024, 10, 27, 5, 0, tzinfo=tz.UTC))
+    assert when.astimezone(tz.UTC) == datetime.datetime(2024, 10, 27, 17, 0, tzinfo=tz.UTC)
+    # And in spring, waivers stay at 3am Eastern the Wednesday after clocks go forward
+    when, peak = utils.next_peak([utils.WAIVERS], datetime.datetime(2025, 3, 9, 12, 0, tzinfo=tz.UTC))
+    assert when.astimezone(tz.UTC) == datetime.datetime(2025, 3, 12, 7, 0, tzinfo=tz.UTC)
+
+
+def season(current_week=3):
+    return base.LeagueInfo('l', 'League', '2024', current_week, 1, 17, '2024-09-05', '2025-01-06', 4, 2, 15)
+
+
+def test_in_season():
+    games, waivers = utils.PEAKS[0], utils.WAIVERS
+    assert utils.in_season(season(), games, eastern(2024, 9, 12, 20, 15))
+    assert utils.in_season(season(), waivers, eastern(2025, 1, 6, 3, 0))
+    # Off-season
+    assert not utils.in_season(season(), games, eastern(2024, 7, 4, 20, 15))
+    assert not utils.in_season(season(), waivers, eastern(2025, 2, 5, 3, 0))
+    # Past the final week there are no more games, but waivers still run
+    assert not utils.in_season(season(18), games, eastern(2025, 1, 2, 20, 15))
+    assert utils.in_season(season(18), waivers, eastern(2025, 1, 1, 3, 0))
+
+
+class FakeBot(object):
+    def __init__(self, loops=1):
+        self.loops = loops
+
+    async def wait_until_ready(self):
+        pass
+
+    def is_closed(self):
+        self.loops -= 1
+        return self.loops < 0
+
+
+def prefetched(monkeypatch, league, in_seconds=1000):
+    """
+    Run cron_prefetch once with the Sunday early games in_seconds away
+
+    :return: (prefetch calls, seconds slept)
+    """
+    peak = utils.PEAKS[1]
+    now = datetime.datetime.now(tz.tzlocal())
+    calls, slept = [], []
+
+    async def run_blocking(klass, fn, *args):
+        return fn(*args)
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(utils, 'next_peak', lambda peaks: (now + datetime.timedelta(seconds=in_seconds), peak))
+    monkeypatch.setattr(utils, 'run_blocking', run_blocking)
+    monkeypatch.setattr(utils, 'prefetch', lambda kind, full: calls.append((kind, full)))
+    monkeypatch.setattr(utils.PROVIDER, 'league', lambda: league, raising=False)
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    asyncio.run(utils.cron_prefetch(utils.PEAKS, FakeBot()))
+    return calls, slept
+
+
+def test_cron_prefetch(monkeypatch):
+    today = datetime.date.today()
+    league = season()._replace(start_date=str(today - datetime.timedelta(days=30)),
+                               end_date=str(today + datetime.timedelta(days=30)))
+    calls, slept = prefetched(monkeypatch, league)
+    assert calls == [('games', True), ('games', False)]
+    # Everything five minutes ahead, snapshots again just before, then past the peak
+    assert slept == [pytest.approx(1000 - utils.PREFETCH_LEAD, abs=5),
+                     pytest.approx(1000 - utils.PREFETCH_TOP_UP, abs=5), pytest.approx(1001, abs=5)]
+
+
+def test_cron_prefetch_late_start(monkeypatch):
+    today = datetime.date.today()
+    league = season()._replace(start_date=str(today), end_date=str(today + datetime.timedelta(days=1)))
+    # Started inside the lead: both prefetches run straight away
+    calls, slept = prefetched(monkeypatch, league, in_seconds=5)
+    assert calls == [('games', True), ('games', False)]
+    assert slept == [pytest.approx(6, abs=5)]
+
+
+def test_cron_prefetch_off_season(monkeypatch):
+    calls, slept = prefetched(monkeypatch, season()._replace(start_date='2000-09-07', end_date='2001-01-01'))
+    assert calls == []
+    assert len(slept) == 3
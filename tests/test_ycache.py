@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+import ycache
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return ycache.SnapshotCache()
+    return ycache.SQLiteSnapshotCache(str(tmp_path / 'cache.db'))
+
+
+class Upstream(object):
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {'call': self.calls, 'teams': [1, 2]}
+
+
+def test_fetch_reuses_fresh(cache):
+    upstream = Upstream()
+    assert ycache.fetch('k', upstream, cache=cache)['call'] == 1
+    assert ycache.fetch('k', upstream, cache=cache)['call'] == 1
+    assert ycache.fetch('k', upstream, fresh_for=0, cache=cache)['call'] == 2
+    assert upstream.calls == 2
+
+
+def test_fetch_final(cache):
+    upstream = Upstream()
+    ycache.fetch('k', upstream, fresh_for=0, final=lambda v: True, cache=cache)
+    assert ycache.fetch('k', upstream, fresh_for=0, cache=cache)['call'] == 1
+    assert cache.get('k')[2] is True
+
+
+def test_fetch_returns_copies(cache):
+    ycache.fetch('k', Upstream(), cache=cache)['teams'].append(3)
+    assert ycache.fetch('k', Upstream(), cache=cache)['teams'] == [1, 2]
+
+
+def test_concurrent_fetch_goes_upstream_once(cache):
+    upstream = Upstream(delay=0.2)
+    results = []
+
+    def fetch():
+        results.append(ycache.fetch('k', upstream, fresh_for=0, cache=cache))
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert upstream.calls == 1
+    assert [r['call'] for r in results] == [1] * 8
+
+
+def test_fetch_rereads_after_lease(cache):
+    # The holder stores its value and lets go between our read and our lease
+    upstream = Upstream()
+    acquire = cache.acquire
+
+    def late_acquire(key, ttl=ycache.LEASE_TTL):
+        cache.put(key, {'call': 'holder'})
+        return acquire(key, ttl)
+
+    cache.acquire = late_acquire
+    assert ycache.fetch('k', upstream, fresh_for=0, cache=cache) == {'call': 'holder'}
+    assert upstream.calls == 0
+
+
+def test_failed_holder_hands_over(cache):
+    def failing():
+        raise IOError('upstream down')
+
+    with pytest.raises(IOError):
+        ycache.fetch('k', failing, cache=cache)
+    assert ycache.fetch('k', Upstream(), cache=cache)['call'] == 1
+
+
+def test_lease(cache):
+    taken = []
+
+    def other(key, ttl=ycache.LEASE_TTL):
+        thread = threading.Thread(target=lambda: taken.append(cache.acquire(key, ttl)))
+        thread.start()
+        thread.join()
+        return taken[-1]
+
+    with ycache.lease('k', cache) as held:
+        assert held
+        assert not other('k')
+        assert other('j')
+    assert other('k')
+    # Another owner's lease is never released by us, but runs out
+    assert not cache.acquire('k')
+    cache.release('k')
+    assert not cache.acquire('k')
+    other('x', ttl=0.01)
+    time.sleep(0.02)
+    assert cache.acquire('x')
+
+
+def test_cached_only(cache):
+    cache.put('k', {'a': 1})
+    with ycache.cached_only(cache) as served:
+        assert ycache.serving() is served
+        assert served.get('k') == {'a': 1}
+        with pytest.raises(ycache.CacheMiss):
+            served.get('missing')
+    assert ycache.serving() is None
+    assert 0 <= served.age < 5
+
+
+def test_describe_age():
+    assert [ycache.describe_age(s) for s in (5, 600, 7200, 3 * 86400)] == ['5s', '10m', '2h', '3d']
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import tempfile
+
+import pytest
+
+# Recorded responses instead of Yahoo, so no credentials are needed
+os.environ.setdefault('FFBOT_REPLAY', tempfile.gettempdir())
+
+import ycache  # noqa: E402
+import yclient  # noqa: E402
+import yfantasy  # noqa: E402
+import ysnapshot  # noqa: E402
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+class StubYahoo(object):
+    """
+    Answers GETs with canned xml, like yclient.ReplayClient
+    """
+    XML = {
+        'game/nfl': '<game><game_id>399</game_id></game>',
+        'league/399.l.7;out=settings': ('<league><league_key>399.l.7</league_key><num_teams>2</num_teams>'
+                                        '<settings><a>1</a></settings></league>'),
+        'team/399.l.7.t.1': '<team><team_key>399.l.7.t.1</team_key><team_id>1</team_id></team>',
+        'team/399.l.7.t.2': '<team><team_key>399.l.7.t.2</team_key><team_id>2</team_id></team>',
+    }
+
+    def __init__(self):
+        self.asked = []
+
+    def send_get(self, uri):
+        self.asked.append(uri)
+        if ';week=' in uri:
+            xml = ('<league><league_key>399.l.7</league_key><scoreboard><matchups><matchup>'
+                   '<status>postevent</status></matchup></matchups></scoreboard></league>')
+        else:
+            xml = self.XML[uri]
+        return yclient.RecordedResponse('<fantasy_content>%s</fantasy_content>' % xml)
+
+
+@pytest.fixture
+def yahoo(monkeypatch):
+    stub = StubYahoo()
+    monkeypatch.setattr(yfantasy, 'YAPI', stub)
+    monkeypatch.setattr(ycache, 'CACHE', ycache.SnapshotCache())
+    return stub.asked
+
+
+def test_create(yahoo, tmp_path):
+    path = str(tmp_path / 'league.snap')
+    yfantasy.create_yleague_json(7, path=path)
+    league = yfantasy.get_yleague_json(path)
+    assert [t['team_key'] for t in league['teams']] == ['399.l.7.t.1', '399.l.7.t.2']
+    assert league['settings'] == {'a': '1'}
+    with pytest.raises(AssertionError):
+        yfantasy.create_yleague_json(7, path=path)
+
+
+def test_unreadable_snapshot_is_rebuilt(yahoo, tmp_path):
+    path = str(tmp_path / 'league.snap')
+    yfantasy.create_yleague_json(7, path=path)
+    # As if written by another Python
+    with open(path, 'r+b') as f:
+        f.seek(8)
+        f.write(struct.pack('<B', 2))
+    with pytest.raises(ysnapshot.SnapshotError):
+        ysnapshot.Snapshot(path)
+    del yahoo[:]
+    # Fresh from Yahoo, not the cache
+    ycache.CACHE = ycache.SnapshotCache()
+    assert yfantasy.get_yleague_json(path)['league_key'] == '399.l.7'
+    # Fetched once each, the rebuild does not rebuild again
+    assert yahoo == list(StubYahoo.XML)
+    assert ysnapshot.Snapshot(path)['league_key'] == '399.l.7'
+
+
+def test_settled():
+    assert [w for w in range(1, 7) if yfantasy.settled(w, 5)] == [1, 2, 3]
+    assert yfantasy.settled(17, None)
+
+
+def test_scoreboards_cache_settled_weeks_for_good(yahoo):
+    boards = yfantasy.scoreboards('399.l.7', [4, 1, 3, 2], 4)
+    assert [b['league_key'] for b in boards] == ['399.l.7'] * 4
+    assert sorted(yahoo) == ['league/399.l.7/scoreboard;week=%d' % w for w in range(1, 5)]
+    # Every matchup is over, but weeks 3 and 4 can still get stat corrections
+    final = dict((w, ycache.CACHE.get('league/399.l.7/scoreboard;week=%d|league|' % w)[2]) for w in range(1, 5))
+    assert final == {1: True, 2: True, 3: False, 4: False}
+
+
+def test_no_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(yfantasy, 'LEAGUE_JSON_PATH', str(tmp_path / 'league.json'))
+    assert yfantasy.get_yleague_json(str(tmp_path / 'league.snap')) is None
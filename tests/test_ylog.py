@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import logging
+import queue
+
+import pytest
+
+import ylog
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+def record(message='fetch', level=logging.INFO, **fields):
+    r = logging.LogRecord('ffbot', level, __file__, 1, message, None, None)
+    if fields:
+        r.fields = fields
+    return r
+
+
+def test_structured_formatter():
+    formatter = ylog.StructuredFormatter('%(levelname)s %(message)s')
+    assert formatter.format(record()) == 'INFO fetch'
+    line = formatter.format(record(uri='league/{key}/standings', bytes=5120, ms=181.96, ok=True))
+    assert line == 'INFO fetch uri=league/{key}/standings bytes=5120 ms=182.0 ok=True'
+    # Values that would not read back as one token are quoted
+    line = formatter.format(record(name='Bench Mob', empty='', expr='a=b', quote='say "hi"', lines='a\nb'))
+    assert line == ('INFO fetch name="Bench Mob" empty="" expr="a=b" quote="say \\"hi\\"" lines="a\\nb"')
+
+
+def test_dropping_queue_handler():
+    handler = ylog.DroppingQueueHandler(queue.Queue(2))
+    for i in range(5):
+        # Never blocks, even with nobody reading
+        handler.handle(record('message %d' % i))
+    assert handler.dropped == 3
+    assert [handler.queue.get_nowait().getMessage() for _ in range(2)] == ['message 0', 'message 1']
+
+
+@pytest.fixture
+def logger():
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(ylog.StructuredFormatter('%(levelname)s %(message)s'))
+    logger = logging.getLogger('test_ylog')
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    yield logger, stream
+    logger.removeHandler(handler)
+
+
+def test_event(logger):
+    logger, stream = logger
+    ylog.event(logger, 'cron done', cron='cron_prefetch')
+    ylog.event(logger, 'fetch', logging.DEBUG, uri='league/1')
+    assert stream.getvalue() == 'INFO cron done cron=cron_prefetch\n'
+
+
+def test_payload(logger, monkeypatch):
+    logger, stream = logger
+    ylog.payload(logger, 'league/1', '<xml/>')
+    assert stream.getvalue() == ''
+    # Sampled at INFO
+    monkeypatch.setattr(ylog, 'PAYLOAD_SAMPLE', 1.0)
+    ylog.payload(logger, 'league/1', '<xml/>')
+    assert stream.getvalue() == 'INFO payload uri=league/1 bytes=6 body=<xml/>\n'
+    # Every body at DEBUG, cut at the limit
+    monkeypatch.setattr(ylog, 'PAYLOAD_SAMPLE', 0.0)
+    monkeypatch.setattr(ylog, 'PAYLOAD_LIMIT', 4)
+    logger.setLevel(logging.DEBUG)
+    ylog.payload(logger, 'league/1', '<xml/>')
+    assert stream.getvalue().splitlines()[-1] == 'DEBUG payload uri=league/1 bytes=6 body=<xml'
+
+
+def test_setup(monkeypatch):
+    root = logging.getLogger()
+    monkeypatch.setattr(root, 'handlers', list(root.handlers))
+    monkeypatch.setattr(ylog, '_listener', None)
+    monkeypatch.setattr(ylog, '_handler', None)
+    level = root.level
+    stream = io.StringIO()
+    try:
+        ylog.setup(logging.INFO, stream=stream)
+        handler = ylog._handler
+        assert root.handlers == [handler]
+        # Again only changes the level
+        ylog.setup(logging.WARNING, stream=io.StringIO())
+        assert ylog._handler is handler
+        ylog.event(logging.getLogger('ffbot'), 'quiet')
+        ylog.event(logging.getLogger('ffbot'), 'loud', logging.WARNING, n=1)
+        ylog.stop()
+    finally:
+        ylog.stop()
+        root.setLevel(level)
+    assert stream.getvalue().endswith(' WARNING ffbot loud n=1\n')
+    assert 'quiet' not in stream.getvalue()
+    assert ylog.dropped() == 0
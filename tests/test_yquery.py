@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import yquery
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+def respond(request):
+    """
+    What Yahoo sends for a request of league/<key>/players;player_keys=...
+    or players;player_keys=..., under fantasy_content[api]
+    """
+    seg = request.segments[-1]
+    players = [{'player_key': k, 'name': 'Player %s' % k} for k in seg.keys()]
+    collection = {'@count': str(len(players)), 'player': players[0] if len(players) == 1 else players}
+    if len(request.segments) == 1:
+        return collection
+    return {'league_key': request.segments[0].key, 'players': collection}
+
+
+def run(queries):
+    requests = yquery.plan(queries)
+    return requests, yquery.assemble(requests, [respond(r) for r in requests], len(queries))
+
+
+def keys_of(collection):
+    return [p['player_key'] for p in yquery._as_list(collection['player'])]
+
+
+def test_plan_merges_keys():
+    queries = [yquery.Query('league', 'k').sub('players', player_keys=['p1', 'p2']),
+               yquery.Query('league', 'k').sub('players', player_keys=['p2', 'p3'])]
+    requests, results = run(queries)
+    assert [str(r) for r in requests] == ['league/k/players;player_keys=p1,p2,p3']
+    assert keys_of(results[0]['players']) == ['p1', 'p2']
+    assert keys_of(results[1]['players']) == ['p2', 'p3']
+    assert results[1]['players']['@count'] == '2'
+    assert results[0]['league_key'] == 'k'
+
+
+def test_plan_merges_out():
+    requests = yquery.plan(['league/k/settings', 'league/k/standings', 'league/k/scoreboard;week=2'])
+    assert [str(r) for r in requests] == ['league/k;out=settings,standings', 'league/k/scoreboard;week=2']
+    assert [index for index, _, _ in requests[0].parts] == [0, 1]
+
+
+def test_split_resource():
+    requests, results = run(['player/p1', 'player/p2'])
+    assert [str(r) for r in requests] == ['players;player_keys=p1,p2']
+    assert results == [{'player_key': 'p1', 'name': 'Player p1'}, {'player_key': 'p2', 'name': 'Player p2'}]
+
+
+def test_single_item_is_not_wrapped():
+    _, results = run([yquery.Query('league', 'k').sub('players', player_keys=['p1', 'p2']),
+                      yquery.Query('league', 'k').sub('players', player_keys=['p2'])])
+    assert results[1]['players'] == {'@count': '1', 'player': {'player_key': 'p2', 'name': 'Player p2'}}
+
+
+def test_more_keys_than_a_request():
+    keys = ['p%d' % i for i in range(60)]
+    requests, results = run([yquery.Query('league', 'k').sub('players', player_keys=keys)])
+    assert [len(r.segments[-1].keys()) for r in requests] == [25, 25, 10]
+    assert keys_of(results[0]['players']) == keys
+    assert results[0]['players']['@count'] == '60'
+    assert results[0]['league_key'] == 'k'
+
+
+def test_more_keys_than_a_request_top_level():
+    keys = ['p%d' % i for i in range(30)]
+    requests, results = run([yquery.Query('players', player_keys=keys)])
+    assert len(requests) == 2
+    assert keys_of(results[0]) == keys
+    assert results[0]['@count'] == '30'
+
+
+def test_several_queries_over_chunks():
+    first = ['p%d' % i for i in range(20)]
+    second = ['p%d' % i for i in range(15, 40)]
+    requests, results = run([yquery.Query('league', 'k').sub('players', player_keys=first),
+                             yquery.Query('league', 'k').sub('players', player_keys=second)])
+    assert len(requests) == 2
+    assert keys_of(results[0]['players']) == first
+    assert keys_of(results[1]['players']) == second
+    assert results[1]['players']['@count'] == '25'
+
+
+def test_template():
+    assert yquery.template('league/nfl.l.1/scoreboard;week=5') == 'league/{key}/scoreboard;week={}'
+    assert yquery.template('league/nfl.l.1;out=settings,standings') == 'league/{key};out=settings,standings'
+
+
+def test_parse_round_trip():
+    for uri in ['league/nfl.l.1;out=settings,standings', 'team/nfl.l.1.t.2/roster;week=3/players',
+                'players;player_keys=a,b/stats;type=week;week=5']:
+        assert str(yquery.Query.parse(uri)) == uri
+    assert yquery.Query.parse('league/nfl.l.1;out=settings').segments[0].key == 'nfl.l.1'
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+import yscheduler
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end, 'timed out'
+        time.sleep(0.001)
+
+
+def queue(scheduler, requests):
+    """
+    Queue (name, class, seconds to deadline) behind a held slot, then let
+    them through one at a time
+
+    :return: names in the order they were granted
+    """
+    order = []
+
+    def request(name, klass, timeout):
+        with scheduler.slot(klass, time.time() + timeout):
+            order.append(name)
+
+    with scheduler.slot('interactive'):
+        threads = []
+        for i, args in enumerate(requests):
+            threads.append(threading.Thread(target=request, args=args))
+            threads[-1].start()
+            wait_for(lambda: sum(s['waiting'] for s in scheduler.stats().values()) == i + 1)
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def test_priority_order():
+    scheduler = yscheduler.RequestScheduler(max_concurrency=1)
+    order = queue(scheduler, [('sync', 'background', 60), ('score', 'live', 60), ('odds', 'interactive', 60),
+                              ('standings', 'interactive', 60)])
+    assert order == ['odds', 'standings', 'score', 'sync']
+
+
+def test_earliest_deadline_first():
+    scheduler = yscheduler.RequestScheduler(max_concurrency=1)
+    order = queue(scheduler, [('late', 'live', 60), ('soon', 'live', 30), ('sooner', 'live', 20)])
+    assert order == ['sooner', 'soon', 'late']
+
+
+def test_class_limit():
+    scheduler = yscheduler.RequestScheduler(limits={'background': 1}, max_concurrency=4)
+    with scheduler.slot('background'):
+        with pytest.raises(yscheduler.DeadlineExceeded):
+            with scheduler.slot('background', time.time() + 0.05):
+                pass
+        # Other classes still get through
+        with scheduler.slot('interactive', time.time() + 0.05):
+            pass
+    stats = scheduler.stats()
+    assert stats['background']['expired'] == 1
+    assert stats['background']['requests'] == 1
+    assert sum(s['in_flight'] + s['waiting'] for s in stats.values()) == 0
+
+
+def test_priority_from_context():
+    assert yscheduler.current()[0] == 'interactive'
+    with yscheduler.priority('background', timeout=5):
+        klass, deadline = yscheduler.current()
+        assert klass == 'background'
+        assert deadline - time.time() == pytest.approx(5, abs=1)
+
+
+def test_deadline_starts_when_queued(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(yscheduler.time, 'time', lambda: now[0])
+    with yscheduler.priority('background'):
+        assert yscheduler.current()[1] == 1000.0 + yscheduler.DEADLINES['background']
+        # A long sync job: later requests get the whole timeout again
+        now[0] += 3600
+        assert yscheduler.current()[1] == 4600.0 + yscheduler.DEADLINES['background']
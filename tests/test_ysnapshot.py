@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import marshal
+import os
+import struct
+import zlib
+
+import pytest
+
+import ysnapshot
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+LEAGUE = {
+    'league_key': 'nfl.l.1', 'name': 'League', 'num_teams': '2', 'renew': None, 'draft': True,
+    'settings': {'roster_positions': {'roster_position': [{'position': 'QB', 'count': '1'}]}},
+    'teams': [{'team_key': 'nfl.l.1.t.%d' % i, 'name': 'Team %d' % i, 'points': 101.5 * i} for i in (1, 2)],
+}
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'league.snap')
+    ysnapshot.write(path, LEAGUE, sections=('settings', 'teams', 'missing'), meta={'league_id': 1})
+    return path
+
+
+def patch(path, offset, data):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def test_round_trip(path):
+    snapshot = ysnapshot.Snapshot(path)
+    assert dict(snapshot) == LEAGUE
+    assert len(snapshot) == len(LEAGUE)
+    assert sorted(snapshot.index) == ['', 'settings', 'teams']
+    assert snapshot.meta == {'league_id': 1}
+
+
+def test_sections_decode_when_used(path):
+    snapshot = ysnapshot.Snapshot(path)
+    assert snapshot['league_key'] == 'nfl.l.1'
+    assert snapshot.decoded() == ['']
+    assert snapshot['teams'][1]['name'] == 'Team 2'
+    assert snapshot.decoded() == ['', 'teams']
+    assert snapshot.get('nothing') is None
+
+
+def test_load_once_per_version(path):
+    first = ysnapshot.load(path)
+    assert ysnapshot.load(path) is first
+    ysnapshot.write(path, dict(LEAGUE, name='Renamed'), sections=('teams',))
+    assert ysnapshot.load(path)['name'] == 'Renamed'
+    # A reader keeps what it mapped
+    assert first['name'] == 'League'
+
+
+def test_other_python(path):
+    marshal_version, major, minor = struct.unpack_from('<HBB', open(path, 'rb').read(), 6)
+    patch(path, 6, struct.pack('<HBB', marshal_version, major, minor + 1))
+    with pytest.raises(ysnapshot.SnapshotError, match='written by Python'):
+        ysnapshot.Snapshot(path)
+    # meta stays readable to rebuild from
+    assert ysnapshot.read_meta(path) == {'league_id': 1}
+
+
+def test_damaged(path):
+    patch(path, os.path.getsize(path) - 3, b'xyz')
+    with pytest.raises(ysnapshot.SnapshotError, match='damaged'):
+        ysnapshot.Snapshot(path)
+
+
+def test_section_that_does_not_decode(path):
+    snapshot = ysnapshot.Snapshot(path)
+    offset, length = snapshot.index['teams']
+    data = bytes([ord('?')]) * length
+    # Right checksum, wrong contents
+    start = struct.calcsize('<4sHHBBHI') + len(b'{"league_id":1}')
+    entry = struct.Struct('<16sQQI')
+    for i in range(len(snapshot.index)):
+        name, o, l, _ = entry.unpack_from(open(path, 'rb').read(), start + i * entry.size)
+        if o == offset:
+            patch(path, start + i * entry.size, entry.pack(name, o, l, zlib.crc32(data)))
+    patch(path, offset, data)
+    snapshot = ysnapshot.Snapshot(path)
+    assert snapshot['league_key'] == 'nfl.l.1'
+    with pytest.raises(ysnapshot.SnapshotError, match='teams'):
+        snapshot['teams']
+
+
+def test_not_a_snapshot(tmp_path):
+    path = str(tmp_path / 'league.json')
+    for content in (b'', b'{"league_key": "nfl.l.1", "teams": []}', b'FFBS\x01\x00' + b'\x00' * 20):
+        with open(path, 'wb') as f:
+            f.write(content)
+        with pytest.raises(ysnapshot.SnapshotError):
+            ysnapshot.Snapshot(path)
+        with pytest.raises(ysnapshot.SnapshotError):
+            ysnapshot.read_meta(path)
+
+
+def test_truncated(path):
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 10)
+    with pytest.raises(ysnapshot.SnapshotError, match='truncated'):
+        ysnapshot.Snapshot(path)
+
+
+def test_marshal_version_is_recorded(path):
+    assert struct.unpack_from('<H', open(path, 'rb').read(), 6)[0] == marshal.version
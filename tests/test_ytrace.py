@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import concurrent.futures
+import contextvars
+import threading
+import time
+
+import pytest
+
+import ytrace
+
+__author__ = "Greg"
+__copyright__ = "Greg"
+__license__ = "mit"
+
+
+@pytest.fixture(autouse=True)
+def spans(monkeypatch):
+    monkeypatch.setattr(ytrace, '_SPANS', collections.deque(maxlen=ytrace.BUFFER_SIZE))
+    return ytrace._SPANS
+
+
+def test_nesting(spans):
+    with ytrace.span('command', fn='standings') as command:
+        with ytrace.span('run') as run:
+            with ytrace.span('http', uri='league/1') as http:
+                ytrace.annotate(queued=0.5)
+        with ytrace.span('send') as send:
+            pass
+    with ytrace.span('command') as other:
+        pass
+    assert [s.name for s in spans] == ['http', 'run', 'send', 'command', 'command']
+    assert (command.parent, run.parent, http.parent, send.parent) == (None, command.id, run.id, command.id)
+    assert {s.trace for s in (command, run, http, send)} == {command.id}
+    assert other.trace == other.id != command.id
+    assert http.attrs == {'uri': 'league/1', 'queued': 0.5}
+    assert command.duration >= run.duration >= http.duration
+    # Nothing to annotate outside a span
+    ytrace.annotate(lost=True)
+
+
+def test_nesting_across_threads(spans):
+    with ytrace.span('command') as command:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            # A copy of the context keeps the parent; a bare thread starts a new trace
+            for f in [pool.submit(contextvars.copy_context().run, _http, i) for i in range(2)]:
+                f.result()
+            pool.submit(_http, 2).result()
+    parents = dict((s.attrs.get('uri'), s.parent) for s in spans if s.name == 'http')
+    assert parents == {0: command.id, 1: command.id, 2: None}
+
+
+def _http(i):
+    with ytrace.span('http', uri=i):
+        pass
+
+
+def trace(name, durations):
+    """
+    Finished trace with the given durations: a root and its children, in order
+    """
+    with ytrace.span(name) as root:
+        kids = []
+        for _ in durations[1:]:
+            with ytrace.span('http', uri='league/' + 'x' * 60) as kid:
+                kids.append(kid)
+    for s, duration in zip([root] + kids, durations):
+        s.duration = duration
+    return root
+
+
+def test_recent(spans):
+    slow = trace('command', [0.5, 0.3])
+    trace('background', [1.0])
+    fast = trace('command', [0.01])
+    found = ytrace.recent(5, name='command')
+    assert [root for root, _ in found] == [fast, slow]
+    assert [root for root, _ in ytrace.recent(5, name='command', slower_than=0.1)] == [slow]
+    assert len(ytrace.recent(1)) == 1
+    root, children = found[1]
+    assert [s.name for s in children[root.id]] == ['http']
+
+
+def test_format_trace(spans):
+    root = trace('command', [0.5, 0.2, 0.1])
+    root.attrs['fn'] = 'standings'
+    children = ytrace.recent(1)[0][1]
+    children[root.id][0].attrs['queued'] = 0.25
+    lines = ytrace.format_trace(root, children)
+    assert len(lines) == 3
+    assert lines[0] == '  500.0ms   200.0ms  command fn=standings'
+    # Children are indented; long values keep their end
+    assert lines[1].startswith('  200.0ms   200.0ms    http uri=...xxx')
+    assert lines[1].endswith(' queued=0.250s')
+    assert len(lines[1].split(' uri=')[1].split()[0]) == 48
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy, args=(stop,), name='busy-worker')
+    worker.start()
+    try:
+        sampler = ytrace.Sampler(interval=0.01).start()
+        time.sleep(0.3)
+        sampler.stop()
+    finally:
+        stop.set()
+        worker.join()
+    # Never more often than the interval; a loaded machine may take fewer
+    assert 5 <= sampler.samples <= 31
+    stacks = sampler.collapsed().splitlines()
+    busy = [line for line in stacks if line.startswith('busy-worker;')]
+    assert busy
+    assert all('_busy (test_ytrace.py:' in line for line in busy)
+    # Collapsed format: stack, then how many samples saw it
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in busy) <= sampler.samples
+    assert not any('ytrace-sampler' in line for line in stacks)